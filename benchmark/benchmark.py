@@ -0,0 +1,234 @@
+import sys
+sys.dont_write_bytecode = True
+import os
+import json
+import time
+import random
+import argparse
+import platform
+import datetime
+import subprocess
+import tempfile
+from pathlib import Path
+from shutil import rmtree
+
+# Benchmark of Mutation() and mutate() on generated modules with a given number of operator sites and a pytest suite that covers them
+#   python3 benchmark.py [--sites 1000 10000 100000] [--iterations 3] [--mutations 1 10 100] [--save | --baseline baseline.json]
+# Every measurement (Mutation() and each mutate() call of each size) runs in its own process (this file with --run-size). The peak memory of a
+# process, and of the children it waited for, only ever grows, so in a shared process one measurement would carry over to the next
+# The results are written to a JSON file. With --save they become the baseline that later runs are compared to. A run that is slower
+# or uses more memory than the baseline by more than --tolerance is reported as a regression and exits with 1
+
+benchmarkDir = Path(__file__).resolve().parent
+
+# Every generated function has 10 operator sites: Add, Mult, Sub, Mod, USub, Lt, And, GtE, FloorDiv and BitOr
+sitesPerFunction = 10
+functionsPerModule = 100
+functionTemplate = (
+    "def f{num}(a, b):\n"
+    "    x = a + b * {c1} - a % {c2}\n"
+    "    y = -x if a < b and b >= {c3} else x // {c4}\n"
+    "    return y | {c5}\n"
+    "\n"
+)
+# Inputs of each test. They take both sides of the conditional expression
+testInputs = [(1, 5), (7, 2)]
+
+
+# Write modulesToTest/ with the generated functions and testDir/ with one test for each function into workDir
+# Returns the number of modules and tests
+def generateWorkspace(workDir: Path, numSites: int, seed: int):
+    rng = random.Random(seed)
+    numFunctions = -(-numSites // sitesPerFunction)
+    numModules = -(-numFunctions // functionsPerModule)
+    (workDir / "modulesToTest").mkdir(parents=True)
+    (workDir / "testDir").mkdir()
+
+    for moduleNum in range(numModules):
+        functionNums = range(moduleNum * functionsPerModule, min((moduleNum + 1) * functionsPerModule, numFunctions))
+        moduleSrc = ""
+        for num in functionNums:
+            moduleSrc += functionTemplate.format(num=num, c1=rng.randint(1, 9), c2=rng.randint(2, 9), c3=rng.randint(0, 3), c4=rng.randint(2, 9), c5=rng.randint(1, 15))
+        (workDir / "modulesToTest" / ("mod_" + str(moduleNum) + ".py")).write_text(moduleSrc)
+
+        # The expected values are taken from the unmutated functions
+        namespace = {}
+        exec(moduleSrc, namespace)
+        testSrc = "from modulesToTest import mod_" + str(moduleNum) + " as m\n\n"
+        for num in functionNums:
+            testSrc += "def test_f" + str(num) + "():\n"
+            for a, b in testInputs:
+                testSrc += "    assert m.f" + str(num) + "(" + str(a) + ", " + str(b) + ") == " + str(namespace["f" + str(num)](a, b)) + "\n"
+            testSrc += "\n"
+        (workDir / "testDir" / ("test_mod_" + str(moduleNum) + ".py")).write_text(testSrc)
+
+    return numModules, numFunctions
+
+
+# Peak resident memory of this process and of the largest child process it waited for, in bytes, since the process started. None where it
+# cannot be measured
+def getPeakMemory() -> dict:
+    try:
+        import resource
+    except ImportError:
+        return {"peakRss": None, "peakChildRss": None}
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {"peakRss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit, "peakChildRss": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit}
+
+
+# Total wall time of each phase the profiler of a Mutation() recorded since the given mark
+def getPhaseTimes(mutation, sinceMark: int) -> dict:
+    phaseTimes = {}
+    for event in mutation.profiler.events[sinceMark:]:
+        phaseTimes[event["name"]] = round(phaseTimes.get(event["name"], 0.0) + event["wall"], 6)
+    return phaseTimes
+
+
+# Child process: time Mutation() (without --case) or mutate() with --case mutations in the generated workspace and write the result as JSON
+# mutate() needs a Mutation() first. That one finds the coverage and the analysis of the Mutation() run in the caches, and its time is not counted
+def runSize(args):
+    sys.path.append(str(benchmarkDir.parent))
+    from mutation import Mutation, mutation_types
+    os.chdir(args.run_size)
+
+    startTime = time.perf_counter()
+    mutation = Mutation("modulesToTest", "testDir")
+    if args.case is None:
+        result = dict({"wall": round(time.perf_counter() - startTime, 6), "phases": getPhaseTimes(mutation, 0)}, **getPeakMemory())
+    else:
+        mark = mutation.profiler.mark()
+        startTime = time.perf_counter()
+        mutation.mutate(mutation_types.COMPLEMENT, args.iterations, args.case, jobs=args.jobs, coveringTestsOnly=args.covering_tests_only)
+        wallTime = time.perf_counter() - startTime
+        result = dict({"iterations": args.iterations, "numMutations": args.case, "wall": round(wallTime, 6),
+                       "mutantsPerSecond": round(args.iterations / wallTime, 6), "mutationsPerSecond": round(args.iterations * args.case / wallTime, 6),
+                       "phases": getPhaseTimes(mutation, mark)}, **getPeakMemory())
+
+    with open(args.result, "w") as resultFile:
+        json.dump(result, resultFile)
+
+
+# Run one measurement of the size in sizeDir in a new process (see runSize()). numMutations is None for Mutation()
+def runMeasurement(args, sizeDir: Path, numSites: int, numMutations=None) -> dict:
+    command = [sys.executable, str(Path(__file__).resolve()), "--run-size", str(sizeDir), "--result", str(sizeDir / "benchmark-result.json"),
+               "--iterations", str(args.iterations), "--jobs", str(args.jobs)]
+    if numMutations is not None:
+        command += ["--case", str(numMutations)]
+    if args.covering_tests_only:
+        command.append("--covering-tests-only")
+    with open(sizeDir / "benchmark-log.txt", "a") as log:
+        if subprocess.run(command, stdout=log, stderr=log).returncode != 0:
+            raise Exception('The benchmark of ' + str(numSites) + ' sites failed. See ' + str(sizeDir / "benchmark-log.txt"))
+    with open(sizeDir / "benchmark-result.json", "r") as resultFile:
+        return json.load(resultFile)
+
+
+# Compare results to a baseline. Returns a description of every regression
+def compareToBaseline(results: dict, baseline: dict, tolerance: float) -> list:
+    baselineSizes = {size["sites"]: size for size in baseline["sizes"]}
+    regressions = []
+    for size in results["sizes"]:
+        baselineSize = baselineSizes.get(size["sites"])
+        if baselineSize is None:
+            continue
+        measurements = [("Mutation()", size["init"], baselineSize["init"])]
+        baselineCases = {(case["iterations"], case["numMutations"]): case for case in baselineSize["cases"]}
+        for case in size["cases"]:
+            baselineCase = baselineCases.get((case["iterations"], case["numMutations"]))
+            if baselineCase is not None:
+                measurements.append(("mutate() with " + str(case["iterations"]) + " iterations of " + str(case["numMutations"]) + " mutations", case, baselineCase))
+
+        for name, measured, expected in measurements:
+            for key in ("wall", "peakRss", "peakChildRss"):
+                if measured.get(key) is not None and expected.get(key) and measured[key] > expected[key] * (1 + tolerance):
+                    regressions.append(str(size["sites"]) + " sites, " + name + ": " + key + " " + str(measured[key]) + " is " + str(round(100 * (measured[key] / expected[key] - 1), 1)) + "% above the baseline (" + str(expected[key]) + ")")
+    return regressions
+
+
+def printSize(size: dict):
+    def getMegabytes(numBytes):
+        return "-" if numBytes is None else str(round(numBytes / 2 ** 20, 1))
+
+    print("\n" + str(size["sites"]) + " sites in " + str(size["modules"]) + " modules, " + str(size["tests"]) + " tests")
+    print("Mutation(): " + str(round(size["init"]["wall"], 3)) + " s, peak memory " + getMegabytes(size["init"]["peakRss"]) + " MB (pytest " + getMegabytes(size["init"]["peakChildRss"]) + " MB)")
+    for case in size["cases"]:
+        print("mutate(" + str(case["iterations"]) + " iterations, " + str(case["numMutations"]) + " mutations): " + str(round(case["wall"], 3)) + " s, "
+              + str(round(case["mutantsPerSecond"], 3)) + " mutants/s, " + str(round(case["mutationsPerSecond"], 3)) + " mutations/s, peak memory " + getMegabytes(case["peakRss"]) + " MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Mutation() and mutate() on generated modules")
+    parser.add_argument("--sites", type=int, nargs="+", default=[1000, 10000, 100000], help="number of operator sites of each generated code base")
+    parser.add_argument("--iterations", type=int, default=3, help="iterations of each mutate() call")
+    parser.add_argument("--mutations", type=int, nargs="+", default=[1, 10, 100], help="numMutations of each mutate() call")
+    parser.add_argument("--jobs", type=int, default=1, help="jobs of each mutate() call")
+    parser.add_argument("--covering-tests-only", action="store_true", help="run mutate() with coveringTestsOnly")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated code")
+    parser.add_argument("--output", default=str(benchmarkDir / "benchmark-results.json"), help="file the results are written to")
+    parser.add_argument("--baseline", default=str(benchmarkDir / "baseline.json"), help="baseline file to compare to or to save")
+    parser.add_argument("--save", action="store_true", help="save the results as the baseline instead of comparing to it")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="fraction a measurement can be above the baseline before it is a regression")
+    parser.add_argument("--work-dir", default=None, help="directory the code is generated in (a temporary directory by default)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated code and the mutation-unit-test/ directories")
+    parser.add_argument("--run-size", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--case", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--result", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size is not None:
+        runSize(args)
+        return
+
+    # Only the sites-N directories are generated in a --work-dir. Anything else in it belongs to the user
+    workDir = Path(args.work_dir if args.work_dir is not None else tempfile.mkdtemp(prefix="mutation-benchmark-")).resolve()
+    sizeDirs = []
+    results = {"date": datetime.datetime.now().isoformat(), "python": platform.python_version(), "platform": platform.platform(), "processor": platform.processor(), "cpus": os.cpu_count(),
+               "settings": {"iterations": args.iterations, "mutations": args.mutations, "jobs": args.jobs, "coveringTestsOnly": args.covering_tests_only, "seed": args.seed},
+               "sizes": []}
+    try:
+        for numSites in args.sites:
+            sizeDir = workDir / ("sites-" + str(numSites))
+            if sizeDir.exists():
+                rmtree(str(sizeDir))
+            sizeDirs.append(sizeDir)
+            print("Generating " + str(numSites) + " operator sites in " + str(sizeDir))
+            numModules, numTests = generateWorkspace(sizeDir, numSites, args.seed)
+
+            print("Running the benchmark (output in " + str(sizeDir / "benchmark-log.txt") + ")")
+            size = {"sites": numSites, "modules": numModules, "tests": numTests, "init": runMeasurement(args, sizeDir, numSites)}
+            size["cases"] = [runMeasurement(args, sizeDir, numSites, numMutations) for numMutations in args.mutations]
+            results["sizes"].append(size)
+            printSize(size)
+    finally:
+        if not args.keep:
+            if args.work_dir is None:
+                rmtree(str(workDir), ignore_errors=True)
+            else:
+                for sizeDir in sizeDirs:
+                    rmtree(str(sizeDir), ignore_errors=True)
+
+    with open(args.output, "w") as outputFile:
+        json.dump(results, outputFile, indent=1)
+    print("\nResults written to " + args.output)
+
+    if args.save:
+        with open(args.baseline, "w") as baselineFile:
+            json.dump(results, baselineFile, indent=1)
+        print("Saved as the baseline " + args.baseline)
+    elif Path(args.baseline).exists():
+        with open(args.baseline, "r") as baselineFile:
+            baseline = json.load(baselineFile)
+        if baseline["settings"] != results["settings"]:
+            print("The baseline was measured with other settings (" + json.dumps(baseline["settings"]) + "). Only the matching measurements are compared")
+        regressions = compareToBaseline(results, baseline, args.tolerance)
+        if len(regressions) > 0:
+            print("\nRegressions compared to " + args.baseline + ":")
+            for regression in regressions:
+                print("\t" + regression)
+            sys.exit(1)
+        print("No regressions compared to " + args.baseline)
+
+
+if __name__ == "__main__":
+    main()
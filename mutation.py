@@ -8,33 +8,111 @@ import traceback
 import random
 from coverage import CoverageData
 from pathlib import Path
-from shutil import rmtree, copytree
+from shutil import rmtree, copytree, copy2, ignore_patterns
 import subprocess
 from junitparser import *
-import fnmatch
-from os.path import isdir, join
+import os
+import io
+import queue
+import marshal
+import json
+import base64
+import hashlib
+import sqlite3
+import signal
+import threading
+import types
+import time
+import math
+import statistics
+import datetime
+import socket
+import contextlib
+import re
+import array
+import errno
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 # Types of mutations to be called with mutation.mutation_types.TYPE
 class mutation_types():
     COMPLEMENT = 1
     RANDOM = 2
 
+# Operator sites of one group of operators (e.g. "binOps") in columns: the line number, column number, operator code and occurrence of every
+# site are kept in arrays instead of a tuple for each site. Every operator of a comparison chain is a site of its own
+# Nested operators can start at the same position (the inner "+" of "a + b + c") and a comparison chain can repeat an operator
+# ("a == b == c"), so the occurrence numbers the sites with the same position and operator type in the order the tree is visited, parents
+# first (see astNodeVisitorCallbacks_analyze)
+# Iterating over the table gives the sites as (line number, column number, operator type, occurrence)
+class siteTable():
+    __slots__ = ("lineNums", "colNums", "ops", "occurrences")
+    # Every operator type the ast module has. The code of an operator is its index
+    opTypes = [ast.UAdd, ast.USub, ast.Not, ast.Invert,
+               ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.LShift, ast.RShift, ast.BitOr, ast.BitXor, ast.BitAnd, ast.MatMult,
+               ast.And, ast.Or,
+               ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Is, ast.IsNot, ast.In, ast.NotIn]
+    opTypeCodes = {opType: code for code, opType in enumerate(opTypes)}
+
+    def __init__(self):
+        self.lineNums = array.array("i")
+        self.colNums = array.array("i")
+        self.ops = array.array("B")
+        self.occurrences = array.array("H")
+
+    def append(self, lineNum: int, colNum: int, opType, occurrence: int):
+        self.lineNums.append(lineNum)
+        self.colNums.append(colNum)
+        self.ops.append(siteTable.opTypeCodes[opType])
+        self.occurrences.append(occurrence)
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __iter__(self):
+        return zip(self.lineNums, self.colNums, (siteTable.opTypes[code] for code in self.ops), self.occurrences)
+
+    # Occurrence of the next site at the position of node with operator type opType. siteCounts: (line number, column number, operator type) -> number of sites
+    @staticmethod
+    def countSite(siteCounts: dict, node, opType) -> int:
+        key = (node.lineno, node.col_offset, opType)
+        occurrence = siteCounts.get(key, 0)
+        siteCounts[key] = occurrence + 1
+        return occurrence
+
 # Information obtained from the analysis of the tree
+# Only the operator sites are kept. The tree is parsed again from the file whenever it is needed (see parseTree())
 class analysisInfo():
-    def __init__(self, fileName, tree, coverageLineNums):
+    def __init__(self, fileName, sourceHash, coverageLineNums, coverageTestsByLine=None):
         self.fileName = fileName
-        self.tree = tree
+        # sha256 of the source that was analyzed
+        self.sourceHash = sourceHash
         self.coverageLineNums = coverageLineNums
+        # Line number -> set of test node ids that ran the line. None in the set means the line also ran outside of a test (e.g. on import)
+        self.coverageTestsByLine = coverageTestsByLine if coverageTestsByLine is not None else {}
         self.operatorDict = {
-            "unaryOps": [],
-            "binOps": [],
-            "boolOps": [],
-            "cmpOps": []
+            "unaryOps": siteTable(),
+            "binOps": siteTable(),
+            "boolOps": siteTable(),
+            "cmpOps": siteTable()
         }
+
+    # Read the source file with its line endings as they are
+    # The sites only match the source that was analyzed, so a file that changed since then (or is mutated right now) is an error
+    def loadSource(self):
+        with open(self.fileName, "r", newline="") as srcFile:
+            srcStr = srcFile.read()
+        if hashlib.sha256(srcStr.encode()).hexdigest() != self.sourceHash:
+            raise Exception('The source of ' + str(self.fileName) + ' changed since it was analyzed. Create the Mutation() object again')
+        return srcStr
+
+    # Parse the source file into a new tree, which the caller can change. The trees are not kept between calls
+    def parseTree(self):
+        return ast.parse(self.loadSource())
     
     def __str__(self):
         printStr = "Filename: " + str(self.fileName) + "\n"
-        printStr += "Tree: " + str(self.tree) + "\n"
+        printStr += "Source hash: " + str(self.sourceHash) + "\n"
         printStr += "Coverage Lines: " + str(self.coverageLineNums) + "\n"
         printStr += "Operators: \n"
         for key, value in self.operatorDict.items():
@@ -47,21 +125,735 @@ class analysisInfo():
                 printStr += "[]\n"
         return printStr
 
+# A parsed tree and the position of each of its operator nodes, so the nodes of a mutant are found without visiting the whole tree
+# opNodes: (node, path, occurrences) of every UnaryOp, BinOp, BoolOp and Compare, in the order a NodeTransformer visits them (children first).
+# The path is the (field name, index in the list or None) steps from the tree to the node. occurrences has the occurrence of the site of
+# each operator of the node (see siteTable), one for each operator of a comparison chain
+# opNodesByPos: (line number, column number) -> indices into opNodes of the operator nodes at that position
+class treeIndex():
+    opNodeTypes = (ast.UnaryOp, ast.BinOp, ast.BoolOp, ast.Compare)
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.opNodes = []
+        self.opNodesByPos = {}
+        self.__addNodes(tree, [], {})
+
+    def __addNodes(self, node, path: list, siteCounts: dict):
+        # Sites are numbered before the children are visited, the same as in the analysis
+        if isinstance(node, treeIndex.opNodeTypes):
+            ops = node.ops if isinstance(node, ast.Compare) else [node.op]
+            occurrences = [siteTable.countSite(siteCounts, node, type(op)) for op in ops]
+
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, list):
+                for index, child in enumerate(value):
+                    if isinstance(child, ast.AST):
+                        path.append((field, index))
+                        self.__addNodes(child, path, siteCounts)
+                        path.pop()
+            elif isinstance(value, ast.AST):
+                path.append((field, None))
+                self.__addNodes(value, path, siteCounts)
+                path.pop()
+
+        if isinstance(node, treeIndex.opNodeTypes):
+            self.opNodesByPos.setdefault((node.lineno, node.col_offset), []).append(len(self.opNodes))
+            self.opNodes.append((node, tuple(path), occurrences))
+
+    # Copy the tree, but only the nodes (and lists of nodes) on the paths to the given operator nodes (indices into opNodes)
+    # Every other node is shared with the indexed tree, so neither tree may be changed outside of the copied nodes
+    # Returns the new tree and the copies of the operator nodes, in the given order
+    def copyPaths(self, opNodeIndices: list):
+        newTree = copy.copy(self.tree)
+        # ids of the nodes and lists that belong to the new tree only
+        copies = {id(newTree)}
+        opNodeCopies = []
+        for i in opNodeIndices:
+            node = newTree
+            for field, index in self.opNodes[i][1]:
+                if index is None:
+                    child = getattr(node, field)
+                    if id(child) not in copies:
+                        child = copy.copy(child)
+                        copies.add(id(child))
+                        setattr(node, field, child)
+                else:
+                    children = getattr(node, field)
+                    if id(children) not in copies:
+                        children = list(children)
+                        copies.add(id(children))
+                        setattr(node, field, children)
+                    child = children[index]
+                    if id(child) not in copies:
+                        child = copy.copy(child)
+                        copies.add(id(child))
+                        children[index] = child
+                node = child
+            opNodeCopies.append(node)
+        return newTree, opNodeCopies
+
+# Collects the operator sites of a tree into the operatorDict of an analysisInfo
+# It is at module level (and not in Mutation) so the process pool of the analysis can use it
+class astNodeVisitorCallbacks_analyze(ast.NodeVisitor):
+    def __init__(self, analysis: analysisInfo):
+        self.analysis = analysis
+        self.siteCounts = {}
+
+    def addSite(self, key, node, opType):
+        self.analysis.operatorDict[key].append(node.lineno, node.col_offset, opType, siteTable.countSite(self.siteCounts, node, opType))
+
+    def visit_UnaryOp(self, node):
+        self.addSite("unaryOps", node, type(node.op))
+        self.generic_visit(node)
+    
+    def visit_BinOp(self, node):
+        self.addSite("binOps", node, type(node.op))
+        self.generic_visit(node)
+    
+    def visit_BoolOp(self, node):
+        self.addSite("boolOps", node, type(node.op))
+        self.generic_visit(node)
+    
+    def visit_Compare(self, node):
+        for op in node.ops:
+            self.addSite("cmpOps", node, type(op))
+        self.generic_visit(node)
+
+# Analyze a source file and return its operatorDict. Runs in the process pool of Mutation(), which only passes the file name so
+# no more than one source and its tree are loaded at a time in each process
+def analyzeSource(srcFileName: str) -> dict:
+    with open(srcFileName, "r") as srcFile:
+        tree = ast.parse(srcFile.read())
+    analysis = analysisInfo(srcFileName, None, None)
+    astNodeVisitorCallbacks_analyze(analysis).visit(tree)
+    return analysis.operatorDict
+
+# A set of mutations that is run against the unit tests in one iteration
+class mutantInfo():
+    def __init__(self, iteration):
+        self.iteration = iteration
+        # Text written to the result file before the results of the iteration
+        self.resultText = ""
+        # File name -> mutated tree of every file that has to be replaced
+        self.mutatedTrees = {}
+        # Node ids of the tests to run. None runs the whole unit test suite
+        self.testIds = None
+        # Extra environment variables for the pytest process
+        self.env = {}
+        # Stable id of the single mutation of an enumerated mutant (None for randomly chosen mutations)
+        self.mutantId = None
+        # Key of the mutant in the result cache (None when the cache is not used)
+        self.cacheKey = None
+        # Outcome of each test that ran against the mutant, as reported by mutation_plugin:
+        # {"test": node id, "outcome": "passed", "failed", "error", "skipped", "timeout" or "resource limit", "message": str, "duration": seconds}
+        self.testResults = []
+        # Seconds the tests may run before the mutant is killed (None waits forever)
+        self.timeout = None
+        self.timedOut = False
+        # Limits of the pytest process (see mutation_plugin.setResourceLimits()) and the name of the one the mutant exceeded. None for no limits
+        self.resourceLimits = None
+        self.exceededLimit = None
+        # Mutations that were applied: (file name, line number, column number, original operator name, new operator name,
+        # occurrence of the site (see siteTable))
+        self.mutations = []
+        # File name -> code object compiled from the mutated tree (filled in by the mutant filter)
+        self.compiledCode = {}
+        # Why the mutant was dropped before running ("uncompilable", "equivalent" or "duplicate") and a description. None runs the mutant
+        self.skipReason = None
+        self.skipDetail = ""
+        # Stop at the first failing test (kill-fast) and run the tests in testOrder, most likely killer first
+        self.killFast = False
+        # Node ids in the order they are run. Tests that are not in it run afterwards in collection order
+        self.testOrder = None
+        # File name -> edits that turn the original source into the source of the mutated tree (see addSourceEdits())
+        self.sourceEdits = {}
+
+
+# Wall and CPU time of every phase of a run (coverage run, parsing, generating and writing mutants, pytest, ...), to find where a run spends
+# its time. Phases can be nested: a phase that starts while another one runs on the same thread is named "parent > child"
+# CPU time is the time of the thread that ran the phase, except for the phases inside of a pytest process, which mutation_plugin measures there
+# The phases are written as a Chrome trace (chrome://tracing or https://ui.perfetto.dev) and summed up in a table at the end of mutation-results.txt
+class phaseProfiler():
+    def __init__(self):
+        self.startTime = time.time()
+        # {"name", "iteration", "thread", "start": seconds since the epoch, "wall": seconds, "cpu": seconds or None}
+        self.events = []
+        self.lock = threading.Lock()
+        # Thread ident -> small thread number for the trace
+        self.threadNums = {}
+        # Names of the phases that are running on each thread
+        self.running = threading.local()
+
+    def __getRunning(self) -> list:
+        if not hasattr(self.running, "names"):
+            self.running.names = []
+        return self.running.names
+
+    # Name a phase started now on this thread gets
+    def getName(self, name: str) -> str:
+        return " > ".join(self.__getRunning() + [name])
+
+    # includeChildren adds the CPU time of the child processes that finished during the phase. Only use it where no other thread starts processes
+    @contextlib.contextmanager
+    def phase(self, name: str, iteration=None, includeChildren=False):
+        fullName = self.getName(name)
+        self.__getRunning().append(name)
+        startTime = time.time()
+        startCpu = time.thread_time()
+        startChildrenCpu = self.__getChildrenCpu()
+        startCounter = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.__getRunning().pop()
+            cpuTime = time.thread_time() - startCpu
+            if includeChildren:
+                cpuTime += self.__getChildrenCpu() - startChildrenCpu
+            self.add(fullName, startTime, time.perf_counter() - startCounter, cpuTime, iteration)
+
+    # CPU time of the child processes that were waited for (always 0 on Windows)
+    def __getChildrenCpu(self) -> float:
+        times = os.times()
+        return times.children_user + times.children_system
+
+    # Record a phase that was measured somewhere else (e.g. inside of pytest)
+    def add(self, fullName: str, startTime: float, wallTime: float, cpuTime, iteration=None):
+        with self.lock:
+            threadNum = self.threadNums.setdefault(threading.get_ident(), len(self.threadNums))
+            self.events.append({"name": fullName, "iteration": iteration, "thread": threadNum, "start": startTime, "wall": wallTime, "cpu": cpuTime})
+
+    # Index of the next event, to sum up the events of one part of a run
+    def mark(self) -> int:
+        with self.lock:
+            return len(self.events)
+
+    # Write every event in the Chrome trace event format. Times are in microseconds since the profiler was created
+    def writeTrace(self, fileName: str):
+        with self.lock:
+            events = list(self.events)
+        traceEvents = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": threadNum, "args": {"name": "main" if threadNum == 0 else "thread " + str(threadNum)}} for threadNum in range(len(self.threadNums))]
+        for event in events:
+            traceEvents.append({"name": event["name"].rsplit(" > ", 1)[-1], "cat": event["name"].split(" > ", 1)[0], "ph": "X", "pid": 1, "tid": event["thread"],
+                                "ts": round((event["start"] - self.startTime) * 1e6, 1), "dur": round(event["wall"] * 1e6, 1),
+                                "args": {"phase": event["name"], "iteration": event["iteration"], "cpu": event["cpu"]}})
+        with open(fileName, "w") as traceFile:
+            json.dump({"traceEvents": traceEvents, "displayTimeUnit": "ms"}, traceFile)
+
+    # Table of the total wall and CPU time of each phase since the given mark, and the iterations that took the longest
+    # Percentages are of the wall time from the start of the first phase to the end of the last one
+    def getSummary(self, sinceMark: int, numSlowest=5) -> str:
+        with self.lock:
+            events = self.events[sinceMark:]
+        if len(events) == 0:
+            return "No phases were recorded\n"
+        totalWallTime = max(event["start"] + event["wall"] for event in events) - min(event["start"] for event in events)
+        phases = {}
+        iterationTimes = {}
+        for event in events:
+            phase = phases.setdefault(event["name"], {"count": 0, "wall": 0.0, "cpu": None})
+            phase["count"] += 1
+            phase["wall"] += event["wall"]
+            if event["cpu"] is not None:
+                phase["cpu"] = (phase["cpu"] or 0.0) + event["cpu"]
+            # Top level phases of an iteration do not overlap
+            if event["iteration"] is not None and " > " not in event["name"]:
+                iterationTimes[event["iteration"]] = iterationTimes.get(event["iteration"], 0.0) + event["wall"]
+
+        summary = "Wall time: " + str(round(totalWallTime, 3)) + " s\n" + "Phase".ljust(48) + "Count".rjust(8) + "Wall (s)".rjust(12) + "CPU (s)".rjust(12) + "Mean wall (s)".rjust(15) + "% of run".rjust(10) + "\n"
+        # Phases are listed under the phase they ran in, the parents by their total wall time
+        def getSortKey(name):
+            parts = name.split(" > ")
+            return [(-phases.get(" > ".join(parts[:k + 1]), {"wall": 0.0})["wall"], parts[k]) for k in range(len(parts))]
+        for name in sorted(phases, key=getSortKey):
+            phase = phases[name]
+            depth = name.count(" > ")
+            summary += ("  " * depth + name.rsplit(" > ", 1)[-1]).ljust(48) + str(phase["count"]).rjust(8) + str(round(phase["wall"], 3)).rjust(12)
+            summary += ("-" if phase["cpu"] is None else str(round(phase["cpu"], 3))).rjust(12) + str(round(phase["wall"] / phase["count"], 4)).rjust(15)
+            summary += (str(round(100 * phase["wall"] / totalWallTime, 1)) if totalWallTime > 0 else "-").rjust(10) + "\n"
+
+        if len({event["thread"] for event in events}) > 1:
+            summary += "Phases of parallel jobs run side by side, so their percentages add up to more than 100\n"
+        if len(iterationTimes) > 0:
+            summary += "\nSlowest iterations:\n"
+            for iteration in sorted(iterationTimes, key=lambda iteration: -iterationTimes[iteration])[:numSlowest]:
+                summary += "\tIteration " + str(iteration) + ": " + str(round(iterationTimes[iteration], 3)) + " s\n"
+        return summary
+
+
+# Append-only store of the results of every mutant. Each test outcome is one JSON line in mutation-unit-test/mutation-results.jsonl:
+#   {"run": id of the mutate() call, "iteration": int, "mutant": enumerated mutant id or null, "mutations": [[file, line, column, old, new, occurrence], ...],
+#    "test": node id or null, "outcome": str, "message": str, "duration": seconds, "cached": bool}
+# Mutants dropped by the mutant filter get a single line with the reason they were skipped as their outcome. The file is kept between runs
+# so it can be queried by other tools. The records of the current run are also kept in memory to build the summary
+#
+# Every finished mutant is also checkpointed to mutation-unit-test/checkpoint.jsonl: a header line with the run id and the settings of the
+# run, then one line with the records of each finished mutant. Both files are synced to disk before the next mutant is recorded, so an
+# interrupted run can be resumed without running the finished mutants again. A line that was cut off by a crash is ignored
+class resultStore():
+    def __init__(self, fileName: str, checkpointFileName: str, profiler=None):
+        self.runId = None
+        # Writing the results is timed as the "store results" phase when a phaseProfiler is given
+        self.profiler = profiler
+        self.file = open(fileName, "a")
+        self.checkpointFileName = checkpointFileName
+        self.checkpoint = None
+        # Workers add results from several threads
+        self.lock = threading.Lock()
+        # Iteration -> records
+        self.iterations = {}
+        # Iterations that were loaded from the checkpoint of an interrupted run
+        self.resumedIterations = set()
+
+    def __writeDurably(self, stream, lines: list):
+        stream.write("".join(json.dumps(line) + "\n" for line in lines))
+        stream.flush()
+        os.fsync(stream.fileno())
+
+    # Start a new run. Replaces the checkpoint of the previous run
+    def startRun(self, settings: dict):
+        self.runId = datetime.datetime.now().isoformat()
+        self.checkpoint = open(self.checkpointFileName, "w")
+        self.__writeDurably(self.checkpoint, [{"run": self.runId, "settings": settings}])
+
+    # Continue the run in the checkpoint and load the mutants it finished. Returns the settings the run was started with
+    def resumeRun(self) -> dict:
+        if not Path(self.checkpointFileName).exists():
+            raise Exception('There is no checkpoint to resume from (' + self.checkpointFileName + ')')
+
+        with open(self.checkpointFileName, "r") as checkpointFile:
+            lines = checkpointFile.read().splitlines()
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            raise Exception('The checkpoint ' + self.checkpointFileName + ' is damaged and cannot be resumed from')
+        self.runId = header["run"]
+        for line in lines[1:]:
+            try:
+                finished = json.loads(line)
+            except ValueError:
+                continue
+            self.iterations[finished["iteration"]] = finished["records"]
+            self.resumedIterations.add(finished["iteration"])
+
+        self.checkpoint = open(self.checkpointFileName, "a")
+        return header["settings"]
+
+    def isResumed(self, iteration: int) -> bool:
+        return iteration in self.resumedIterations
+
+    # Add the results of a finished mutant
+    def add(self, mutant: mutantInfo, cached=False):
+        mutantRecord = {"run": self.runId, "iteration": mutant.iteration, "mutant": mutant.mutantId, "mutations": [list(mutation) for mutation in mutant.mutations]}
+        if mutant.skipReason is not None:
+            results = [{"test": None, "outcome": mutant.skipReason, "message": mutant.skipDetail, "duration": 0.0}]
+        else:
+            results = mutant.testResults
+
+        records = [dict(mutantRecord, **result, cached=cached) for result in results]
+        with self.lock, (contextlib.nullcontext() if self.profiler is None else self.profiler.phase("store results", mutant.iteration)):
+            # A worker can still finish a mutant after an interrupted run closed the store
+            if self.file.closed:
+                return
+            self.iterations[mutant.iteration] = records
+            self.__writeDurably(self.file, records)
+            self.__writeDurably(self.checkpoint, [{"iteration": mutant.iteration, "records": records}])
+
+    def getIteration(self, iteration: int) -> list:
+        return self.iterations.get(iteration, [])
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.close()
+            if self.checkpoint is not None:
+                self.checkpoint.close()
+
+
+# Kill history of every test, kept between runs in mutation-unit-test/kill-history.json. Used to order the tests of kill-fast runs:
+#   {"tests": {node id: {"runs": int, "kills": int, "time": total seconds}}, "sites": {"file:line": {node id: [runs, kills]}}}
+# A site is a mutated line, with the file relative to the current working directory. A test kills a mutant when it fails
+# Only mutants that are run are added, so cached and resumed mutants are not counted twice
+class killHistory():
+    def __init__(self, fileName: str):
+        self.fileName = fileName
+        # Workers add results from several threads
+        self.lock = threading.Lock()
+        self.tests = {}
+        self.sites = {}
+        if Path(fileName).exists():
+            try:
+                with open(fileName, "r") as historyFile:
+                    history = json.load(historyFile)
+                self.tests = history["tests"]
+                self.sites = history["sites"]
+            except (ValueError, KeyError, TypeError):
+                print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + " The kill history " + fileName + " is damaged and is started over." + Style.RESET_ALL)
+
+    def getSiteKey(self, fileName: str, lineNum: int) -> str:
+        return Path(os.path.relpath(fileName)).as_posix() + ":" + str(lineNum)
+
+    # Add the outcome of every test that ran against a mutant. Skipped tests, timeouts and exceeded resource limits do not say which test would have killed it
+    def add(self, mutant: mutantInfo):
+        siteKeys = {self.getSiteKey(mutation[0], mutation[1]) for mutation in mutant.mutations}
+        with self.lock:
+            for result in mutant.testResults:
+                if result["test"] is None or result["outcome"] not in ("passed", "failed", "error"):
+                    continue
+                killed = int(result["outcome"] == "failed")
+                test = self.tests.setdefault(result["test"], {"runs": 0, "kills": 0, "time": 0.0})
+                test["runs"] += 1
+                test["kills"] += killed
+                test["time"] += result["duration"]
+                for siteKey in siteKeys:
+                    site = self.sites.setdefault(siteKey, {}).setdefault(result["test"], [0, 0])
+                    site[0] += 1
+                    site[1] += killed
+
+    # Estimated probability that a test kills a mutant of the given sites. Its kill rate over every site (1/2 without any history) counts as
+    # one run at the sites, so a few runs at the sites already outweigh it
+    def getKillProbability(self, testId: str, siteKeys: set) -> float:
+        test = self.tests.get(testId, {"runs": 0, "kills": 0})
+        overallRate = (test["kills"] + 1) / (test["runs"] + 2)
+        runs = 0
+        kills = 0
+        for siteKey in siteKeys:
+            siteRuns, siteKills = self.sites.get(siteKey, {}).get(testId, [0, 0])
+            runs += siteRuns
+            kills += siteKills
+        return (kills + overallRate) / (runs + 1)
+
+    # Mean run time of a test against mutants. None if it never ran
+    def getMeanTime(self, testId: str):
+        test = self.tests.get(testId)
+        if test is None or test["runs"] == 0:
+            return None
+        return test["time"] / test["runs"]
+
+    # Replace the history file. It is written to a temporary file first so an interrupted write cannot damage it
+    def save(self):
+        with self.lock:
+            tempFileName = self.fileName + ".tmp"
+            with open(tempFileName, "w") as historyFile:
+                json.dump({"tests": self.tests, "sites": self.sites}, historyFile)
+            os.replace(tempFileName, self.fileName)
+
+
+# Stratified estimate of the mutation score (the fraction of mutants that the tests kill) from the mutants an adaptive run sampled so far
+# strata has the stratum of every enumerated mutant. The sample is drawn in proportion to the size of each stratum (see __getStratifiedOrder()),
+# so the variance is the one of a proportionally allocated stratified sample, with a finite population correction
+# For the variance, the kill rate of a stratum is smoothed to (kills + 1) / (mutants + 2), so a stratum where every mutant was killed (or none
+# was) does not look certain after a few mutants. Strata without a sampled mutant take the rate of the whole sample
+# A mutant is killed when a test failed, timed out or exceeded a resource limit. Mutants dropped by the mutant filter are left out
+class scoreEstimator():
+    def __init__(self, strata: list, confidence: float):
+        self.numMutants = len(strata)
+        # Stratum -> number of enumerated mutants
+        self.sizes = {}
+        for stratum in strata:
+            self.sizes[stratum] = self.sizes.get(stratum, 0) + 1
+        self.z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        # Stratum -> [sampled mutants, killed mutants]
+        self.counts = {}
+        self.numSampled = 0
+        self.numKilled = 0
+        # Iterations that were added, including the left out ones
+        self.numIterations = 0
+
+    # Add the records of the next iteration
+    def add(self, stratum, records: list):
+        self.numIterations += 1
+        if len(records) == 0 or (len(records) == 1 and records[0]["outcome"] in ("uncompilable", "equivalent", "duplicate")):
+            return
+        killed = int(any(record["outcome"] in ("failed", "timeout", "resource limit") for record in records))
+        counts = self.counts.setdefault(stratum, [0, 0])
+        counts[0] += 1
+        counts[1] += killed
+        self.numSampled += 1
+        self.numKilled += killed
+
+    # Returns (score, lower bound, upper bound of the confidence interval), or None before the first mutant
+    def getEstimate(self):
+        if self.numSampled == 0:
+            return None
+        sampleRate = self.numKilled / self.numSampled
+        smoothedSampleRate = (self.numKilled + 1) / (self.numSampled + 2)
+        score = 0.0
+        variance = 0.0
+        for stratum, size in self.sizes.items():
+            weight = size / self.numMutants
+            sampled, killed = self.counts.get(stratum, (0, 0))
+            if sampled == 0:
+                rate, smoothedRate = sampleRate, smoothedSampleRate
+            else:
+                rate, smoothedRate = killed / sampled, (killed + 1) / (sampled + 2)
+            score += weight * rate
+            variance += weight * smoothedRate * (1 - smoothedRate)
+        variance *= max(0.0, 1 - self.numSampled / self.numMutants) / self.numSampled
+        halfWidth = self.z * math.sqrt(variance)
+        return score, max(0.0, score - halfWidth), min(1.0, score + halfWidth)
+
+
+# Work queue in a shared directory (local, or on a network file system that every node mounts) between the coordinator of a distributed run
+# (mutate() with queueDir) and its workers (work()):
+#   run.json   the run id, the settings the workers need and the hashes of the unit test files
+#   tasks/     one task-<iteration>.json per mutant that waits for a worker: {"run", "iteration", "mutant": enumerated mutant id or null,
+#              "mutations": [[file, line, column, old, new, occurrence], ...], "sourceHashes": {file: hash of the unmutated file}, "testIds", "killFast", "testOrder"}
+#              Files are relative to the working directory of the coordinator and the workers
+#   claimed/   tasks that are being run. A worker claims a task by moving it here, which only one worker can do, and touches it while it runs
+#   results/   {"run", "iteration", "worker", "testResults", "timedOut", "exceededLimit"} of each finished task until the coordinator has stored it
+#   finished   the id of the last run that is finished. Its workers stop once they are out of tasks
+# Files are written under a temporary name and renamed into place, so a partial file is never read
+class workQueue():
+    # Seconds a claimed task can go without a heartbeat of its worker before it is handed to another worker
+    claimTimeout = 60.0
+
+    def __init__(self, queueDir):
+        self.path = Path(queueDir)
+        self.runPath = self.path / "run.json"
+        self.finishedPath = self.path / "finished"
+        self.tasksPath = self.path / "tasks"
+        self.claimedPath = self.path / "claimed"
+        self.resultsPath = self.path / "results"
+
+    def __getTaskName(self, iteration: int) -> str:
+        return "task-" + str(iteration) + ".json"
+
+    def __writeAtomically(self, filePath: Path, text: str):
+        tempPath = filePath.with_name(filePath.name + "." + socket.gethostname() + "-" + str(os.getpid()) + ".tmp")
+        tempPath.write_text(text)
+        os.replace(tempPath, filePath)
+
+    # Files of a queue directory, without temporary files. Another process can take a file at any time, so they are read with __readFile()
+    def __listFiles(self, dirPath: Path) -> list:
+        return list(dirPath.glob("*.json"))
+
+    # Contents of a JSON file, or None if it was removed or moved in the meantime
+    def __readFile(self, filePath: Path):
+        try:
+            return json.loads(filePath.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    # Coordinator: replace the tasks of any earlier run with the tasks of a new run. The run header is written last, so workers only see a
+    # run once all of its tasks are there
+    def publish(self, run: dict, tasks: list):
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.finishedPath.unlink(missing_ok=True)
+        for dirPath in (self.tasksPath, self.claimedPath, self.resultsPath):
+            if dirPath.exists():
+                rmtree(str(dirPath))
+            dirPath.mkdir()
+        for task in tasks:
+            self.__writeAtomically(self.tasksPath / self.__getTaskName(task["iteration"]), json.dumps(task))
+        self.__writeAtomically(self.runPath, json.dumps(run))
+
+    # Coordinator: results of the run that have not been removed yet
+    def getResults(self, runId: str) -> list:
+        results = []
+        for resultPath in self.__listFiles(self.resultsPath):
+            result = self.__readFile(resultPath)
+            if result is not None and result["run"] == runId:
+                results.append(result)
+        return results
+
+    # Coordinator: remove every file of a task once its result is stored, including a copy that was handed to another worker
+    def removeTask(self, iteration: int):
+        for dirPath in (self.tasksPath, self.claimedPath, self.resultsPath):
+            (dirPath / self.__getTaskName(iteration)).unlink(missing_ok=True)
+
+    # Coordinator: hand the tasks of workers that stopped sending heartbeats back to the queue. Returns their iterations
+    def requeueLostTasks(self) -> list:
+        requeued = []
+        for claimedPath in self.__listFiles(self.claimedPath):
+            try:
+                if time.time() - claimedPath.stat().st_mtime < self.claimTimeout:
+                    continue
+                os.rename(claimedPath, self.tasksPath / claimedPath.name)
+            except OSError:
+                continue
+            requeued.append(int(claimedPath.stem.split("-")[1]))
+        return requeued
+
+    # Coordinator: end a run. Tasks that were not claimed yet are dropped (when the run was interrupted) and the workers are told to stop
+    def finish(self, runId: str):
+        for taskPath in self.__listFiles(self.tasksPath):
+            taskPath.unlink(missing_ok=True)
+        self.__writeAtomically(self.finishedPath, runId)
+
+    # Worker: header of the current run. None if no run was published yet
+    def getRun(self):
+        return self.__readFile(self.runPath)
+
+    def isFinished(self, runId: str) -> bool:
+        try:
+            return self.finishedPath.read_text() == runId
+        except FileNotFoundError:
+            return False
+
+    # Worker: claim the waiting task with the lowest iteration. Returns None if there are no tasks left
+    def claim(self):
+        for taskPath in sorted(self.__listFiles(self.tasksPath), key=lambda taskPath: int(taskPath.stem.split("-")[1])):
+            claimedPath = self.claimedPath / taskPath.name
+            try:
+                # Another worker can claim the task first
+                os.rename(taskPath, claimedPath)
+            except OSError:
+                continue
+            # The claim time is the start of the heartbeat, a rename keeps the time the task was published
+            self.heartbeat(int(taskPath.stem.split("-")[1]))
+            task = self.__readFile(claimedPath)
+            if task is not None:
+                return task
+        return None
+
+    # Worker: show the coordinator that a claimed task is still running
+    def heartbeat(self, iteration: int):
+        try:
+            os.utime(self.claimedPath / self.__getTaskName(iteration))
+        except FileNotFoundError:
+            # The task was handed to another worker or the run is over
+            pass
+
+    # Worker: give a task back without running it
+    def release(self, iteration: int):
+        try:
+            os.rename(self.claimedPath / self.__getTaskName(iteration), self.tasksPath / self.__getTaskName(iteration))
+        except OSError:
+            pass
+
+    # Worker: hand in the result of a task
+    def complete(self, result: dict):
+        self.__writeAtomically(self.resultsPath / self.__getTaskName(result["iteration"]), json.dumps(result))
+        (self.claimedPath / self.__getTaskName(result["iteration"])).unlink(missing_ok=True)
+
+
+# Handle on a mutation_server process. The server keeps pytest and the imports of the code under test loaded and forks a child for every mutant
+class mutationServer():
+    def __init__(self, command: list, cwd, env: dict, logFilename: str):
+        if not hasattr(os, "fork"):
+            raise Exception('The fork server needs os.fork(), which is not available on this platform')
+
+        self.log = open(logFilename, "w+")
+        # Pid of the child that is running a mutant (None while idle)
+        self.childPid = None
+        self.process = subprocess.Popen(command, cwd=cwd, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self.log, text=True)
+        # Replies are read on a separate thread so waiting for one can time out. None is queued when the server exits
+        self.replies = queue.Queue()
+        threading.Thread(target=self.__readReplies, daemon=True).start()
+        if self.replies.get() is None:
+            raise Exception('The fork server exited before it was ready. See ' + logFilename)
+
+    def __readReplies(self):
+        for line in self.process.stdout:
+            self.replies.put(json.loads(line))
+        self.replies.put(None)
+
+    # Run pytest with the given arguments in a forked child and return its exit code and the test results mutation_plugin reported
+    # payload is marshaled mutants for the import hook (or None)
+    # If the child runs longer than timeout seconds, it and everything it started are killed and subprocess.TimeoutExpired is raised
+    def run(self, pytestArgs: list, logFilename: str, env: dict, payload=None, timeout=None):
+        request = {"args": pytestArgs, "log": logFilename, "env": env, "payload": None if payload is None else base64.b64encode(payload).decode()}
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+
+        # The pid of the child is sent first, then the test results, then its exit code
+        reply = self.replies.get()
+        if reply is None:
+            raise Exception('The fork server exited unexpectedly')
+        self.childPid = reply["pid"]
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        testResults = []
+        timedOut = False
+        while True:
+            try:
+                reply = self.replies.get(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                # The child leads its own process group. Keep reading until the server reports its exit code
+                timedOut = True
+                deadline = None
+                try:
+                    os.killpg(self.childPid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                continue
+
+            if reply is None or "returncode" in reply:
+                break
+            testResults.append(reply["result"])
+
+        self.childPid = None
+        if reply is None:
+            raise Exception('The fork server exited unexpectedly')
+        if timedOut:
+            raise subprocess.TimeoutExpired(pytestArgs, timeout)
+        return reply["returncode"], testResults
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+        self.log.close()
+
+    # Stop the server and the child that is running a mutant, if any
+    def kill(self):
+        if self.childPid is not None:
+            try:
+                os.killpg(self.childPid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.process.kill()
+
 
 
 class Mutation():
-    def __init__(self, moduleNameToTest: str, unitTestFileName: str, verbose=False):
+    def __init__(self, moduleNameToTest: str, unitTestFileName: str, verbose=False, analysisJobs=None, useAnalysisCache=True, useBaselineCache=True):
         self.unitTestFileName = unitTestFileName
         self.moduleNameToTest = moduleNameToTest
         self.verbose = verbose
+        if analysisJobs is not None and analysisJobs < 1:
+            raise Exception('analysisJobs must be > 0')
 
         self.logDir = Path(self.__getMutationDirName() + "/pytest-logs")
         self.resultFilepath = self.__getMutationDirName() + "/mutation-results.txt"
+        # Structured results of every mutant, kept between runs, and the checkpoint of the last run (see resultStore)
+        self.resultStoreFilepath = self.__getMutationDirName() + "/mutation-results.jsonl"
+        self.checkpointFilepath = self.__getMutationDirName() + "/checkpoint.jsonl"
+        # Kill history of every test, used to order the tests of kill-fast runs (see killHistory)
+        self.killHistoryFilepath = self.__getMutationDirName() + "/kill-history.json"
+        # Outcomes and coverage of the initial test run, reused while the source and the tests stay the same (see __loadBaseline())
+        self.baselineFilepath = self.__getMutationDirName() + "/baseline.json"
+        # Originals of the files a run writes over (see __backupSource())
+        self.backupPath = Path(self.__getMutationDirName() + "/backup-" + self.moduleNameToTest)
+        # Exists while a mutant may be written over the source. Only left behind when the run was killed (see __restoreStoppedRun())
+        self.backupMarkerPath = self.backupPath.parent / (self.backupPath.name + ".in-use")
         self.xmlDir = Path(self.__getMutationDirName() + "/xml")
 
         # List of analysisInfo() objects
         self.analysisInfoList = []
+        # File name -> treeIndex of parsed files, the one used last at the end (see __getTreeIndex())
+        self.treeCache = {}
+        self.treeCacheSize = 64
+        # pytest processes of mutants that are running, so they can be stopped when a run is interrupted
+        self.runningProcesses = set()
+        self.runningProcessesLock = threading.Lock()
+        # Held while mutants are written over the source and while a source file is read, so the next mutant is not generated from the
+        # mutated source of the one that runs
+        self.sourceLock = threading.RLock()
+        # Time spent in each phase of the run. The summary of each mutate() call covers the phases since the last one (see phaseProfiler)
+        self.profiler = phaseProfiler()
+        self.profileMark = 0
+        self.profileTraceFilepath = self.__getMutationDirName() + "/profile-trace.json"
+        # Run times of the unmutated tests from initial-report.xml. Used to scale the timeout of each mutant
+        self.baselineSuiteTime = 0.0
+        # (classname, name) -> seconds
+        self.baselineTestTimes = {}
         try:
+            # Before the source is analyzed or tested, so a mutant left by a killed run is never taken for the source
+            if self.backupMarkerPath.exists():
+                self.__restoreStoppedRun()
+
             if self.logDir.exists():
                 print("Removing old logs")
                 rmtree(str(self.logDir))
@@ -73,74 +865,82 @@ class Mutation():
             # (Re)make the mutation-unit-test/ folder
             self.logDir.mkdir(parents=True, exist_ok=True)
 
-            print("\nRunning initial pytest tests")
-            with open(str(self.logDir) + "/initial-pytest-log.txt", "w+") as covReportLog:
-                # Analyze tree - look for pieces of code the unit test actually covers
-                print("\nRunning a code coverage report on the given unit test file\n(This may take awhile)")
-                #p_init = subprocess.Popen("python3 -m pytest --junit-xml=\"" + str(self.xmlDir) + "/initial-report.xml\" --cov-report term-missing --cov=" + self.moduleNameToTest + " " + self.unitTestFileName, stdout=covReportLog, stderr=covReportLog)
-                p_init = subprocess.Popen("python3 -m pytest --junit-xml=\"" + str(self.xmlDir) + "/initial-report.xml\" --cov-report term-missing --cov=" + self.moduleNameToTest + " " + self.unitTestFileName)
-                p_init.wait()
+            # Only the test files that changed are run again if nothing else changed. Their old results are dropped from the baseline
+            fingerprint = self.__getBaselineFingerprint()
+            baseline = self.__loadBaseline() if useBaselineCache else None
+            changedTestFiles = None if baseline is None else self.__getChangedTestFiles(baseline["fingerprint"], fingerprint)
+            if changedTestFiles is None:
+                baseline = self.__runBaseline([self.unitTestFileName])
+            elif len(changedTestFiles) > 0:
+                print("\nTest file(s) changed since the last initial test run: " + ", ".join(changedTestFiles))
+                testFilesToRun = [testFile for testFile in changedTestFiles if testFile in fingerprint["testHashes"]]
+                baseline = self.__mergeBaseline(baseline, self.__runBaseline(testFilesToRun) if len(testFilesToRun) > 0 else None, changedTestFiles)
+            else:
+                print("\nThe source and the tests did not change since the last initial test run. Its results are reused from " + self.baselineFilepath)
+            if changedTestFiles is None or len(changedTestFiles) > 0:
+                baseline["fingerprint"] = fingerprint
+                self.__saveBaseline(baseline)
 
             with open(self.resultFilepath, "w+") as resultFile:
                 resultFile.write("----------------[Initialization Start]----------------\n")
-                # Check the pytest xml to see if any tests failed on default
-                initialXML = JUnitXml.fromfile(str(self.xmlDir) + "/initial-report.xml")
-                for suite in initialXML:
-                    initResultStr = "Suite " + str(suite.name) + " ran " + str(suite.tests) + " tests in " + str(suite.time) + " s\n"
-                    resultFile.write(initResultStr)
-                    if self.verbose:
-                        print(initResultStr)
+                if changedTestFiles is not None:
+                    resultFile.write("Initial test run reused from " + self.baselineFilepath + ("" if len(changedTestFiles) == 0 else ", except for " + ", ".join(changedTestFiles)) + "\n")
+                # Check the baseline to see if any tests failed on default
+                outcomes = {"passed": 0, "failed": 0, "error": 0, "skipped": 0}
+                for classname, name, testTime, outcome in baseline["testCases"]:
+                    self.baselineTestTimes[(classname, name)] = testTime
+                    outcomes[outcome] += 1
+                self.baselineSuiteTime = baseline["suiteTime"]
+
+                initResultStr = "Initial tests: " + str(len(baseline["testCases"])) + " tests in " + str(round(self.baselineSuiteTime, 3)) + " s\n"
+                resultFile.write(initResultStr)
+                if self.verbose:
+                    print(initResultStr)
 
-                    if suite.errors == 0 and suite.failures == 0 and suite.skipped == 0:
-                        print("All tests passed.\n")
-                    else:
-                        if suite.errors > 0:
-                            print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + str(suite.errors) + " initial test(s) threw an error! Mutation results may not be useful." + Style.RESET_ALL)
-                        if suite.failures > 0:
-                            print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + str(suite.failures) + " initial test(s) failed! Mutation results may not be useful." + Style.RESET_ALL)
-                        if suite.skipped > 0:
-                            print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + str(suite.skipped) + " initial test(s) were skipped! Mutation results may not be useful." + Style.RESET_ALL)
-
-                # Parse coverage data
-                print("\nParsing coverage report data")
-                report = CoverageData()
-                report.read()
+                if outcomes["error"] == 0 and outcomes["failed"] == 0 and outcomes["skipped"] == 0:
+                    print("All tests passed.\n")
+                else:
+                    if outcomes["error"] > 0:
+                        print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + str(outcomes["error"]) + " initial test(s) threw an error! Mutation results may not be useful." + Style.RESET_ALL)
+                    if outcomes["failed"] > 0:
+                        print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + str(outcomes["failed"]) + " initial test(s) failed! Mutation results may not be useful." + Style.RESET_ALL)
+                    if outcomes["skipped"] > 0:
+                        print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + str(outcomes["skipped"]) + " initial test(s) were skipped! Mutation results may not be useful." + Style.RESET_ALL)
+
+                # Coverage data of the baseline. Files are relative to the current working directory there
+                coverage = {os.path.abspath(fileName): fileCoverage for fileName, fileCoverage in baseline["coverage"].items()}
 
                 resultFile.write("\nCoverage Report Info:\n")
-                resultFile.write("Coverage file: " + str(report.base_filename()) + "\n")
+                resultFile.write("Coverage file: " + self.baselineFilepath + "\n")
                 resultFile.write("Measured files:\n")
 
                 if self.verbose:
-                    print("In coverage file: ", report.base_filename())
-                    print("Measured files: ", report.measured_files())
+                    print("In coverage file: ", self.baselineFilepath)
+                    print("Measured files: ", list(coverage))
 
-                for i in report.measured_files():
+                for i in coverage:
                     resultFile.write("\tFile: " + str(i) + "\n")
-                    resultFile.write("\tLine numbers: " + str(report.lines(i)) + "\n")
+                    resultFile.write("\tLine numbers: " + str(coverage[i]["lines"]) + "\n")
 
                     if self.verbose:
                         print("File: ", i)
-                        print("Line numbers: ", report.lines(i))
+                        print("Line numbers: ", coverage[i]["lines"])
 
-                # Load source(s) from file(s) and parse into tree(s)
+                # Load source(s) from file(s). The trees are parsed by the analysis and whenever a mutant is built, and are not kept
                 print()
-                for srcFileName in report.measured_files():
-                    print("Loading and parsing source from " + str(srcFileName))
-                    # It is possible to crash the Python interpreter with a sufficiently large/complex string due to stack depth limitations in Python’s AST compiler.
-                    srcString = self.__loadSource(srcFileName)
-                    tree = ast.parse(srcString)
+                for srcFileName, fileCoverage in coverage.items():
+                    print("Loading source from " + str(srcFileName))
+                    with self.profiler.phase("load source"):
+                        sourceHash = hashlib.sha256(self.__loadSource(srcFileName).encode()).hexdigest()
 
-                    self.analysisInfoList.append(analysisInfo(srcFileName, tree, report.lines(srcFileName)))
-                
-                # Remove .coverage file
-                covPath = Path(".coverage")
-                if covPath.exists():
-                    covPath.unlink()
+                    testsByLine = {int(lineNum): set(tests) for lineNum, tests in fileCoverage["testsByLine"].items()}
+                    self.analysisInfoList.append(analysisInfo(srcFileName, sourceHash, fileCoverage["lines"], testsByLine))
 
                 resultFile.write("\nAnalysis of source trees:\n")
                 # Analyze tree - Count various operator types in the relevant piece of code
+                with self.profiler.phase("analyze"):
+                    self.__analyzeSources(analysisJobs, useAnalysisCache)
                 for item in self.analysisInfoList:
-                    self.__astNodeVisitorCallbacks_analyze(item).visit(item.tree)
                     resultFile.write(str(item) + "\n")
                     if self.verbose :
                         print("Types and number of operators: ", item)
@@ -152,12 +952,153 @@ class Mutation():
             raise
 
 
+    # Convert the dynamic contexts recorded by pytest-cov ("path::test|phase") into a map of line number -> set of test node ids
+    # Lines that ran outside of any test are recorded with None so mutants on them run the whole suite
+    def __getTestsByLine(self, report: CoverageData, srcFileName: str) -> dict:
+        testsByLine = {}
+        for lineNum, contexts in report.contexts_by_lineno(srcFileName).items():
+            tests = set()
+            for context in contexts:
+                if context == "":
+                    tests.add(None)
+                else:
+                    tests.add(context.rsplit("|", 1)[0])
+            testsByLine[lineNum] = tests
+
+        return testsByLine
+
+
+    # Run the initial (unmutated) tests of the given test files or directories with coverage and return their baseline (see __loadBaseline())
+    def __runBaseline(self, testArgs: list) -> dict:
+        print("\nRunning initial pytest tests")
+        with open(str(self.logDir) + "/initial-pytest-log.txt", "w+") as covReportLog:
+            # Analyze tree - look for pieces of code the unit test actually covers
+            print("\nRunning a code coverage report on the given unit test file\n(This may take awhile)")
+            #p_init = subprocess.Popen(self.__getPytestCommand("--junit-xml=" + str(self.xmlDir) + "/initial-report.xml", "--cov-report", "term-missing", "--cov=" + self.moduleNameToTest, "--cov-context=test", self.unitTestFileName), stdout=covReportLog, stderr=covReportLog)
+            with self.profiler.phase("coverage run", includeChildren=True):
+                # The coverage contexts and the test cases of the report are node ids relative to the rootdir, which has to be the current working
+                # directory for them to match the ids the mutants are run with
+                p_init = subprocess.Popen(self.__getPytestCommand("--rootdir=.", "--junit-xml=" + str(self.xmlDir) + "/initial-report.xml", "--cov-report", "term-missing", "--cov=" + self.moduleNameToTest, "--cov-context=test", *testArgs), env=self.__getPytestEnv())
+                p_init.wait()
+
+        baseline = {"suiteTime": 0.0, "testCases": [], "coverage": {}}
+        initialXML = JUnitXml.fromfile(str(self.xmlDir) + "/initial-report.xml")
+        for suite in initialXML:
+            baseline["suiteTime"] += suite.time
+            for testcase in suite:
+                outcome = "passed"
+                for result in testcase.result:
+                    if isinstance(result, Error):
+                        outcome = "error"
+                    elif isinstance(result, Failure):
+                        outcome = "failed"
+                    elif isinstance(result, Skipped):
+                        outcome = "skipped"
+                baseline["testCases"].append([testcase.classname, testcase.name, testcase.time, outcome])
+
+        # Parse coverage data
+        print("\nParsing coverage report data")
+        report = CoverageData()
+        report.read()
+        for srcFileName in report.measured_files():
+            testsByLine = self.__getTestsByLine(report, srcFileName)
+            baseline["coverage"][self.__getRelativePath(srcFileName)] = {"lines": sorted(report.lines(srcFileName)), "testsByLine": {str(lineNum): list(tests) for lineNum, tests in testsByLine.items()}}
+
+        # Remove .coverage file
+        covPath = Path(".coverage")
+        if covPath.exists():
+            covPath.unlink()
+        return baseline
+
+    # Everything the baseline depends on: the interpreter, the arguments of Mutation(), the hashes of every .py file of the module(s) and of
+    # the unit tests, and of the configuration files of pytest and coverage in the current working directory
+    def __getBaselineFingerprint(self) -> dict:
+        configFiles = self.__getConfigFiles()
+        return {"python": sys.version, "moduleNameToTest": self.moduleNameToTest, "unitTestFileName": self.unitTestFileName,
+                "sourceHashes": self.__getModuleSourceHashes(),
+                "testHashes": self.__getTestFileHashes(), "configHashes": {name: self.__hashFile(name) for name in configFiles}}
+
+    # Test files that changed, were added or were removed since a baseline was recorded. Returns None if anything else changed, since then
+    # every test has to run again: the source, the configuration, the interpreter, or a .py file of the tests that is not a test file
+    # (a conftest.py or a helper module can change any test)
+    def __getChangedTestFiles(self, oldFingerprint: dict, fingerprint: dict):
+        for key, value in fingerprint.items():
+            if key != "testHashes" and oldFingerprint.get(key) != value:
+                return None
+
+        oldHashes = oldFingerprint.get("testHashes")
+        if not isinstance(oldHashes, dict):
+            return None
+        changedTestFiles = sorted(testFile for testFile in set(oldHashes) | set(fingerprint["testHashes"]) if oldHashes.get(testFile) != fingerprint["testHashes"].get(testFile))
+        for testFile in changedTestFiles:
+            # The file names pytest collects tests from by default
+            name = Path(testFile).name
+            if not (name.startswith("test_") or name.endswith("_test.py")):
+                return None
+        return changedTestFiles
+
+    # Replace the results of the changed test files in a baseline with the baseline of a run of only these files (None if none are left)
+    # Test cases are named by classname "dir.test_file.TestClass" (see __getBaselineTestTime()) and covering tests by node id "dir/test_file.py::..."
+    # Lines that were only covered by the changed test files are not covered anymore unless the new run covers them
+    def __mergeBaseline(self, baseline: dict, rerun, changedTestFiles: list) -> dict:
+        prefixes = [Path(testFile).with_suffix("").as_posix().replace("/", ".") for testFile in changedTestFiles]
+        merged = {"suiteTime": baseline["suiteTime"], "testCases": [], "coverage": {}}
+        for testCase in baseline["testCases"]:
+            if any(testCase[0] == prefix or testCase[0].startswith(prefix + ".") for prefix in prefixes):
+                merged["suiteTime"] -= testCase[2]
+            else:
+                merged["testCases"].append(testCase)
+
+        for fileName, fileCoverage in baseline["coverage"].items():
+            testsByLine = {}
+            for lineNum, tests in fileCoverage["testsByLine"].items():
+                tests = [test for test in tests if test is None or test.split("::")[0] not in changedTestFiles]
+                if len(tests) > 0:
+                    testsByLine[lineNum] = tests
+            lines = [lineNum for lineNum in fileCoverage["lines"] if str(lineNum) in testsByLine or str(lineNum) not in fileCoverage["testsByLine"]]
+            merged["coverage"][fileName] = {"lines": lines, "testsByLine": testsByLine}
+
+        if rerun is not None:
+            # The time of starting pytest is already in the suite time, so only the times of the new test cases are added
+            merged["testCases"] += rerun["testCases"]
+            merged["suiteTime"] += sum(testCase[2] for testCase in rerun["testCases"])
+            for fileName, fileCoverage in rerun["coverage"].items():
+                mergedCoverage = merged["coverage"].setdefault(fileName, {"lines": [], "testsByLine": {}})
+                mergedCoverage["lines"] = sorted(set(mergedCoverage["lines"]) | set(fileCoverage["lines"]))
+                for lineNum, tests in fileCoverage["testsByLine"].items():
+                    mergedCoverage["testsByLine"][lineNum] = list(set(mergedCoverage["testsByLine"].get(lineNum, [])) | set(tests))
+        return merged
+
+    # The baseline of the last initial test run, kept in mutation-unit-test/baseline.json:
+    #   {"fingerprint": see __getBaselineFingerprint(), "suiteTime": seconds, "testCases": [[classname, name, seconds, outcome], ...],
+    #    "coverage": {file: {"lines": [line numbers], "testsByLine": {line number: [node id, or null if the line ran outside of a test]}}}}
+    # Files are relative to the current working directory and outcome is "passed", "failed", "error" or "skipped". Returns None if there is no baseline
+    def __loadBaseline(self):
+        if not Path(self.baselineFilepath).exists():
+            return None
+        try:
+            with open(self.baselineFilepath, "r") as baselineFile:
+                baseline = json.load(baselineFile)
+            return {"fingerprint": dict(baseline["fingerprint"]), "suiteTime": float(baseline["suiteTime"]), "testCases": list(baseline["testCases"]), "coverage": dict(baseline["coverage"])}
+        except (ValueError, KeyError, TypeError):
+            print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + " The baseline " + self.baselineFilepath + " is damaged. The initial tests are run again." + Style.RESET_ALL)
+            return None
+
+    # Replace the baseline file. It is written to a temporary file first so an interrupted write cannot damage it
+    def __saveBaseline(self, baseline: dict):
+        tempFileName = self.baselineFilepath + ".tmp"
+        with open(tempFileName, "w") as baselineFile:
+            json.dump(baseline, baselineFile)
+        os.replace(tempFileName, self.baselineFilepath)
+
+
     # Loads Python source code from file. Returns that source code as a string
     def __loadSource(self, srcFileName: str):
         try:
             if not (srcFileName.lower().endswith('.py')):
                 raise Exception('This program only supports python source code in .py files')
-            with open(srcFileName, "r") as srcFile:
+            # Line endings are kept so the mutants can be written with the same ones
+            with open(srcFileName, "r", newline="") as srcFile:
                 srcStr = srcFile.read()
             
             return srcStr
@@ -175,29 +1116,77 @@ class Mutation():
 
 
 
-    # Visit each node in the tree to obtain information on what mutatable source is in the tree
-    # The information that is gathered is stored in analysisInfo
-    class __astNodeVisitorCallbacks_analyze(ast.NodeVisitor):
-        def __init__(self, analysis: analysisInfo):
-            self.analysis = analysis
-
-        def visit_UnaryOp(self, node):
-            self.analysis.operatorDict["unaryOps"].append((node.lineno, node.col_offset, type(node.op)))
-            self.generic_visit(node)
-        
-        def visit_BinOp(self, node):
-            self.analysis.operatorDict["binOps"].append((node.lineno, node.col_offset, type(node.op)))
-            self.generic_visit(node)
-        
-        def visit_BoolOp(self, node):
-            self.analysis.operatorDict["boolOps"].append((node.lineno, node.col_offset, type(node.op)))
-            self.generic_visit(node)
-        
-        def visit_Compare(self, node):
-            self.analysis.operatorDict["cmpOps"].append((node.lineno, node.col_offset, [type(item) for item in node.ops]))
-            self.generic_visit(node)
-    
-
+    # Find the operator sites of every measured file. The sites of a file whose content was analyzed before are loaded from the
+    # analysis cache (mutation-unit-test/analysis-cache.sqlite), the other files are analyzed in a process pool when there is more than one
+    def __analyzeSources(self, jobs, useCache: bool):
+        keys = {}
+        toAnalyze = []
+        cache = self.__openAnalysisCache() if useCache else None
+        try:
+            for item in self.analysisInfoList:
+                if cache is not None:
+                    keys[item.fileName] = self.__getAnalysisCacheKey(item.sourceHash)
+                    row = cache.execute("SELECT sites FROM site_tables WHERE key = ?", (keys[item.fileName],)).fetchone()
+                    if row is not None:
+                        item.operatorDict = self.__loadSiteTable(row[0])
+                        continue
+                toAnalyze.append(item)
+
+            if jobs is None:
+                jobs = os.cpu_count() or 1
+            # The pool is forked so it does not import the script that created the Mutation() object again
+            if len(toAnalyze) > 1 and jobs > 1 and "fork" in multiprocessing.get_all_start_methods():
+                numWorkers = min(jobs, len(toAnalyze))
+                with ProcessPoolExecutor(max_workers=numWorkers, mp_context=multiprocessing.get_context("fork")) as pool:
+                    operatorDicts = pool.map(analyzeSource, [item.fileName for item in toAnalyze], chunksize=max(1, len(toAnalyze) // (numWorkers * 4)))
+                    for item, operatorDict in zip(toAnalyze, operatorDicts):
+                        item.operatorDict = operatorDict
+            else:
+                for item in toAnalyze:
+                    # It is possible to crash the Python interpreter with a sufficiently large/complex string due to stack depth limitations in Python’s AST compiler.
+                    with self.profiler.phase("parse"):
+                        tree = item.parseTree()
+                    astNodeVisitorCallbacks_analyze(item).visit(tree)
+
+            if cache is not None and len(toAnalyze) > 0:
+                cache.executemany("INSERT OR REPLACE INTO site_tables (key, sites) VALUES (?, ?)", [(keys[item.fileName], self.__dumpSiteTable(item.operatorDict)) for item in toAnalyze])
+                cache.commit()
+        finally:
+            if cache is not None:
+                cache.close()
+
+        print("Analyzed " + str(len(toAnalyze)) + " source file(s), " + str(len(self.analysisInfoList) - len(toAnalyze)) + " loaded from the analysis cache")
+
+    # Open (and create if needed) the analysis cache under mutation-unit-test/. It stores the operator sites of each analyzed source
+    def __openAnalysisCache(self) -> sqlite3.Connection:
+        cache = sqlite3.connect(self.__getMutationDirName() + "/analysis-cache.sqlite")
+        cache.execute("CREATE TABLE IF NOT EXISTS site_tables (key TEXT PRIMARY KEY, sites TEXT NOT NULL)")
+        return cache
+
+    # The sites of a source only depend on its content, on the ast module of the Python version that parsed it and on the format of the sites
+    def __getAnalysisCacheKey(self, sourceHash: str) -> str:
+        keyHash = hashlib.sha256(sourceHash.encode())
+        keyHash.update(repr((sys.version_info[:2], "siteTable columns with occurrences")).encode())
+        return keyHash.hexdigest()
+
+    # Operator sites as JSON, one list for each column of a siteTable and the operator types by name:
+    #   {"binOps": [[line, ...], [column, ...], ["Add", ...], [occurrence, ...]], ...}
+    def __dumpSiteTable(self, operatorDict: dict) -> str:
+        sitesJson = {}
+        for key, sites in operatorDict.items():
+            sitesJson[key] = [sites.lineNums.tolist(), sites.colNums.tolist(), [siteTable.opTypes[code].__name__ for code in sites.ops], sites.occurrences.tolist()]
+        return json.dumps(sitesJson)
+
+    def __loadSiteTable(self, sitesJson: str) -> dict:
+        operatorDict = {}
+        for key, (lineNums, colNums, opNames, occurrences) in json.loads(sitesJson).items():
+            sites = siteTable()
+            sites.lineNums.extend(lineNums)
+            sites.colNums.extend(colNums)
+            sites.ops.extend(siteTable.opTypeCodes[getattr(ast, name)] for name in opNames)
+            sites.occurrences.extend(occurrences)
+            operatorDict[key] = sites
+        return operatorDict
 
     # Print out the source string
     def printSrc(self):
@@ -212,7 +1201,7 @@ class Mutation():
     # Print out the parse tree
     def printTree(self):
         for item in self.analysisInfoList:
-            srcStr = ast.dump(item.tree, indent=2)
+            srcStr = ast.dump(item.parseTree(), indent=2)
             print()
             print(Back.GREEN + "[Source file " + Style.BRIGHT + item.fileName + Style.NORMAL + " as a tree]" + Style.RESET_ALL)
             print(srcStr + "\n\n\n")
@@ -227,14 +1216,15 @@ class Mutation():
             # Some warnings about the unparse function from the library documentation:
             # Warning The produced code string will not necessarily be equal to the original code that generated the ast.AST object.
             # Trying to unparse a highly complex expression would result with RecursionError.
-            src = ast.unparse(tree)
+            with self.profiler.phase("unparse"):
+                src = ast.unparse(tree)
             if printSrc:
                 print("\n", src)
 
             if self.verbose:
                 print("Writing to file " + destinationFilename)
 
-            with open(destinationFilename, "w+") as destFile:
+            with self.profiler.phase("write file"), open(destinationFilename, "w+") as destFile:
                 destFile.write(src)
 
         except Exception as ex:
@@ -245,6 +1235,107 @@ class Mutation():
 
 
 
+    # Source of a mutated file: the original source with the source edits of the mutant spliced in, so everything but the mutated operators
+    # keeps its text, comments and line numbers. The tree is unparsed instead if an operator is not in the source where the tree puts it
+    def __getMutantSource(self, mutant: mutantInfo, fileName: str):
+        src = None
+        if fileName in mutant.sourceEdits:
+            with self.sourceLock, self.profiler.phase("splice"):
+                item = next(item for item in self.analysisInfoList if item.fileName == fileName)
+                src = self.__spliceSource(item.loadSource(), mutant.sourceEdits[fileName])
+        if src is None:
+            if self.verbose:
+                print("The mutations cannot be spliced into the source of " + fileName + ". Unparsing its tree")
+            with self.profiler.phase("unparse"):
+                src = ast.unparse(mutant.mutatedTrees[fileName])
+        return src
+
+
+
+    # Write the source of a mutated file (see __getMutantSource())
+    def __exportMutantSource(self, mutant: mutantInfo, fileName: str, destinationFilename):
+        try:
+            src = self.__getMutantSource(mutant, fileName)
+            if self.verbose:
+                print("Writing to file " + destinationFilename)
+
+            # The source has the line endings of the original file
+            with self.profiler.phase("write file"), open(destinationFilename, "w", newline="") as destFile:
+                destFile.write(src)
+
+        except Exception as ex:
+            print(Fore.WHITE + Back.RED + "[Error]" + Back.RESET + Style.BRIGHT + Fore.RED + " An exception of type " + type(ex).__name__ + " occurred when trying to write file " + destinationFilename + ":" + Style.RESET_ALL)
+            print(Fore.WHITE + Back.RED + "[Error]" + Back.RESET + Style.BRIGHT + Fore.RED + " " + str(ex) + Style.RESET_ALL)
+            raise
+
+
+
+    # Apply source edits (see addSourceEdits()) to a source. Only the text of the edits is read, so the time does not grow with the number
+    # of operators in the file. Returns None if an operator is not found where the edit expects it
+    def __spliceSource(self, source: str, edits: list):
+        lineStarts = [0] + [match.end() for match in re.finditer(r"\r\n|\r|\n", source)]
+
+        # Offset in the source of a position of the tree. Column numbers of the tree count UTF-8 bytes
+        def getOffset(pos):
+            lineNum, colNum = pos
+            if lineNum < 1 or lineNum > len(lineStarts):
+                return None
+            line = source[lineStarts[lineNum - 1]:lineStarts[lineNum] if lineNum < len(lineStarts) else len(source)]
+            if not line.isascii():
+                colNum = len(line.encode()[:colNum].decode(errors="ignore"))
+            return lineStarts[lineNum - 1] + colNum
+
+        # (start offset, end offset, new text) of each change
+        changes = []
+        for edit in edits:
+            start, end = getOffset(edit[1]), getOffset(edit[2])
+            if start is None or end is None or start > end:
+                return None
+            if edit[0] == "parens":
+                changes += [(start, start, "("), (end, end, ")")]
+                continue
+
+            # Between the operands there can only be the operator, white space, comments, line continuations and the parentheses
+            # of parenthesized operands
+            words = []
+            pos = start
+            while pos < end:
+                if source[pos] == "#":
+                    while pos < end and source[pos] not in "\r\n":
+                        pos += 1
+                elif source[pos] in " \t\f\r\n\\()":
+                    pos += 1
+                else:
+                    wordStart = pos
+                    while pos < end and source[pos] not in " \t\f\r\n\\()#":
+                        pos += 1
+                    words.append((wordStart, pos))
+            if [source[wordStart:wordEnd] for wordStart, wordEnd in words] != self.operator_symbols[edit[3]].split():
+                return None
+
+            opStart, opEnd = words[0][0], words[-1][1]
+            newText = self.operator_symbols[edit[4]]
+            # Keep word operators apart from the text around them
+            if newText[0].isalpha() and opStart > 0 and source[opStart - 1] not in " \t\f\r\n()":
+                newText = " " + newText
+            if newText[-1].isalpha() and opEnd < len(source) and source[opEnd] not in " \t\f\r\n()":
+                newText += " "
+            changes.append((opStart, opEnd, newText))
+
+        # Insertions come before a replacement that starts at the same offset. The sort is stable, so parentheses keep their order
+        changes.sort(key=lambda change: (change[0], change[1]))
+        parts = []
+        pos = 0
+        for start, end, newText in changes:
+            if start < pos:
+                return None
+            parts += [source[pos:start], newText]
+            pos = end
+        parts.append(source[pos:])
+        return "".join(parts)
+
+
+
     # Valid operators that can be used in the mutation
     mutation_operators = {
         "unaryOps": [ast.UAdd, ast.USub, ast.Not, ast.Invert],
@@ -253,102 +1344,131 @@ class Mutation():
         "cmpOps": [ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Is, ast.IsNot, ast.In, ast.NotIn]
     }
 
+    # Operator that each operator is replaced with by mutation_types.COMPLEMENT
+    complementary_operators = {
+        ast.UAdd: ast.USub, ast.USub: ast.UAdd,
+        ast.Add: ast.Sub, ast.Sub: ast.Add, ast.Mult: ast.Div, ast.Div: ast.Mult, ast.LShift: ast.RShift, ast.RShift: ast.LShift,
+        ast.And: ast.Or, ast.Or: ast.And,
+        ast.Eq: ast.NotEq, ast.NotEq: ast.Eq, ast.Lt: ast.Gt, ast.LtE: ast.GtE, ast.Gt: ast.Lt, ast.GtE: ast.LtE, ast.Is: ast.IsNot, ast.IsNot: ast.Is, ast.In: ast.NotIn, ast.NotIn: ast.In
+    }
+
+    # Source text of each operator. The words of "is not" and "not in" are separate tokens
+    operator_symbols = {
+        ast.UAdd: "+", ast.USub: "-", ast.Not: "not", ast.Invert: "~",
+        ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/", ast.FloorDiv: "//", ast.Mod: "%", ast.Pow: "**", ast.LShift: "<<", ast.RShift: ">>",
+        ast.BitOr: "|", ast.BitXor: "^", ast.BitAnd: "&", ast.MatMult: "@",
+        ast.And: "and", ast.Or: "or",
+        ast.Eq: "==", ast.NotEq: "!=", ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">=", ast.Is: "is", ast.IsNot: "is not", ast.In: "in", ast.NotIn: "not in"
+    }
+
+    # How tightly each operator binds (higher binds tighter), as in the grammar
+    operator_precedence = {
+        ast.Or: 1, ast.And: 2, ast.Not: 3,
+        ast.Eq: 4, ast.NotEq: 4, ast.Lt: 4, ast.LtE: 4, ast.Gt: 4, ast.GtE: 4, ast.Is: 4, ast.IsNot: 4, ast.In: 4, ast.NotIn: 4,
+        ast.BitOr: 5, ast.BitXor: 6, ast.BitAnd: 7, ast.LShift: 8, ast.RShift: 8, ast.Add: 9, ast.Sub: 9,
+        ast.Mult: 10, ast.MatMult: 10, ast.Div: 10, ast.FloorDiv: 10, ast.Mod: 10,
+        ast.UAdd: 11, ast.USub: 11, ast.Invert: 11, ast.Pow: 12
+    }
+
 
     # Node transformer callback functions and info for mutating the AST
+    # The operators to mutate are chosen when it is created. mutateTree() then builds the mutant without visiting the whole tree
     class __astNodeTransformerCallbacks_mutate(ast.NodeTransformer, mutation_types):
-        def __init__(self, operators: dict, mutationType, numRequestedMutations, analysisInfoNode: analysisInfo, resultFile, verbose=False):
-            validComplementaryOpsList = [ast.UAdd, ast.USub, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.LShift, ast.RShift, ast.And, ast.Or, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Is, ast.IsNot, ast.In, ast.NotIn]
+        # changedLineNums limits the operators that can be mutated to those lines (None allows every covered line)
+        # numRequestedMutations of None keeps every valid operator instead of picking some at random
+        # replacementOps (site (line number, column number, operator type, occurrence) -> new operator type) skips the search and applies exactly
+        # those mutations
+        def __init__(self, operators: dict, mutationType, numRequestedMutations, analysisInfoNode: analysisInfo, resultFile, verbose=False, changedLineNums=None, replacementOps=None):
             self.operators = operators
             self.mutationType = mutationType
             self.numMutated = 0
+            # Mutations that were applied: (line number, column number, original operator name, new operator name, occurrence)
+            self.mutations = []
+            # Edits of the source text that make the same mutations (see addSourceEdits())
+            self.sourceEdits = []
             self.verbose = verbose
+            self.replacementOps = replacementOps if replacementOps is not None else {}
 
-            # Initialize a list of operator line and column numbers that can be mutated based on mutationType
-            # random.choices() function may also be helpful
-            self.opsToMutate = []
-            
-            analysisDict = analysisInfoNode.operatorDict
             moduleName = Path(analysisInfoNode.fileName).name
             print("Mutating ", moduleName)
             resultFile.write("Mutating " + str(moduleName) + "\n")
+
+            if replacementOps is not None:
+                self.opsToMutate = list(replacementOps)
+            else:
+                self.opsToMutate = self.findValidOps(analysisInfoNode, changedLineNums)
+                self.numOps = len(self.opsToMutate)
+                validOpsStr = "Total number of valid operators found: " + str(self.numOps) + "\nNumber of operators that the user requested be mutated: " + str(numRequestedMutations) + "\n"
+                print(validOpsStr)
+                resultFile.write(validOpsStr)
+
+                if numRequestedMutations is not None:
+                    if numRequestedMutations > self.numOps:
+                        numRequestedMutations = self.numOps
+                        print(Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + " Number of requested mutations is larger than the number of mutatable operators! This will mutate all operators." + Style.RESET_ALL)
+
+                    # Randomly pick the requested number of ops. The picked ops keep the order they were found in
+                    self.opsToMutate = [self.opsToMutate[i] for i in sorted(random.sample(range(self.numOps), numRequestedMutations))]
+
+            if numRequestedMutations is not None or replacementOps is not None:
+                print("Operators that will be mutated:")
+                resultFile.write("\nList of operators that will be mutated:\n")
+                for i in self.opsToMutate:
+                    resultFile.write("\t" + str(i))
+                    print("\t", i)
+                print()
+                resultFile.write("\n\n")
+
+            self.numOps = len(self.opsToMutate)
+            # Hashed index of the ops to mutate so each visited node is checked in constant time
+            self.opsToMutateIndex = set(self.opsToMutate)
+
+
+
+        # Find the operator sites (line number, column number, operator type, occurrence) that can be mutated based on mutationType
+        # Only operators on covered lines (and on changedLineNums when given) are valid
+        def findValidOps(self, analysisInfoNode: analysisInfo, changedLineNums=None) -> list:
+            validComplementaryOpsList = list(Mutation.complementary_operators)
+            validOps = []
+            analysisDict = analysisInfoNode.operatorDict
+            lineNums = set(analysisInfoNode.coverageLineNums)
+            if changedLineNums is not None:
+                lineNums &= changedLineNums
             for key in analysisDict:
-                for item in range(len(analysisDict[key])):
+                for site in analysisDict[key]:
                     match self.mutationType:
                         case mutation_types.COMPLEMENT:
                             # Check both the valid complementary operator list and the given list of operators that are acceptable to mutate
-                            # Comparisons have lists of operators
-                            if type(analysisDict[key][item][2]) is list:
-                                for op in range(len(analysisDict[key][item][2])):
-                                    # Check that the operator is in the valid complementary operators list and provided list of operators to use. Also make sure the line number matches a coverage line number
-                                    if (analysisDict[key][item][2][op] in validComplementaryOpsList) and (analysisDict[key][item][2][op] in self.operators[key]) and (analysisDict[key][item][0] in analysisInfoNode.coverageLineNums):
-                                        # Split up lists into single operators
-                                        self.opsToMutate.append((analysisDict[key][item][0], analysisDict[key][item][1], analysisDict[key][item][2][op]))
-                                        if self.verbose:
-                                            print("Found valid operator in list: ", self.opsToMutate[-1])
-
-                            # Non comparison
-                            # Check that the operator is in the valid complementary operators list and provided list of operators to use. Also make sure the line number matches a coverage line number
-                            elif (analysisDict[key][item][2] in validComplementaryOpsList) and (analysisDict[key][item][2] in self.operators[key]) and (analysisDict[key][item][0] in analysisInfoNode.coverageLineNums):
-                                self.opsToMutate.append(analysisDict[key][item])
+                            # Also make sure the line number matches a coverage line number. Each operator of a comparison chain is a site of its own
+                            if (site[2] in validComplementaryOpsList) and (site[2] in self.operators[key]) and (site[0] in lineNums):
+                                validOps.append(site)
                                 if self.verbose:
-                                    print("Found valid operator: ", self.opsToMutate[-1])
+                                    print("Found valid operator: ", validOps[-1])
 
                         # Some mutations with RANDOM do not make sense/will probably not be allowed by the interpreter. Will need to fix those in the future.
                         case mutation_types.RANDOM:
-                            # Comparisons have lists of operators
-                            if type(analysisDict[key][item][2]) is list:
-                                for op in range(len(analysisDict[key][item][2])):
-                                    # Check that the operator is in the provided list of operators to use. Also make sure the line number matches a coverage line number
-                                    if (analysisDict[key][item][2][op] in self.operators[key]) and (analysisDict[key][item][0] in analysisInfoNode.coverageLineNums):
-                                        # Split up lists into single operators
-                                        self.opsToMutate.append((analysisDict[key][item][0], analysisDict[key][item][1], analysisDict[key][item][2][op]))
-                                        if self.verbose:
-                                            print("Found valid operator in list: ", self.opsToMutate[-1])
-
-                            # Non comparison
                             # Check that the operator is in the provided list of operators to use. Also make sure the line number matches a coverage line number
-                            elif (analysisDict[key][item][2] in self.operators[key]) and (analysisDict[key][item][0] in analysisInfoNode.coverageLineNums):
-                                self.opsToMutate.append(analysisDict[key][item])
+                            if (site[2] in self.operators[key]) and (site[0] in lineNums):
+                                validOps.append(site)
                                 if self.verbose:
-                                    print("Found valid operator: ", self.opsToMutate[-1])
+                                    print("Found valid operator: ", validOps[-1])
                         
                         case _:
                             raise Exception('Unknown mutation type!')
 
-            self.numOps = len(self.opsToMutate)
-            validOpsStr = "Total number of valid operators found: " + str(self.numOps) + "\nNumber of operators that the user requested be mutated: " + str(numRequestedMutations) + "\n"
-            print(validOpsStr)
-            resultFile.write(validOpsStr)
-            
-            if numRequestedMutations > self.numOps:
-                numRequestedMutations = self.numOps
-                print(Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + " Number of requested mutations is larger than the number of mutatable operators! This will mutate all operators." + Style.RESET_ALL)
-            
-            # Randomly remove ops from list to get to the number of requested mutations
-            for i in range(self.numOps - numRequestedMutations):
-                self.opsToMutate.pop(random.randrange(len(self.opsToMutate)))
-            
-            print("Operators that will be mutated:")
-            resultFile.write("\nList of operators that will be mutated:\n")
-            for i in self.opsToMutate:
-                resultFile.write("\t" + str(i))
-                print("\t", i)
-            print()
-            resultFile.write("\n\n")
-            
-            self.numOps = len(self.opsToMutate)
+            return validOps
 
 
 
         # Check the list to see if the node should be mutated
-        def shouldMutate(self, lineNum, ColNum, Ops):
-            nodeInfo = (lineNum, ColNum, type(Ops))
+        def shouldMutate(self, lineNum, ColNum, Ops, occurrence):
+            nodeInfo = (lineNum, ColNum, type(Ops), occurrence)
             if self.numMutated >= self.numOps:
                 # Something went wrong if this happens...
                 return False
 
             # check if op in list of ops to mutate
-            elif nodeInfo in self.opsToMutate:
+            elif nodeInfo in self.opsToMutateIndex:
                 return True 
 
             else:
@@ -356,191 +1476,283 @@ class Mutation():
 
 
 
-        # Mutate Unary Operators:
-        # UnaryOps: ast.UAdd, ast.USub, ast.Not, ast.Invert
-        def visit_UnaryOp(self, node):
-            self.generic_visit(node)
-            if self.shouldMutate(node.lineno, node.col_offset, node.op):
-                try:
-                    match self.mutationType:
-                        case mutation_types.COMPLEMENT:
-                            if isinstance(node.op, ast.UAdd):
-                                node.op = ast.USub()
-                                self.numMutated += 1
-
-                            elif isinstance(node.op, ast.USub):
-                                node.op = ast.UAdd()
-                                self.numMutated += 1
-                                
-                            else:
-                                print("Operator of type ", type(node.op), " does not have a complementary operator.")
+        # Choose the operator type that replaces the operator at site (line number, column number, operator type, occurrence) from the given group of operators (e.g. "binOps")
+        # Returns None if there is no valid replacement
+        def getReplacementOp(self, key, site):
+            opType = site[2]
+            if site in self.replacementOps:
+                return self.replacementOps[site]
 
-                        case mutation_types.RANDOM:
-                            # Make sure a different operator is chosen
-                            tmpOps = copy.deepcopy(self.operators["unaryOps"])
-                            tmpOps.remove(type(node.op))
-                            node.op = (random.choice(tmpOps))()
+            match self.mutationType:
+                case mutation_types.COMPLEMENT:
+                    return Mutation.complementary_operators.get(opType)
 
-                        case _:
-                            raise Exception('Unknown mutation type')
+                case mutation_types.RANDOM:
+                    # Make sure a different operator is chosen
+                    tmpOps = copy.deepcopy(self.operators[key])
+                    tmpOps.remove(opType)
+                    return random.choice(tmpOps)
 
-                except Exception:
-                    raise
+                case _:
+                    raise Exception('Unknown mutation type')
 
-            return node
 
 
-        
-        # Mutate Binary Operators
-        # BinOps: ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.LShift, ast.RShift, ast.BitOr, ast.BitXor, ast.BitAnd, ast.MatMult
-        def visit_BinOp(self, node):
-            self.generic_visit(node)
-            if self.shouldMutate(node.lineno, node.col_offset, node.op):
-                try:
-                    match self.mutationType:
-                        case mutation_types.COMPLEMENT:
-                            if isinstance(node.op, ast.Add):
-                                node.op = ast.Sub()
-                                self.numMutated += 1
-
-                            elif isinstance(node.op, ast.Sub):
-                                node.op = ast.Add()
-                                self.numMutated += 1       
-
-                            elif isinstance(node.op, ast.Mult):
-                                node.op = ast.Div()
-                                self.numMutated += 1
-                            
-                            elif isinstance(node.op, ast.Div):
-                                node.op = ast.Mult()
-                                self.numMutated += 1
-
-                            elif isinstance(node.op, ast.LShift):
-                                node.op = ast.RShift()
-                                self.numMutated += 1
-
-                            elif isinstance(node.op, ast.RShift):
-                                node.op = ast.LShift()
-                                self.numMutated += 1
+        # Every operator type that can replace an operator of type opType, in the order of the given group of operators
+        def getReplacementOps(self, key, opType) -> list:
+            match self.mutationType:
+                case mutation_types.COMPLEMENT:
+                    return [Mutation.complementary_operators[opType]] if opType in Mutation.complementary_operators else []
 
-                            else:
-                                print("Operator of type ", type(node.op), " does not have a complementary operator.")
+                case mutation_types.RANDOM:
+                    return [op for op in self.operators[key] if op is not opType]
 
-                        case mutation_types.RANDOM:
-                            tmpOps = copy.deepcopy(self.operators["binOps"])
-                            tmpOps.remove(type(node.op))
-                            node.op = (random.choice(tmpOps))()
+                case _:
+                    raise Exception('Unknown mutation type')
 
-                        case _:
-                            raise Exception('Unknown mutation type')
 
-                except Exception:
-                    raise
 
-            return node
+        # Build the mutant of an indexed tree. Only the operator nodes at the positions to mutate and the nodes on their paths are copied,
+        # the rest of the tree is shared with the index. The operators are mutated in the order the tree is visited, children first
+        def mutateTree(self, index: treeIndex):
+            opNodeIndices = sorted({i for lineNum, colNum, opType, occurrence in self.opsToMutateIndex for i in index.opNodesByPos.get((lineNum, colNum), [])})
+            mutatedTree, opNodes = index.copyPaths(opNodeIndices)
+            for i, node in zip(opNodeIndices, opNodes):
+                self.mutateNode(node, index.opNodes[i][2])
+            return mutatedTree
 
 
 
-        # Mutate the Boolean operators
+        # Mutate the operator(s) of a copied node. occurrences are those of the sites of its operators (see treeIndex)
+        # UnaryOps: ast.UAdd, ast.USub, ast.Not, ast.Invert
+        # BinOps: ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.LShift, ast.RShift, ast.BitOr, ast.BitXor, ast.BitAnd, ast.MatMult
         # BoolOps: ast.And, ast.Or
-        def visit_BoolOp(self, node):
+        # CmpOps: ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Is, ast.IsNot, ast.In, ast.NotIn
+        def mutateNode(self, node, occurrences: list):
+            # Comparisons are annoying because operators are in a list in the parse tree. The list is still shared with the indexed tree
+            if isinstance(node, ast.Compare):
+                node.ops = list(node.ops)
+                for op in range(len(node.ops)):
+                    if self.shouldMutate(node.lineno, node.col_offset, node.ops[op], occurrences[op]):
+                        newOp = self.getReplacementOp("cmpOps", (node.lineno, node.col_offset, type(node.ops[op]), occurrences[op]))
+                        if newOp is None:
+                            print("Operator of type ", type(node.ops[op]), " does not have a complementary operator.")
+                        else:
+                            self.mutations.append((node.lineno, node.col_offset, type(node.ops[op]).__name__, newOp.__name__, occurrences[op]))
+                            self.addSourceEdits(node, type(node.ops[op]), newOp, op)
+                            node.ops[op] = newOp()
+                            self.numMutated += 1
+                return
+
+            key = {ast.UnaryOp: "unaryOps", ast.BinOp: "binOps", ast.BoolOp: "boolOps"}[type(node)]
+            if self.shouldMutate(node.lineno, node.col_offset, node.op, occurrences[0]):
+                newOp = self.getReplacementOp(key, (node.lineno, node.col_offset, type(node.op), occurrences[0]))
+                if newOp is None:
+                    print("Operator of type ", type(node.op), " does not have a complementary operator.")
+                else:
+                    self.mutations.append((node.lineno, node.col_offset, type(node.op).__name__, newOp.__name__, occurrences[0]))
+                    self.addSourceEdits(node, type(node.op), newOp)
+                    node.op = newOp()
+                    self.numMutated += 1
+
+
+
+        # Expressions that bind tighter than any operator
+        atomTypes = (ast.Name, ast.Constant, ast.Attribute, ast.Subscript, ast.Call, ast.List, ast.Tuple, ast.Dict, ast.Set, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp, ast.JoinedStr)
+
+        # Record how a mutation is made in the source text: ("op", start, end, old operator type, new operator type) replaces the operator that
+        # is between the end of the operand before it and the start of the operand after it, and ("parens", start, end) puts parentheses
+        # around a node. Positions are (line number, column number) of the tree
+        # An operator that binds more or less tightly than the one it replaces would change how the source parses, so then the node and its
+        # operands are put in parentheses. Operands that are atoms (names, constants, calls, ...) never need them
+        # opIndex is the index of the operator in a comparison chain
+        def addSourceEdits(self, node, oldOp, newOp, opIndex=None):
+            def getStart(node):
+                return (node.lineno, node.col_offset)
+
+            def getEnd(node):
+                return (node.end_lineno, node.end_col_offset)
+
+            if isinstance(node, ast.UnaryOp):
+                operands = [node.operand]
+                gaps = [(getStart(node), getStart(node.operand))]
+            elif isinstance(node, ast.BinOp):
+                operands = [node.left, node.right]
+                gaps = [(getEnd(node.left), getStart(node.right))]
+            elif isinstance(node, ast.BoolOp):
+                # All the values of a BoolOp share its operator
+                operands = node.values
+                gaps = [(getEnd(left), getStart(right)) for left, right in zip(node.values, node.values[1:])]
+            else:
+                operands = [node.left] + node.comparators
+                gaps = [(getEnd(operands[opIndex]), getStart(operands[opIndex + 1]))]
+
+            for start, end in gaps:
+                self.sourceEdits.append(("op", start, end, oldOp, newOp))
+            if Mutation.operator_precedence[oldOp] != Mutation.operator_precedence[newOp]:
+                for parenNode in [node] + [operand for operand in operands if not isinstance(operand, self.atomTypes)]:
+                    self.sourceEdits.append(("parens", getStart(parenNode), getEnd(parenNode)))
+
+
+
+    # Node transformer that rewrites each mutatable operator into a call that picks the operator at runtime (mutant schemata)
+    # The mutations to switch on are read from the MUTATION_SCHEMA_ACTIVE environment variable when the module is imported, so one
+    # instrumented build of a module can run any of its mutants without being regenerated
+    class __astNodeTransformerCallbacks_schema(ast.NodeTransformer):
+        # Prepended to every instrumented module. Dunder names are used so they are not name mangled inside of class bodies
+        # MUTATION_SCHEMA_ACTIVE has the form "siteId=Op,siteId=Op1;Op2" (comparisons list an operator for each comparison in the chain)
+        schemaHeader = (
+            "import os as __mutation_os__\n"
+            "import operator as __mutation_operator__\n"
+            "__mutation_active__ = {int(siteId): ops.split(';') for siteId, ops in (item.split('=') for item in __mutation_os__.environ.get('MUTATION_SCHEMA_ACTIVE', '').split(',') if item)}\n"
+            "__mutation_ops__ = {\n"
+            "    'UAdd': __mutation_operator__.pos, 'USub': __mutation_operator__.neg, 'Not': __mutation_operator__.not_, 'Invert': __mutation_operator__.invert,\n"
+            "    'Add': __mutation_operator__.add, 'Sub': __mutation_operator__.sub, 'Mult': __mutation_operator__.mul, 'Div': __mutation_operator__.truediv,\n"
+            "    'FloorDiv': __mutation_operator__.floordiv, 'Mod': __mutation_operator__.mod, 'Pow': __mutation_operator__.pow, 'LShift': __mutation_operator__.lshift,\n"
+            "    'RShift': __mutation_operator__.rshift, 'BitOr': __mutation_operator__.or_, 'BitXor': __mutation_operator__.xor, 'BitAnd': __mutation_operator__.and_,\n"
+            "    'MatMult': __mutation_operator__.matmul,\n"
+            "    'Eq': __mutation_operator__.eq, 'NotEq': __mutation_operator__.ne, 'Lt': __mutation_operator__.lt, 'LtE': __mutation_operator__.le,\n"
+            "    'Gt': __mutation_operator__.gt, 'GtE': __mutation_operator__.ge, 'Is': __mutation_operator__.is_, 'IsNot': __mutation_operator__.is_not,\n"
+            "    'In': lambda a, b: a in b, 'NotIn': lambda a, b: a not in b\n"
+            "}\n"
+            "def __mutation_unaryop__(siteId, op, operand):\n"
+            "    if siteId in __mutation_active__:\n"
+            "        op = __mutation_active__[siteId][0]\n"
+            "    return __mutation_ops__[op](operand)\n"
+            "def __mutation_binop__(siteId, op, left, right):\n"
+            "    if siteId in __mutation_active__:\n"
+            "        op = __mutation_active__[siteId][0]\n"
+            "    return __mutation_ops__[op](left, right)\n"
+            "def __mutation_boolop__(siteId, op, value, *thunks):\n"
+            "    if siteId in __mutation_active__:\n"
+            "        op = __mutation_active__[siteId][0]\n"
+            "    isOr = op == 'Or'\n"
+            "    for thunk in thunks:\n"
+            "        if bool(value) == isOr:\n"
+            "            return value\n"
+            "        value = thunk()\n"
+            "    return value\n"
+            "def __mutation_compare__(siteId, ops, left, *thunks):\n"
+            "    ops = __mutation_active__.get(siteId, ops)\n"
+            "    for op, thunk in zip(ops, thunks):\n"
+            "        right = thunk()\n"
+            "        result = __mutation_ops__[op](left, right)\n"
+            "        if not result:\n"
+            "            return result\n"
+            "        left = right\n"
+            "    return result\n"
+        )
+
+        # index is the treeIndex of the tree that is instrumented, which numbers the sites of its operators
+        def __init__(self, operators: dict, analysisInfoNode: analysisInfo, firstSiteId: int, index: treeIndex):
+            self.operators = operators
+            self.coverageLineNums = set(analysisInfoNode.coverageLineNums)
+            self.nextSiteId = firstSiteId
+            # id of an operator node -> occurrences of the sites of its operators
+            self.occurrences = {id(node): occurrences for node, path, occurrences in index.opNodes}
+            # Site (line number, column number, operator type, occurrence) -> (schema site id, original operator names, index of the operator)
+            # The keys match the entries of opsToMutate. The index is the position of the operator in a comparison chain (0 otherwise)
+            self.sites = {}
+            # Operands after the first of boolean operators and comparisons are wrapped in lambdas to keep short circuiting
+            # Lambdas directly in a class body cannot see the names of the class, so those sites are left alone
+            self.inClassBody = [False]
+
+        # Add the runtime dispatch functions after the docstring and __future__ imports of the module
+        def insertHeader(self, tree):
+            insertAt = 0
+            for stmt in tree.body:
+                if isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant) and isinstance(stmt.value.value, str) and insertAt == 0:
+                    insertAt = 1
+                elif isinstance(stmt, ast.ImportFrom) and stmt.module == "__future__":
+                    insertAt = tree.body.index(stmt) + 1
+                else:
+                    break
+
+            tree.body[insertAt:insertAt] = ast.parse(self.schemaHeader).body
+            return ast.fix_missing_locations(tree)
+
+        # Only covered operators from the list of operators that can be mutated are instrumented
+        def shouldInstrument(self, lineNum, key, opTypes):
+            return lineNum in self.coverageLineNums and any(opType in self.operators[key] for opType in opTypes)
+
+        # Deferred operands are moved into a lambda, where they cannot yield, await or assign with :=
+        def canDefer(self, nodes):
+            if self.inClassBody[-1]:
+                return False
+            for node in nodes:
+                for child in ast.walk(node):
+                    if isinstance(child, (ast.Yield, ast.YieldFrom, ast.Await, ast.NamedExpr)):
+                        return False
+            return True
+
+        def addSite(self, node, opTypes):
+            siteId = self.nextSiteId
+            self.nextSiteId += 1
+            opNames = [op.__name__ for op in opTypes]
+            for op, (opType, occurrence) in enumerate(zip(opTypes, self.occurrences[id(node)])):
+                self.sites[(node.lineno, node.col_offset, opType, occurrence)] = (siteId, opNames, op)
+            return siteId
+
+        def makeCall(self, node, helper, args):
+            return ast.copy_location(ast.Call(func=ast.Name(id=helper, ctx=ast.Load()), args=args, keywords=[]), node)
+
+        def makeThunk(self, node):
+            return ast.copy_location(ast.Lambda(args=ast.arguments(posonlyargs=[], args=[], kwonlyargs=[], kw_defaults=[], defaults=[]), body=node), node)
+
+        def visit_ClassDef(self, node):
+            self.inClassBody.append(True)
             self.generic_visit(node)
-            if self.shouldMutate(node.lineno, node.col_offset, node.op):
-                try:
-                    match self.mutationType:
-                        case mutation_types.COMPLEMENT:
-                            if isinstance(node.op, ast.And):
-                                node.op = ast.Or()
-                                self.numMutated += 1
-
-                            elif isinstance(node.op, ast.Or):
-                                node.op = ast.And()
-                                self.numMutated += 1
-                                
-                            else:
-                                print("Operator of type ", type(node.op), " does not have a complementary operator.")
+            self.inClassBody.pop()
+            return node
 
-                        case mutation_types.RANDOM:
-                            # Make sure a different operator is chosen
-                            tmpOps = copy.deepcopy(self.operators["boolOps"])
-                            tmpOps.remove(type(node.op))
-                            node.op = (random.choice(tmpOps))()
-                        
-                        case _:
-                            raise Exception('Unknown mutation type')
+        def visit_FunctionDef(self, node):
+            self.inClassBody.append(False)
+            self.generic_visit(node)
+            self.inClassBody.pop()
+            return node
 
-                except Exception:
-                    raise
+        def visit_AsyncFunctionDef(self, node):
+            return self.visit_FunctionDef(node)
+
+        def visit_Lambda(self, node):
+            return self.visit_FunctionDef(node)
 
+        # Patterns only accept literals, so nothing in a case pattern can be replaced by a call
+        def visit_match_case(self, node):
+            if node.guard is not None:
+                node.guard = self.visit(node.guard)
+            node.body = [self.visit(stmt) for stmt in node.body]
             return node
-        
 
+        def visit_UnaryOp(self, node):
+            self.generic_visit(node)
+            if not self.shouldInstrument(node.lineno, "unaryOps", [type(node.op)]):
+                return node
+            siteId = self.addSite(node, [type(node.op)])
+            return self.makeCall(node, "__mutation_unaryop__", [ast.Constant(siteId), ast.Constant(type(node.op).__name__), node.operand])
 
-        # Mutate comparison operators. This one is annoying because operators are in a list in the parse tree
-        # CmpOps: ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Is, ast.IsNot, ast.In, ast.NotIn
-        def visit_Compare(self, node):
+        def visit_BinOp(self, node):
             self.generic_visit(node)
-            for op in range(len(node.ops)):
-                if self.shouldMutate(node.lineno, node.col_offset, node.ops[op]):
-                    try:
-                        match self.mutationType:
-                            case mutation_types.COMPLEMENT:
-                                if isinstance(node.ops[op], ast.Eq):
-                                    node.ops[op] = ast.NotEq()
-                                    self.numMutated += 1
-
-                                elif isinstance(node.ops[op], ast.NotEq):
-                                    node.ops[op] = ast.Eq()
-                                    self.numMutated += 1
-                                
-                                elif isinstance(node.ops[op], ast.Lt):
-                                    node.ops[op] = ast.Gt()
-                                    self.numMutated += 1
-                                
-                                elif isinstance(node.ops[op], ast.LtE):
-                                    node.ops[op] = ast.GtE()
-                                    self.numMutated += 1
-                                
-                                elif isinstance(node.ops[op], ast.Gt):
-                                    node.ops[op] = ast.Lt()
-                                    self.numMutated += 1
-                                
-                                elif isinstance(node.ops[op], ast.GtE):
-                                    node.ops[op] = ast.LtE()
-                                    self.numMutated += 1
-                                
-                                elif isinstance(node.ops[op], ast.Is):
-                                    node.ops[op] = ast.IsNot()
-                                    self.numMutated += 1
-                                
-                                elif isinstance(node.ops[op], ast.IsNot):
-                                    node.ops[op] = ast.Is()
-                                    self.numMutated += 1
-                                
-                                elif isinstance(node.ops[op], ast.In):
-                                    node.ops[op] = ast.NotIn()
-                                    self.numMutated += 1
-                                
-                                elif isinstance(node.ops[op], ast.NotIn):
-                                    node.ops[op] = ast.In()
-                                    self.numMutated += 1
-                                    
-                                else:
-                                    print("Operator of type ", type(node.ops[op]), " does not have a complementary operator.")
-
-                            case mutation_types.RANDOM:
-                                # Make sure a different operator is chosen
-                                tmpOps = copy.deepcopy(self.operators["cmpOps"])
-                                tmpOps.remove(type(node.ops[op]))
-                                node.ops[op] = (random.choice(tmpOps))()
-                            
-                            case _:
-                                raise Exception('Unknown mutation type')
-
-                    except Exception:
-                        raise
+            if not self.shouldInstrument(node.lineno, "binOps", [type(node.op)]):
+                return node
+            siteId = self.addSite(node, [type(node.op)])
+            return self.makeCall(node, "__mutation_binop__", [ast.Constant(siteId), ast.Constant(type(node.op).__name__), node.left, node.right])
 
-            return node
+        def visit_BoolOp(self, node):
+            self.generic_visit(node)
+            if not self.shouldInstrument(node.lineno, "boolOps", [type(node.op)]) or not self.canDefer(node.values[1:]):
+                return node
+            siteId = self.addSite(node, [type(node.op)])
+            return self.makeCall(node, "__mutation_boolop__", [ast.Constant(siteId), ast.Constant(type(node.op).__name__), node.values[0]] + [self.makeThunk(value) for value in node.values[1:]])
+
+        def visit_Compare(self, node):
+            self.generic_visit(node)
+            opTypes = [type(op) for op in node.ops]
+            if not self.shouldInstrument(node.lineno, "cmpOps", opTypes) or not self.canDefer(node.comparators):
+                return node
+            siteId = self.addSite(node, opTypes)
+            opNames = ast.Tuple(elts=[ast.Constant(op.__name__) for op in opTypes], ctx=ast.Load())
+            return self.makeCall(node, "__mutation_compare__", [ast.Constant(siteId), opNames, node.left] + [self.makeThunk(comparator) for comparator in node.comparators])
 
 
     def __getMutationDirName(self) -> str:
@@ -550,160 +1762,1380 @@ class Mutation():
         return str(Path().resolve()) + "/" + self.moduleNameToTest
 
 
+    # Command used to launch pytest. The interpreter running this program is reused so the same packages are available
+    def __getPytestCommand(self, *args) -> list:
+        return [sys.executable, "-m", "pytest"] + list(args)
+
+    # Environment for pytest processes. Bytecode is not written so a mutated source can never be shadowed by a stale .pyc
+    # The directory of this file is added to the path so pytest can load mutation_plugin
+    def __getPytestEnv(self) -> dict:
+        env = dict(os.environ)
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+        env["PYTHONPATH"] = str(Path(__file__).resolve().parent) + (os.pathsep + env["PYTHONPATH"] if "PYTHONPATH" in env else "")
+        return env
+
+    # Path of a file relative to the current working directory, the same on every checkout of the code
+    def __getRelativePath(self, fileName: str) -> str:
+        return Path(os.path.relpath(fileName)).as_posix()
+
+    # Compile the mutated trees and marshal them for mutation_plugin's import hook, which serves them by their resolved file name
+    # Trees that were already compiled (compiledCode: file name -> code object) are not compiled again
+    def __getImportHookPayload(self, mutatedSources: dict, compiledCode=None) -> bytes:
+        mutants = {}
+        with self.profiler.phase("compile mutants"):
+            for fileName, mutatedTree in mutatedSources.items():
+                if compiledCode is not None and fileName in compiledCode:
+                    code = compiledCode[fileName]
+                else:
+                    code = compile(mutatedTree, fileName, "exec")
+                mutants[os.path.realpath(fileName)] = code
+
+            return marshal.dumps(mutants)
+
+
+    # Create one scratch copy of the module(s) and test(s) for each worker so mutants can run side by side
+    # Each sandbox mirrors the layout of the current working directory so the tests import the sandboxed module. The configuration files are
+    # copied too, so paths in them (pythonpath, testpaths) point into the sandbox, and pytest runs with the sandbox as its rootdir
+    # The .py files are hard links to the originals (see __linkOrCopy()), so a sandbox costs about as much as listing the files, and a mutant
+    # only replaces the links of the files it mutates
+    def __createWorkerSandboxes(self, jobs: int) -> list:
+        with self.profiler.phase("create sandboxes"):
+            sandboxRoot = Path(self.__getMutationDirName() + "/workers")
+            if sandboxRoot.exists():
+                rmtree(str(sandboxRoot))
+
+            sandboxes = []
+            for k in range(jobs):
+                sandbox = sandboxRoot / ("worker-" + str(k))
+                for relPath in (self.moduleNameToTest, self.unitTestFileName):
+                    srcPath = Path(relPath).resolve()
+                    destPath = sandbox / srcPath.relative_to(Path().resolve())
+                    if srcPath.is_dir():
+                        copytree(str(srcPath), str(destPath), ignore=ignore_patterns("mutation-unit-test", "__pycache__"), copy_function=self.__linkOrCopy, dirs_exist_ok=True)
+                    else:
+                        destPath.parent.mkdir(parents=True, exist_ok=True)
+                        self.__linkOrCopy(str(srcPath), str(destPath))
+                for configFile in self.__getConfigFiles():
+                    if not (sandbox / configFile).exists():
+                        self.__linkOrCopy(configFile, str(sandbox / configFile))
+                sandboxes.append(sandbox)
+
+            return sandboxes
+
+    # Put a file into a sandbox as a hard link to the original. Other files are copied, since tests may write to their data files, and so
+    # are files on file systems without hard links or where the sandbox is on another device
+    # A hard link shares its contents with the original, so it is never written to. It is removed and replaced instead (see __runIteration())
+    def __linkOrCopy(self, srcFilename, destFilename):
+        if str(srcFilename).endswith(".py"):
+            try:
+                os.link(srcFilename, destFilename)
+                return destFilename
+            except OSError:
+                pass
+        return copy2(srcFilename, destFilename)
+
+    # Keep the original of a file that is about to be written over for the first time in a run in mutation-unit-test/backup-<module>/. Only
+    # the files that are written over are kept. The marker is created before the first one, so if this process is killed while a mutant is
+    # written, the next Mutation() of the module puts the originals back (see __restoreStoppedRun())
+    def __backupSource(self, fileName: str, source: bytes):
+        try:
+            backupFile = self.backupPath / Path(fileName).resolve().relative_to(Path(self.__getFullModulesToTestPath()).resolve())
+        except ValueError:
+            raise Exception('File ' + str(fileName) + ' is not inside of ' + self.moduleNameToTest + ' and cannot be backed up')
+        if not backupFile.exists():
+            with self.profiler.phase("backup"):
+                self.backupMarkerPath.touch()
+                backupFile.parent.mkdir(parents=True, exist_ok=True)
+                # A backup that is cut off by a kill would be restored over the unmutated source
+                tempFile = backupFile.with_name(backupFile.name + ".tmp")
+                tempFile.write_bytes(source)
+                os.replace(str(tempFile), str(backupFile))
+
+    # Write the files in the backup back over the source. Every other file was never written to
+    def __restoreBackup(self):
+        for backupFile in self.backupPath.rglob("*"):
+            if backupFile.is_file() and backupFile.suffix != ".tmp":
+                copy2(str(backupFile), self.__getFullModulesToTestPath() + "/" + backupFile.relative_to(self.backupPath).as_posix())
+
+    # A run that writes over the source was killed (SIGKILL, out of memory, preempted CI job) and may have left a mutant in the source. The
+    # backup is restored but kept, it is only replaced by the backup of the next run
+    def __restoreStoppedRun(self):
+        if self.backupPath.exists():
+            print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + " A run was stopped while mutants were written over the source. Restoring the source from " + str(self.backupPath) + Style.RESET_ALL)
+            self.__restoreBackup()
+        self.backupMarkerPath.unlink()
+
+    # Location of a measured file inside of a sandbox
+    def __getSandboxPath(self, sandbox: Path, fileName: str) -> Path:
+        try:
+            return sandbox / Path(fileName).resolve().relative_to(Path().resolve())
+        except ValueError:
+            raise Exception('File ' + str(fileName) + ' is not inside of the current working directory and cannot be sandboxed')
+
+
+    # Apply the requested mutations to a copy of every tree and return them as a mutantInfo
+    # Text that would normally go to the result file is kept in the mutantInfo so iterations can be written in order
+    # When coveringTestsOnly is set, only the tests that reach the mutated lines are run (unless a mutated line ran outside of a test)
+    # With schemaSites the trees are not copied. The chosen mutations are switched on in the schema build through the environment instead
+    # changedLines (resolved file path -> set of line numbers) limits the mutations to those lines. Files without changed lines are not mutated
+    # enumeratedMutant (an entry of __enumerateMutants()) applies exactly that mutation instead of choosing mutations at random
+    # replayedOps (file name -> replacementOps of the mutate transformer) applies exactly those mutations, e.g. the mutations of a task of a distributed run
+    def __generateIteration(self, i: int, mutation_type: mutation_types, numMutations: int, printSrcAfterMutate: bool, coveringTestsOnly=False, schemaSites=None, changedLines=None, enumeratedMutant=None, replayedOps=None) -> mutantInfo:
+        mutant = mutantInfo(i)
+        iterationBuffer = io.StringIO()
+        coveringTests = set()
+        schemaActive = {}
+        replacementOps = None
+        if enumeratedMutant is not None:
+            mutant.mutantId, fileName, site, newOp = enumeratedMutant
+            replacementOps = {site: newOp}
+            iterationBuffer.write("Mutant " + mutant.mutantId + "\n")
+
+        for item in self.analysisInfoList:
+            if enumeratedMutant is not None and item.fileName != fileName:
+                continue
+            if replayedOps is not None:
+                if item.fileName not in replayedOps:
+                    continue
+                replacementOps = replayedOps[item.fileName]
+            changedLineNums = None
+            if changedLines is not None:
+                changedLineNums = changedLines.get(str(Path(item.fileName).resolve()), set())
+                if len(changedLineNums) == 0:
+                    continue
+
+            with self.profiler.phase("choose mutations"):
+                transformer = self.__astNodeTransformerCallbacks_mutate(self.mutation_operators, mutation_type, numMutations, item, iterationBuffer, self.verbose, changedLineNums, replacementOps)
+            if schemaSites is not None:
+                self.__setSchemaActive(transformer, schemaSites[item.fileName], schemaActive, iterationBuffer)
+                mutant.mutations += [(item.fileName,) + mutation for mutation in transformer.mutations]
+            elif len(transformer.opsToMutate) > 0:
+                index = self.__getTreeIndex(item)
+                # Operator nodes have no location, so the new operators do not need fix_missing_locations()
+                with self.profiler.phase("transform"):
+                    mutatedTree = transformer.mutateTree(index)
+
+                # Files without mutations keep their source and are left out of the mutant
+                if len(transformer.mutations) > 0:
+                    mutant.mutatedTrees[item.fileName] = mutatedTree
+                    mutant.sourceEdits[item.fileName] = transformer.sourceEdits
+                    if printSrcAfterMutate:
+                        print(self.__getMutantSource(mutant, item.fileName))
+
+                    mutant.mutations += [(item.fileName,) + mutation for mutation in transformer.mutations]
+
+            for op in transformer.opsToMutate:
+                coveringTests |= item.coverageTestsByLine.get(op[0], {None})
+
+        if schemaSites is not None:
+            mutant.env["MUTATION_SCHEMA_ACTIVE"] = ",".join(str(siteId) + "=" + ";".join(ops) for siteId, ops in schemaActive.items())
+            iterationBuffer.write("Active schema sites: " + mutant.env["MUTATION_SCHEMA_ACTIVE"] + "\n\n")
+
+        if coveringTestsOnly and None not in coveringTests and len(coveringTests) > 0:
+            mutant.testIds = sorted(coveringTests)
+            iterationBuffer.write("Tests covering the mutated lines: " + str(len(coveringTests)) + "\n")
+            for test in mutant.testIds:
+                iterationBuffer.write("\t" + test + "\n")
+            iterationBuffer.write("\n")
+
+        mutant.resultText = iterationBuffer.getvalue()
+        return mutant
+
+    # Index of the tree of a file, from the tree cache or parsed if it is not in the cache. The trees are shared with the mutants built
+    # from them and must not be changed
+    # The cache holds up to treeCacheSize trees. When it is full, the tree that was used last is dropped: iterations go through the files
+    # in the same order every time, so dropping the oldest tree would drop each tree right before it is needed again
+    def __getTreeIndex(self, item: analysisInfo) -> treeIndex:
+        index = self.treeCache.pop(item.fileName, None)
+        if index is None:
+            with self.sourceLock, self.profiler.phase("parse"):
+                index = treeIndex(item.parseTree())
+            while len(self.treeCache) > 0 and len(self.treeCache) >= self.treeCacheSize:
+                del self.treeCache[next(reversed(self.treeCache))]
+        self.treeCache[item.fileName] = index
+        return index
+
+    # Every single mutation that can be made: one entry (mutant id, file name, (line number, column number, operator type, occurrence), new
+    # operator type) for each operator and each of its replacements. Entries are ordered by file, position and operator, so the same source
+    # always gives the same list. The mutant id ("file:line:column:Old->New", with the file relative to the working directory, and
+    # "file:line:column#occurrence:Old->New" for the sites after the first with the same position and operator, see siteTable) does not
+    # depend on the other entries and stays the same between runs
+    def __enumerateMutants(self, mutation_type: mutation_types, resultFile, changedLines=None) -> list:
+        with self.profiler.phase("enumerate"):
+            mutants = []
+            # Coverage reports the measured files in no particular order
+            for item in sorted(self.analysisInfoList, key=lambda item: self.__getRelativePath(item.fileName)):
+                changedLineNums = None
+                if changedLines is not None:
+                    changedLineNums = changedLines.get(str(Path(item.fileName).resolve()), set())
+                    if len(changedLineNums) == 0:
+                        continue
+
+                transformer = self.__astNodeTransformerCallbacks_mutate(self.mutation_operators, mutation_type, None, item, resultFile, self.verbose, changedLineNums)
+                sites = sorted(transformer.opsToMutate, key=lambda site: (site[0], site[1], site[2].__name__, site[3]))
+                for lineNum, colNum, opType, occurrence in sites:
+                    key = next(key for key in self.mutation_operators if opType in self.mutation_operators[key])
+                    position = str(lineNum) + ":" + str(colNum) + ("#" + str(occurrence) if occurrence > 0 else "")
+                    for newOp in transformer.getReplacementOps(key, opType):
+                        mutantId = self.__getRelativePath(item.fileName) + ":" + position + ":" + opType.__name__ + "->" + newOp.__name__
+                        mutants.append((mutantId, item.fileName, (lineNum, colNum, opType, occurrence), newOp))
+
+            return mutants
+
+    # Stratum of an enumerated mutant for adaptive sampling: its file and the category of its operator in operatorDict
+    def __getStratum(self, enumeratedMutant) -> tuple:
+        opType = enumeratedMutant[2][2]
+        return (enumeratedMutant[1], next(key for key in self.mutation_operators if opType in self.mutation_operators[key]))
+
+    # Order enumerated mutants for adaptive sampling, so that the first n of them are a random sample with about the same share of every
+    # stratum as the whole enumeration: each stratum is shuffled and its k-th mutant is placed at (k + offset) / stratum size, with a random
+    # offset for each stratum. The order only depends on the seed, so a resumed run samples the same mutants
+    def __getStratifiedOrder(self, enumeratedMutants: list, seed) -> list:
+        rng = random.Random(seed)
+        strata = {}
+        for k, enumeratedMutant in enumerate(enumeratedMutants):
+            strata.setdefault(self.__getStratum(enumeratedMutant), []).append(k)
+        positions = []
+        for indices in strata.values():
+            rng.shuffle(indices)
+            offset = rng.random()
+            positions += [((rank + offset) / len(indices), k) for rank, k in enumerate(indices)]
+        positions.sort()
+        return [enumeratedMutants[k] for position, k in positions]
+
+    # Whether an adaptive run has sampled enough before it starts iteration nextIteration: the confidence interval of the score is at most
+    # targetWidth wide, or timeBudget seconds have passed since startTime. The results of the iterations before nextIteration are added to
+    # the estimate first. The reason to stop is written to the result file
+    def __shouldStopSampling(self, estimator: scoreEstimator, store: resultStore, enumeratedMutants: list, nextIteration: int, startTime: float, targetWidth: float, timeBudget, resultFile) -> bool:
+        for k in range(estimator.numIterations, nextIteration):
+            estimator.add(self.__getStratum(enumeratedMutants[k]), store.getIteration(k))
+
+        estimate = estimator.getEstimate()
+        if estimate is not None and estimate[2] - estimate[1] <= targetWidth:
+            stopStr = "Stopping after " + str(nextIteration) + " mutants: the confidence interval of the mutation score is " + str(round(estimate[2] - estimate[1], 4)) + " wide"
+        elif timeBudget is not None and time.time() - startTime >= timeBudget:
+            stopStr = "Stopping after " + str(nextIteration) + " mutants: the time budget of " + str(timeBudget) + " s ran out"
+        else:
+            return False
+
+        print("\n" + stopStr)
+        resultFile.write(stopStr + "\n\n")
+        return True
+
+    # Turn the operators chosen by the mutate transformer into schema sites to switch on
+    # active: site id -> list of operator names (one for each operator of a comparison chain)
+    def __setSchemaActive(self, transformer, sites: dict, active: dict, resultFile):
+        for site in transformer.opsToMutate:
+            lineNum, colNum, opType, occurrence = site
+            if site not in sites:
+                print("Operator ", site, " cannot be switched at runtime and was not mutated.")
+                resultFile.write("Operator " + str(site) + " cannot be switched at runtime and was not mutated\n")
+                continue
+
+            key = next(key for key in self.mutation_operators if opType in self.mutation_operators[key])
+            siteId, opNames, op = sites[site]
+            newOp = transformer.getReplacementOp(key, site)
+            if newOp is None:
+                print("Operator of type ", opType, " does not have a complementary operator.")
+                continue
+            newOps = active.get(siteId, list(opNames))
+            newOps[op] = newOp.__name__
+            active[siteId] = newOps
+            transformer.mutations.append((lineNum, colNum, opType.__name__, newOp.__name__, occurrence))
+
+    # Hash of the bytecode of a code object and every code object nested in it. Line numbers and the file name are left out,
+    # so two trees that compile to the same instructions and constants get the same hash
+    def __hashCode(self, code, codeHash=None):
+        if codeHash is None:
+            codeHash = hashlib.sha256()
+        codeHash.update(code.co_code)
+        codeHash.update(getattr(code, "co_exceptiontable", b""))
+        codeHash.update(repr((code.co_names, code.co_varnames, code.co_freevars, code.co_cellvars, code.co_argcount, code.co_posonlyargcount, code.co_kwonlyargcount, code.co_flags)).encode())
+        for const in code.co_consts:
+            if isinstance(const, types.CodeType):
+                self.__hashCode(const, codeHash)
+            else:
+                # The type keeps constants that compare equal apart (1, 1.0 and True)
+                codeHash.update(repr((type(const).__name__, const)).encode())
+        return codeHash
+
+    # Bytecode hash of every measured file as it is, to compare mutants against
+    def __getOriginalCodeHashes(self) -> dict:
+        return {item.fileName: self.__hashCode(compile(item.parseTree(), item.fileName, "exec")).hexdigest() for item in self.analysisInfoList}
+
+    # Compile the mutated trees of a mutant and decide if it is worth running. Sets mutant.skipReason when the mutant:
+    #   - does not compile ("uncompilable")
+    #   - compiles to the same bytecode as the original source, so no test can kill it ("equivalent")
+    #   - compiles to the same bytecode as an earlier mutant of this run ("duplicate")
+    # seenMutants maps the bytecode hash of each mutant that runs to its iteration
+    def __filterMutant(self, mutant: mutantInfo, originalHashes: dict, seenMutants: dict):
+        with self.profiler.phase("filter", mutant.iteration):
+            codeHashes = {}
+            for fileName, mutatedTree in mutant.mutatedTrees.items():
+                try:
+                    mutant.compiledCode[fileName] = compile(mutatedTree, fileName, "exec")
+                except (SyntaxError, ValueError, TypeError) as ex:
+                    mutant.skipReason = "uncompilable"
+                    mutant.skipDetail = "does not compile: " + type(ex).__name__ + ": " + str(ex)
+                    return
+                codeHashes[fileName] = self.__hashCode(mutant.compiledCode[fileName]).hexdigest()
+
+            if all(codeHashes[fileName] == originalHashes[fileName] for fileName in codeHashes):
+                mutant.skipReason = "equivalent"
+                mutant.skipDetail = "compiles to the same bytecode as the original source"
+                return
+
+            mutantHash = hashlib.sha256(repr(sorted((fileName, codeHash) for fileName, codeHash in codeHashes.items() if codeHash != originalHashes[fileName])).encode()).hexdigest()
+            if mutantHash in seenMutants:
+                mutant.skipReason = "duplicate"
+                mutant.skipDetail = "compiles to the same bytecode as iteration " + str(seenMutants[mutantHash])
+                return
+            seenMutants[mutantHash] = mutant.iteration
+
+    # Lines of the measured files that differ from a git revision, keyed by the resolved path of each file
+    # Uses plain `git diff` against the working tree, so uncommitted changes count as changed
+    def __getChangedLines(self, baseRevision: str) -> dict:
+        try:
+            toplevel = subprocess.run(["git", "rev-parse", "--show-toplevel"], capture_output=True, text=True, check=True).stdout.strip()
+            # Explicit prefixes, since diff.noprefix and diff.mnemonicPrefix in the git config change the ones the paths are parsed with
+            diff = subprocess.run(["git", "diff", "--unified=0", "--no-color", "--no-ext-diff", "--src-prefix=a/", "--dst-prefix=b/", baseRevision, "--"] + [item.fileName for item in self.analysisInfoList], capture_output=True, text=True, check=True).stdout
+        except subprocess.CalledProcessError as ex:
+            raise Exception('git diff against ' + baseRevision + ' failed: ' + ex.stderr.strip())
+
+        changedLines = {}
+        fileName = None
+        for line in diff.splitlines():
+            if line.startswith("+++ "):
+                # Deleted files have no lines left to mutate
+                fileName = None if line == "+++ /dev/null" else str(Path(toplevel, line[len("+++ b/"):]).resolve())
+            elif line.startswith("@@ ") and fileName is not None:
+                # Hunk header: @@ -start[,count] +start[,count] @@
+                newRange = line.split(" ")[2][1:].split(",")
+                start = int(newRange[0])
+                count = int(newRange[1]) if len(newRange) > 1 else 1
+                changedLines.setdefault(fileName, set()).update(range(start, start + count))
+
+        return changedLines
+
+    # Instrument a copy of every tree so that any of its mutations can be switched on at runtime
+    # Returns the instrumented trees and the sites of each file. Site ids are unique across all files
+    def __buildSchema(self, printSrcAfterMutate=False):
+        with self.profiler.phase("schema build"):
+            schemaTrees = {}
+            schemaSites = {}
+            siteId = 0
+            for item in self.analysisInfoList:
+                tree = item.parseTree()
+                schemaTransformer = self.__astNodeTransformerCallbacks_schema(self.mutation_operators, item, siteId, treeIndex(tree))
+                schemaTree = schemaTransformer.insertHeader(schemaTransformer.visit(tree))
+                siteId = schemaTransformer.nextSiteId
+                schemaTrees[item.fileName] = schemaTree
+                schemaSites[item.fileName] = schemaTransformer.sites
+
+                if printSrcAfterMutate:
+                    print(ast.unparse(schemaTree))
+
+            return schemaTrees, schemaSites, siteId
+
+    # Write the mutated sources and run pytest on them
+    # Without a sandbox the files are overwritten in place, otherwise the sandbox copies are overwritten. Either way they are restored afterwards
+    # With importHook nothing is written. The mutated trees are compiled and handed to mutation_plugin, which serves them to the tests from memory
+    # An already marshaled payload for the import hook can be passed in to avoid compiling the same trees again
+    # With a fork server, pytest runs in a child forked from the server instead of a new interpreter. Its output always goes to the log
+    # A run that takes longer than mutant.timeout is killed and recorded as a timeout. A run that exceeds mutant.resourceLimits is recorded as such
+    # mutation_plugin streams the outcome of each test back over a pipe into mutant.testResults
+    def __runIteration(self, mutant: mutantInfo, sandbox=None, importHook=False, payload=None, server=None):
+        i = mutant.iteration
+        destinations = {}
+        # Source of the files that are overwritten in place. Not every iteration mutates every file, so a file has to be put back
+        # before the next iteration runs
+        originalSources = {}
+        # Mutants written over the source hold the source lock until the source is restored
+        holdsSourceLock = sandbox is None and not importHook and len(mutant.mutatedTrees) > 0
+        if holdsSourceLock:
+            self.sourceLock.acquire()
+        try:
+            if not importHook:
+                with self.profiler.phase("write mutants", i):
+                    for fileName, mutatedTree in mutant.mutatedTrees.items():
+                        destinations[fileName] = fileName if sandbox is None else str(self.__getSandboxPath(sandbox, fileName))
+                        if sandbox is None:
+                            originalSources[fileName] = Path(fileName).read_bytes()
+                            self.__backupSource(fileName, originalSources[fileName])
+                        else:
+                            # The sandbox file is a hard link to the original
+                            Path(destinations[fileName]).unlink()
+                        self.__exportMutantSource(mutant, fileName, destinations[fileName])
+
+            logFilename = str(self.logDir) + "/pytest-log-iteration-" + str(i) + ".txt"
+            testArgs = [self.unitTestFileName] if mutant.testIds is None else mutant.testIds
+            # Node ids are relative to the rootdir. The tests run in the sandbox or the current working directory, and the ids of the baseline,
+            # the result store, the kill history and the cache are relative to it, even if a configuration file is found further up
+            pytestArgs = ["--rootdir=.", "-p", "mutation_plugin"]
+            mutant.testResults = []
+            if mutant.killFast:
+                # mutation_plugin reorders the collected tests from the order file. The sandbox is the working directory of pytest, so the
+                # path is absolute
+                pytestArgs += ["-x"]
+                orderFilename = self.logDir.resolve() / ("test-order-iteration-" + str(i) + ".json")
+                orderFilename.write_text(json.dumps(mutant.testOrder))
+                mutant.env["MUTATION_TEST_ORDER"] = str(orderFilename)
+            if mutant.resourceLimits is not None:
+                mutant.env["MUTATION_RESOURCE_LIMITS"] = json.dumps(mutant.resourceLimits)
+            if server is not None:
+                if importHook and payload is None:
+                    payload = self.__getImportHookPayload(mutant.mutatedTrees, mutant.compiledCode)
+                launchTime = time.time()
+                try:
+                    returncode, mutant.testResults = server.run(pytestArgs + ["-p", "no:cacheprovider"] + testArgs, logFilename, mutant.env, payload if importHook else None, mutant.timeout)
+                    self.__recordPytestProfile(mutant, launchTime)
+                    self.__checkImported(mutant)
+                    self.__checkResourceLimits(mutant, returncode, logFilename)
+                    self.__checkReturnCode(mutant, returncode)
+                except subprocess.TimeoutExpired:
+                    self.__recordPytestProfile(mutant, launchTime)
+                    self.__recordTimeout(mutant)
+                return
+
+            with open(logFilename, "w+") as iterationLog:
+                env = self.__getPytestEnv()
+                env.update(mutant.env)
+                if importHook:
+                    # Mutants may run side by side in the same directory, so the pytest cache is left alone
+                    pytestArgs += ["-p", "no:cacheprovider"]
+                    env["MUTATION_IMPORT_HOOK"] = "1"
+                pytestCommand = self.__getPytestCommand(*pytestArgs, *testArgs)
+
+                # A pipe cannot be handed to a child process on Windows, so the results are written to a file there and read back afterwards
+                passFds = ()
+                if os.name == "posix":
+                    resultsRead, resultsWrite = os.pipe()
+                    env["MUTATION_RESULTS_FD"] = str(resultsWrite)
+                    passFds = (resultsWrite,)
+                else:
+                    resultsFilename = str(self.logDir) + "/results-iteration-" + str(i) + ".jsonl"
+                    env["MUTATION_RESULTS_FILE"] = resultsFilename
+
+                # pytest leads its own process group so a timed out mutant can be killed with anything it started
+                # The output goes straight into the log, so it is written without passing through this process or the terminal
+                launchTime = time.time()
+                p_mut = subprocess.Popen(pytestCommand, cwd=None if sandbox is None else str(sandbox), env=env, stdin=subprocess.PIPE if importHook else None, stdout=iterationLog, stderr=iterationLog, start_new_session=True, pass_fds=passFds)
+
+                with self.runningProcessesLock:
+                    self.runningProcesses.add(p_mut)
+
+                # The results are read while pytest runs so a full pipe never blocks it
+                if os.name == "posix":
+                    os.close(resultsWrite)
+                    resultReader = threading.Thread(target=self.__readTestResults, args=(os.fdopen(resultsRead, "r"), mutant.testResults))
+                    resultReader.start()
+
+                if importHook:
+                    p_mut.stdin.write(payload if payload is not None else self.__getImportHookPayload(mutant.mutatedTrees, mutant.compiledCode))
+                    p_mut.stdin.close()
+                try:
+                    p_mut.wait(timeout=mutant.timeout)
+                    timedOut = False
+                except subprocess.TimeoutExpired:
+                    self.__killProcessTree(p_mut)
+                    iterationLog.flush()
+                    timedOut = True
+                except BaseException:
+                    # pytest runs in its own session and does not see a Ctrl-C of this process
+                    self.__killProcessTree(p_mut)
+                    raise
+                finally:
+                    with self.runningProcessesLock:
+                        self.runningProcesses.discard(p_mut)
+
+                if os.name == "posix":
+                    resultReader.join()
+                elif Path(resultsFilename).exists():
+                    with open(resultsFilename, "r") as resultsFile:
+                        self.__readTestResults(resultsFile, mutant.testResults)
+                self.__recordPytestProfile(mutant, launchTime)
+                self.__checkImported(mutant)
+
+                if timedOut:
+                    self.__recordTimeout(mutant)
+                else:
+                    self.__checkResourceLimits(mutant, p_mut.returncode, logFilename)
+                    self.__checkReturnCode(mutant, p_mut.returncode)
+
+        finally:
+            # The live files are left alone when sandboxed, so they hold the original source
+            with self.profiler.phase("restore source", i):
+                if sandbox is not None:
+                    for fileName, destination in destinations.items():
+                        Path(destination).unlink(missing_ok=True)
+                        self.__linkOrCopy(fileName, destination)
+                for fileName, source in originalSources.items():
+                    Path(fileName).write_bytes(source)
+            if holdsSourceLock:
+                self.sourceLock.release()
+
+    # Record the run of pytest as the "pytest" phase, split into starting pytest (interpreter, plugins, imports and collection), running the
+    # tests and exiting, from the times mutation_plugin reports at the end of the session. Its CPU times are those of the pytest process
+    # The report is taken out of the test results. A pytest that was killed does not report, so only its wall time is known
+    def __recordPytestProfile(self, mutant: mutantInfo, launchTime: float):
+        exitTime = time.time()
+        reports = [result["profile"] for result in mutant.testResults if "profile" in result]
+        mutant.testResults[:] = [result for result in mutant.testResults if "profile" not in result]
+
+        phaseName = self.profiler.getName("pytest")
+        report = reports[-1] if len(reports) > 0 else None
+        self.profiler.add(phaseName, launchTime, exitTime - launchTime, None if report is None else report["finishedCpu"], mutant.iteration)
+        if report is not None and report["collected"] is not None:
+            self.profiler.add(phaseName + " > startup", launchTime, report["collected"] - launchTime, report["collectedCpu"], mutant.iteration)
+            self.profiler.add(phaseName + " > tests", report["collected"], report["finished"] - report["collected"], report["finishedCpu"] - report["collectedCpu"], mutant.iteration)
+            self.profiler.add(phaseName + " > exit", report["finished"], exitTime - report["finished"], None, mutant.iteration)
+
+    # With the import hook, mutation_plugin reports the mutated files the tests imported. A mutant in a file that was never imported (e.g. the
+    # tests import it from somewhere else) was not tested at all, so it is recorded as an error instead of a survivor
+    # The report is taken out of the test results. A pytest that was killed does not report, and is left alone
+    def __checkImported(self, mutant: mutantInfo):
+        reports = [result["imported"] for result in mutant.testResults if "imported" in result]
+        mutant.testResults[:] = [result for result in mutant.testResults if "imported" not in result]
+        if len(reports) == 0:
+            return
+
+        notImported = sorted({self.__getRelativePath(mutation[0]) for mutation in mutant.mutations if os.path.realpath(mutation[0]) not in reports[-1]})
+        if len(notImported) > 0:
+            mutant.testResults[:] = [{"test": None, "outcome": "error", "message": "The import hook never served the mutant of " + ", ".join(notImported) + ", the tests did not import it", "duration": 0.0}]
+
+    # Read the test results that mutation_plugin writes, one JSON object per line, until the writer closes the stream
+    def __readTestResults(self, stream, testResults: list):
+        with stream:
+            for line in stream:
+                # A killed pytest can leave a partial line behind
+                try:
+                    testResults.append(json.loads(line))
+                except ValueError:
+                    pass
+
+    # pytest can exit without running any test (e.g. on an internal error or bad arguments). Record that as an error, otherwise the
+    # mutant would look like it survived
+    def __checkReturnCode(self, mutant: mutantInfo, returncode: int):
+        # 0: tests ran and passed, 5: no tests were collected
+        if len(mutant.testResults) == 0 and returncode not in (0, 5):
+            mutant.testResults.append({"test": None, "outcome": "error", "message": "pytest exited with code " + str(returncode) + " without reporting any tests", "duration": 0.0})
+
+    # Kill a pytest process and everything it started
+    def __killProcessTree(self, process: subprocess.Popen):
+        if os.name == "posix":
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else:
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True)
+        process.wait()
+
+    # Seconds a mutant's tests may run before they are killed: the baseline time of the tests that are run scaled by timeoutMultiplier,
+    # plus timeoutOffset to cover starting pytest. Returns None (no timeout) if timeoutMultiplier is None
+    # If none of the tests is in the baseline report (e.g. ids that do not match its test cases), the time of the whole suite is used, so the
+    # timeout is never left at timeoutOffset alone
+    def __getTimeout(self, mutant: mutantInfo, timeoutMultiplier, timeoutOffset: float):
+        if timeoutMultiplier is None:
+            return None
+
+        if mutant.testIds is None:
+            baseline = self.baselineSuiteTime
+        else:
+            testTimes = [self.__getBaselineTestTime(testId, None) for testId in mutant.testIds]
+            if all(testTime is None for testTime in testTimes):
+                baseline = self.baselineSuiteTime
+            else:
+                baseline = sum(testTime for testTime in testTimes if testTime is not None)
+
+        return baseline * timeoutMultiplier + timeoutOffset
+
+    # Run time of an unmutated test in initial-report.xml. default if it is not in the report
+    def __getBaselineTestTime(self, testId: str, default=0.0):
+        # Node id "dir/test_file.py::TestClass::test_name" is classname "dir.test_file.TestClass" and name "test_name" in the xml report
+        parts = testId.split("::")
+        classname = ".".join([Path(parts[0]).with_suffix("").as_posix().replace("/", ".")] + parts[1:-1])
+        return self.baselineTestTimes.get((classname, parts[-1]), default)
+
+    # Run the tests of a mutant in kill-fast mode: pytest stops at the first failing test, and the tests run in order of their chance to kill
+    # the mutant per second of run time, so the test that kills it is likely one of the first to run
+    # The chance is estimated from the kill history of each test at the mutated lines and the time from its mean run time (or the baseline run).
+    # Tests that do not reach a mutated line cannot kill the mutant and are run last. Tests without any history or coverage are not ordered
+    def __setKillFastOrder(self, mutant: mutantInfo, history: killHistory):
+        siteKeys = set()
+        coveringTests = set()
+        for fileName, lineNum, *_ in mutant.mutations:
+            siteKeys.add(history.getSiteKey(fileName, lineNum))
+            item = next(item for item in self.analysisInfoList if item.fileName == fileName)
+            coveringTests |= item.coverageTestsByLine.get(lineNum, {None})
+
+        # A mutated line that ran outside of any test (e.g. on import) can be reached by every test
+        coverageKnown = None not in coveringTests
+
+        def getScore(testId):
+            testTime = history.getMeanTime(testId)
+            if testTime is None:
+                testTime = self.__getBaselineTestTime(testId)
+            return history.getKillProbability(testId, siteKeys) / max(testTime, 0.001)
+
+        # The jobs add to the history while the next mutants are ordered
+        with history.lock:
+            candidates = (coveringTests | set(history.tests)) - {None}
+            if mutant.testIds is not None:
+                candidates &= set(mutant.testIds)
+            mutant.testOrder = sorted(candidates, key=lambda testId: (coverageKnown and testId not in coveringTests, -getScore(testId), testId))
+        mutant.killFast = True
+        mutant.resultText += "Kill-fast: stopping at the first failing test, " + str(len(mutant.testOrder)) + " test(s) ordered by kill history\n"
+
+    # Record a mutant that was killed for running too long. A timeout counts as a killed mutant, so the results of the
+    # iteration are replaced by a single "timeout" result
+    def __recordTimeout(self, mutant: mutantInfo):
+        mutant.timedOut = True
+        print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + " Iteration " + str(mutant.iteration) + " did not finish within " + str(round(mutant.timeout, 3)) + " s and was killed." + Style.RESET_ALL)
+        with open(str(self.logDir) + "/pytest-log-iteration-" + str(mutant.iteration) + ".txt", "a") as iterationLog:
+            iterationLog.write("\nMutant did not finish within " + str(mutant.timeout) + " s and was killed\n")
+
+        mutant.testResults = [{"test": None, "outcome": "timeout", "message": "Mutant did not finish within " + str(round(mutant.timeout, 3)) + " s", "duration": mutant.timeout}]
+
+    # Name and unit of each resource limit of mutate()
+    resource_limits = {"memory": ("memory", "MB"), "cpu": ("CPU time", "s"), "fileSize": ("file size", "MB")}
+
+    # Check whether a mutant that finished exceeded one of its resource limits and record it if it did. Running out of CPU time ends pytest
+    # with SIGXCPU. Running out of memory or file size shows up as an exception in the test results, or in the end of the log if pytest itself
+    # crashed. A log that reached the file size limit was cut off
+    def __checkResourceLimits(self, mutant: mutantInfo, returncode: int, logFilename: str):
+        if mutant.resourceLimits is None:
+            return
+
+        evidence = [result["message"] for result in mutant.testResults if result["outcome"] in ("failed", "error")]
+        if len(mutant.testResults) == 0 and returncode not in (0, 5):
+            with open(logFilename, "rb") as iterationLog:
+                iterationLog.seek(max(os.path.getsize(logFilename) - 65536, 0))
+                evidence.append(iterationLog.read().decode(errors="replace"))
+
+        limits = mutant.resourceLimits
+        if limits.get("cpu") is not None and returncode == -signal.SIGXCPU:
+            self.__recordResourceLimit(mutant, "cpu")
+        elif limits.get("memory") is not None and any("MemoryError" in text for text in evidence):
+            self.__recordResourceLimit(mutant, "memory")
+        elif limits.get("fileSize") is not None and (any(os.strerror(errno.EFBIG) in text for text in evidence) or os.path.getsize(logFilename) >= limits["fileSize"] * 2 ** 20):
+            self.__recordResourceLimit(mutant, "fileSize")
+
+    # Record a mutant that exceeded a resource limit. Like a timeout, it counts as a killed mutant and the results of the iteration are
+    # replaced by a single "resource limit" result
+    def __recordResourceLimit(self, mutant: mutantInfo, limit: str):
+        mutant.exceededLimit = limit
+        name, unit = self.resource_limits[limit]
+        description = "Mutant exceeded the " + name + " limit of " + str(mutant.resourceLimits[limit]) + " " + unit
+        print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + " Iteration " + str(mutant.iteration) + " exceeded the " + name + " limit of " + str(mutant.resourceLimits[limit]) + " " + unit + "." + Style.RESET_ALL)
+        with open(str(self.logDir) + "/pytest-log-iteration-" + str(mutant.iteration) + ".txt", "a") as iterationLog:
+            iterationLog.write("\n" + description + "\n")
+
+        mutant.testResults = [{"test": None, "outcome": "resource limit", "message": description, "duration": sum(result["duration"] for result in mutant.testResults)}]
+
+    # Worker for parallel runs. Borrows a free worker slot (sandbox, fork server) for the duration of one iteration
+    # Mutants served by the import hook do not touch any files, so their slots have no sandbox and run in the current directory
+    # The results go into the store and the kill history as soon as the mutant finishes
+    def __runIterationInSandbox(self, slotQueue: queue.Queue, mutant: mutantInfo, store: resultStore, history: killHistory, importHook=False, payload=None):
+        sandbox, server = slotQueue.get()
+        try:
+            print("Running pytest on iteration " + str(mutant.iteration) + ("" if sandbox is None else " in " + sandbox.name))
+            with self.profiler.phase("run mutant", mutant.iteration):
+                self.__runIteration(mutant, sandbox, importHook=importHook, payload=payload, server=server)
+        finally:
+            slotQueue.put((sandbox, server))
+        # The mutated trees are not needed anymore. Only the mutants that are still waiting to run keep theirs
+        mutant.mutatedTrees = {}
+        mutant.compiledCode = {}
+        store.add(mutant)
+        history.add(mutant)
+
+    # Start a fork server in the given directory (None for the current directory)
+    def __startServer(self, cwd, serverNum: int) -> mutationServer:
+        with self.profiler.phase("start fork server"):
+            print("Starting fork server " + str(serverNum))
+            return mutationServer([sys.executable, "-m", "mutation_server", "--rootdir=.", self.unitTestFileName], cwd, self.__getPytestEnv(), str(self.logDir) + "/fork-server-log-" + str(serverNum) + ".txt")
+
+    # Coordinator of a distributed run: publish the mutants to the work queue in queueDir and wait until workers (see work()) ran all of them
+    # The results go into the store and the kill history as they come in. A task whose worker stopped responding is handed to another worker
+    def __runDistributed(self, queueDir, mutants: list, store: resultStore, history: killHistory, mutation_type: mutation_types, timeoutMultiplier, timeoutOffset: float, resourceLimits, sourceHashes: dict, testHashes: dict):
+        workQ = workQueue(queueDir)
+        runId = datetime.datetime.now().isoformat()
+        tasks = []
+        for mutant in mutants:
+            mutatedFiles = sorted({mutation[0] for mutation in mutant.mutations})
+            tasks.append({"run": runId, "iteration": mutant.iteration, "mutant": mutant.mutantId,
+                          "mutations": [[self.__getRelativePath(mutation[0])] + list(mutation[1:]) for mutation in mutant.mutations],
+                          "sourceHashes": {self.__getRelativePath(fileName): sourceHashes[fileName] for fileName in mutatedFiles},
+                          "testIds": mutant.testIds, "killFast": mutant.killFast, "testOrder": mutant.testOrder})
+            # The workers build the mutants again from their mutations
+            mutant.mutatedTrees = {}
+            mutant.compiledCode = {}
+        with self.profiler.phase("publish"):
+            workQ.publish({"run": runId, "mutation_type": mutation_type, "timeoutMultiplier": timeoutMultiplier, "timeoutOffset": timeoutOffset, "resourceLimits": resourceLimits, "testHashes": testHashes}, tasks)
+        print("\nPublished " + str(len(tasks)) + " iterations to the work queue in " + str(queueDir) + " as run " + runId + "\nWaiting for workers to run them (python3 mutation_worker.py " + str(queueDir) + " <module(s) to test> <unit tests>)")
+
+        pending = {mutant.iteration: mutant for mutant in mutants}
+        try:
+            with self.profiler.phase("wait for workers"):
+                while len(pending) > 0:
+                    for result in workQ.getResults(runId):
+                        workQ.removeTask(result["iteration"])
+                        # A task that was handed to another worker can finish twice
+                        mutant = pending.pop(result["iteration"], None)
+                        if mutant is None:
+                            continue
+                        mutant.testResults = result["testResults"]
+                        mutant.timedOut = result["timedOut"]
+                        mutant.exceededLimit = result["exceededLimit"]
+                        mutant.resultText += "Run by worker " + result["worker"] + "\n"
+                        with open(str(self.logDir) + "/pytest-log-iteration-" + str(mutant.iteration) + ".txt", "w+") as iterationLog:
+                            iterationLog.write("Run by worker " + result["worker"] + ". The pytest output is in the mutation-unit-test/pytest-logs/ directory of the worker\n")
+                        store.add(mutant)
+                        history.add(mutant)
+                        print("Iteration " + str(mutant.iteration) + " was run by worker " + result["worker"] + " (" + str(len(mutants) - len(pending)) + "/" + str(len(mutants)) + ")")
+
+                    for iteration in workQ.requeueLostTasks():
+                        print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + " The worker of iteration " + str(iteration) + " stopped responding. The iteration is handed to another worker." + Style.RESET_ALL)
+                    time.sleep(0.2)
+        finally:
+            workQ.finish(runId)
+
+    # Run one task of a distributed run in this checkout and hand in its result
+    # fileNames: file relative to the working directory -> file name in the analysis
+    def __runTask(self, workQ: workQueue, task: dict, run: dict, fileNames: dict, resultFile, workerId: str, importHook=False, server=None):
+        i = task["iteration"]
+        print("\n----------------[Iteration " + str(i) + " of run " + run["run"] + "]----------------")
+        resultFile.write("--> Iteration " + str(i) + " of run " + run["run"] + ":\n")
+        replayedOps = {}
+        for fileName, lineNum, colNum, originalOp, newOp, occurrence in task["mutations"]:
+            replayedOps.setdefault(fileNames[fileName], {})[(lineNum, colNum, getattr(ast, originalOp), occurrence)] = getattr(ast, newOp)
+        with self.profiler.phase("generate", i):
+            mutant = self.__generateIteration(i, run["mutation_type"], None, False, replayedOps=replayedOps)
+        mutant.mutantId = task["mutant"]
+        mutant.testIds = task["testIds"]
+        mutant.killFast = task["killFast"]
+        mutant.testOrder = task["testOrder"]
+        mutant.timeout = self.__getTimeout(mutant, run["timeoutMultiplier"], run["timeoutOffset"])
+        mutant.resourceLimits = run["resourceLimits"]
+        resultFile.write(mutant.resultText)
+
+        # The heartbeat keeps the task from being handed to another worker while its tests run
+        stopHeartbeat = threading.Event()
+        def sendHeartbeats():
+            while not stopHeartbeat.wait(workQueue.claimTimeout / 4):
+                workQ.heartbeat(i)
+        heartbeat = threading.Thread(target=sendHeartbeats)
+        heartbeat.start()
+        try:
+            appliedMutations = [[self.__getRelativePath(mutation[0])] + list(mutation[1:]) for mutation in mutant.mutations]
+            if sorted(appliedMutations) != sorted(task["mutations"]):
+                mutant.testResults = [{"test": None, "outcome": "error", "message": "Worker " + workerId + " could not apply the mutations of the iteration", "duration": 0.0}]
+            else:
+                print("Running pytest on iteration " + str(i))
+                with self.profiler.phase("run mutant", i):
+                    self.__runIteration(mutant, importHook=importHook, server=server)
+        except BaseException:
+            workQ.release(i)
+            raise
+        finally:
+            stopHeartbeat.set()
+            heartbeat.join()
+
+        workQ.complete({"run": run["run"], "iteration": i, "worker": workerId, "testResults": mutant.testResults, "timedOut": mutant.timedOut, "exceededLimit": mutant.exceededLimit})
+        self.__writeIterationResults(mutant.testResults, resultFile)
+        resultFile.write("\n\n")
+
+
+    # SHA-256 of the contents of a file
+    def __hashFile(self, fileName) -> str:
+        with open(fileName, "rb") as hashedFile:
+            return hashlib.sha256(hashedFile.read()).hexdigest()
+
+    # Configuration files of pytest and coverage in the current working directory, and its conftest.py
+    def __getConfigFiles(self) -> list:
+        return [name for name in ("pytest.ini", ".pytest.ini", "pyproject.toml", "setup.cfg", "tox.ini", ".coveragerc", "conftest.py") if Path(name).is_file()]
+
+    # Hashes of every .py file of the module(s), keyed by their path relative to the current working directory
+    def __getModuleSourceHashes(self) -> dict:
+        modulePath = Path(self.moduleNameToTest)
+        sourceFiles = sorted(modulePath.rglob("*.py")) if modulePath.is_dir() else [modulePath]
+        return {self.__getRelativePath(sourceFile): self.__hashFile(sourceFile) for sourceFile in sourceFiles}
+
+    # Hashes of every .py file of the unit tests, keyed by their path relative to the current working directory (the form used in test node ids)
+    def __getTestFileHashes(self) -> dict:
+        testPath = Path(self.unitTestFileName)
+        testFiles = sorted(testPath.rglob("*.py")) if testPath.is_dir() else [testPath]
+        return {testFile.resolve().relative_to(Path().resolve()).as_posix(): self.__hashFile(testFile) for testFile in testFiles}
+
+    # Key of a mutant in the result cache. Made from the hash of each mutated source, the mutations, the tests that are run and the
+    # hashes of the test files they are in. conftest.py files can change any test, so they are always part of the key. The mutated code
+    # can import or call any other file of the module(s), so the hashes of all of them are part of the key too
+    def __getCacheKey(self, mutant: mutantInfo, sourceHashes: dict, testHashes: dict, moduleHashes: dict) -> str:
+        keyHash = hashlib.sha256()
+        for fileName, lineNum, colNum, originalOp, newOp, occurrence in sorted(mutant.mutations):
+            keyHash.update(repr((sourceHashes[fileName], lineNum, colNum, originalOp, newOp, occurrence)).encode())
+        for sourceFile in sorted(moduleHashes):
+            keyHash.update(repr((sourceFile, moduleHashes[sourceFile])).encode())
+
+        keyHash.update(repr(mutant.testIds).encode())
+        # A kill-fast run does not run the tests after the first failure, so its results cannot stand in for a full run
+        if mutant.killFast:
+            keyHash.update(b"killFast")
+        if mutant.testIds is None:
+            testFiles = set(testHashes)
+        else:
+            testFiles = {testId.split("::")[0] for testId in mutant.testIds} | {testFile for testFile in testHashes if Path(testFile).name == "conftest.py"}
+        for testFile in sorted(testFiles):
+            keyHash.update(repr((testFile, testHashes.get(testFile))).encode())
+
+        return keyHash.hexdigest()
+
+    # Open (and create if needed) the result cache under mutation-unit-test/. The cache stores the test results of each mutant as JSON
+    def __openCache(self) -> sqlite3.Connection:
+        cache = sqlite3.connect(self.__getMutationDirName() + "/mutant-cache.sqlite")
+        cache.execute("CREATE TABLE IF NOT EXISTS mutant_test_results (key TEXT PRIMARY KEY, results TEXT NOT NULL)")
+        return cache
+
+    # Use the cached test results of a mutant in place of running it. Returns False if the mutant is not in the cache
+    def __loadCachedResult(self, cache: sqlite3.Connection, mutant: mutantInfo) -> bool:
+        with self.profiler.phase("cache lookup", mutant.iteration):
+            row = cache.execute("SELECT results FROM mutant_test_results WHERE key = ?", (mutant.cacheKey,)).fetchone()
+            if row is None:
+                return False
+
+            mutant.testResults = json.loads(row[0])
+            with open(str(self.logDir) + "/pytest-log-iteration-" + str(mutant.iteration) + ".txt", "w+") as iterationLog:
+                iterationLog.write("Results loaded from the mutant result cache (key " + mutant.cacheKey + ")\n")
+            return True
+
+    # Timeouts depend on the load of the machine and resource limits on the settings of the run, so neither is cached
+    def __storeCachedResult(self, cache: sqlite3.Connection, mutant: mutantInfo):
+        with self.profiler.phase("cache store", mutant.iteration):
+            if mutant.timedOut or mutant.exceededLimit is not None:
+                return
+            cache.execute("INSERT OR REPLACE INTO mutant_test_results (key, results) VALUES (?, ?)", (mutant.cacheKey, json.dumps(mutant.testResults)))
+            cache.commit()
+
+
+    # Count the outcomes in a list of test results. Timeouts and exceeded resource limits count as failures (killed mutants)
+    def __countOutcomes(self, testResults: list) -> dict:
+        counts = {"tests": len(testResults), "failures": 0, "errors": 0, "skipped": 0, "passed": 0, "time": 0.0}
+        for result in testResults:
+            counts["time"] += result["duration"]
+            match result["outcome"]:
+                case "failed" | "timeout" | "resource limit":
+                    counts["failures"] += 1
+                case "error":
+                    counts["errors"] += 1
+                case "skipped":
+                    counts["skipped"] += 1
+                case _:
+                    counts["passed"] += 1
+        return counts
+
+    # Write the test results of an iteration to the result file
+    def __writeIterationResults(self, testResults: list, resultFile):
+        counts = self.__countOutcomes(testResults)
+        resultStr = "pytest ran " + str(counts["tests"]) + " tests in " + str(round(counts["time"], 3)) + " s\npytest results: [Failures (killed mutants): " + str(counts["failures"]) + ", Errors: " + str(counts["errors"]) + ", Skipped: " + str(counts["skipped"]) + "]"
+        resultFile.write(resultStr + "\n")
+        print(resultStr)
+        if counts["errors"] > 0:
+            print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + str(counts["errors"]) + " mutated test(s) threw an error! Mutation results may not be useful." + Style.RESET_ALL)
+            resultFile.write("[WARNING] " + str(counts["errors"]) + " mutated test(s) threw an error! Mutation results may not be useful\n")
+        if counts["skipped"] > 0:
+            print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + str(counts["skipped"]) + " mutated test(s) were skipped! Mutation results may not be useful." + Style.RESET_ALL)
+            resultFile.write("[WARNING] " + str(counts["skipped"]) + " mutated test(s) were skipped! Mutation results may not be useful\n")
+
+        for result in testResults:
+            testName = "mutation" if result["test"] is None else result["test"]
+            match result["outcome"]:
+                case "passed":
+                    print(Fore.WHITE + Back.MAGENTA + Style.BRIGHT + "Failed to kill mutant on " + testName + "!" + Style.RESET_ALL)
+                    if self.verbose:
+                        print(testName + " -> " + Style.BRIGHT + Fore.MAGENTA + "Passed (test failed to kill mutant!)" + Style.RESET_ALL)
+                    resultFile.write(testName + " -> Passed (test failed to kill mutant!)\n")
+                    continue
+                case "timeout":
+                    resultTypeStr = Style.BRIGHT + Fore.GREEN + "timeout (mutant killed!)" + Style.RESET_ALL
+                    resultWriteStr = "timeout (mutant killed!)"
+                case "resource limit":
+                    resultTypeStr = Style.BRIGHT + Fore.GREEN + "resource limit (mutant killed!)" + Style.RESET_ALL
+                    resultWriteStr = "resource limit (mutant killed!)"
+                case "failed":
+                    resultTypeStr = Style.BRIGHT + Fore.GREEN + "failure (test killed mutant!)" + Style.RESET_ALL
+                    resultWriteStr = "failure (test killed mutant!)"
+                case "error":
+                    resultTypeStr = Style.BRIGHT + Fore.RED + "error" + Style.RESET_ALL
+                    resultWriteStr = "error"
+                case "skipped":
+                    resultTypeStr = Style.BRIGHT + Fore.YELLOW + "skipped" + Style.RESET_ALL
+                    resultWriteStr = "skipped"
+                case _:
+                    resultTypeStr = Style.BRIGHT + Fore.CYAN + "UNKNOWN!" + Style.RESET_ALL
+                    resultWriteStr = "UNKNOWN!"
+
+            if self.verbose:
+                print(testName + " -> " + resultTypeStr + " (" + result["message"].replace('\n', ' ') + ")")
+
+            resultFile.write(testName + " -> " + resultWriteStr + " (" + result["message"].replace('\n', ' ') + ")\n")
+
+
+    # Write the results of the finished iterations from numWritten on to the result file, in iteration order, up to the first one that is still
+    # pending (or up to numGenerated with waitForJobs, which waits for the jobs). Returns the number of iterations that are written
+    # The results of the mutants that ran are added to the mutant result cache here, since the cache belongs to this thread
+    def __writeFinishedIterations(self, mutantsByIteration: dict, pending: dict, numWritten: int, numGenerated: int, store: resultStore, cache, resultFile, waitForJobs=False) -> int:
+        while numWritten < numGenerated:
+            i = numWritten
+            if i in pending:
+                if not waitForJobs and not pending[i].done():
+                    break
+                pending.pop(i).result()
+                if cache is not None:
+                    self.__storeCachedResult(cache, mutantsByIteration[i])
+
+            print("\n----------------[Iteration " + str(i) + "]----------------")
+            resultFile.write("--> Iteration " + str(i) + ":\n")
+            if store.isResumed(i):
+                self.__writeResumedResult(store.getIteration(i), resultFile)
+            else:
+                mutant = mutantsByIteration.pop(i)
+                resultFile.write(mutant.resultText)
+                if mutant.skipReason is not None:
+                    self.__writeSkippedResult(mutant, resultFile)
+                else:
+                    self.__writeIterationResults(mutant.testResults, resultFile)
+            print("----------------[End i"+ str(i) +"]----------------")
+            resultFile.write("\n\n")
+            numWritten += 1
+        return numWritten
+
+
+    # Report a mutant that was dropped by the mutant filter instead of being run
+    def __writeSkippedResult(self, mutant: mutantInfo, resultFile):
+        print(Style.BRIGHT + Fore.CYAN + "Skipped " + mutant.skipReason + " mutant: " + mutant.skipDetail + Style.RESET_ALL)
+        resultFile.write("Skipped " + mutant.skipReason + " mutant: " + mutant.skipDetail + "\n")
+
+
+    # Report a mutant that finished before the run was interrupted, from its records in the checkpoint
+    def __writeResumedResult(self, records: list, resultFile):
+        print("Loaded results from the checkpoint")
+        resultFile.write("Results loaded from the checkpoint\n")
+        if len(records) > 0:
+            resultFile.write("Mutations: " + ", ".join(str(tuple(mutation)) for mutation in records[0]["mutations"]) + "\n")
+
+        if len(records) == 1 and records[0]["outcome"] in ("uncompilable", "equivalent", "duplicate"):
+            print(Style.BRIGHT + Fore.CYAN + "Skipped " + records[0]["outcome"] + " mutant: " + records[0]["message"] + Style.RESET_ALL)
+            resultFile.write("Skipped " + records[0]["outcome"] + " mutant: " + records[0]["message"] + "\n")
+        else:
+            self.__writeIterationResults(records, resultFile)
+
+
     # An abstraction to be able to call any type of mutation function from one function call
-    def mutate(self, mutation_type: mutation_types, iterations: int, numMutations: int, printSrcAfterMutate=False, removeBackup=True):
+    def mutate(self, mutation_type: mutation_types, iterations: int, numMutations: int, printSrcAfterMutate=False, removeBackup=True, jobs=1, coveringTestsOnly=False, importHook=False, schema=False, forkServer=False, useCache=False, baseRevision=None, timeoutMultiplier=10.0, timeoutOffset=10.0, exhaustive=False, sampleSize=None, seed=None, filterMutants=False, resume=False, killFast=False, queueDir=None, adaptive=False, targetWidth=0.1, timeBudget=None, confidence=0.95, memoryLimit=None, cpuLimit=None, fileSizeLimit=None):
+        startTime = time.time()
+        # Only a single job without the import hook writes mutants over the original source. A distributed run leaves it to its workers
+        writesInPlace = jobs == 1 and not importHook and queueDir is None
+        # Fork servers that are still running
+        servers = []
+        cache = None
+        store = None
+        history = None
         try:
-            if iterations < 1:
-                raise Exception('Number of iterations cannot be less than 1!')
-            if numMutations < 1:
-                raise Exception('Number of mutations cannot be less than 1!')
-
-            # Remove old backup if it exists
-            backupPath = Path(self.__getMutationDirName() + "/backup-" + self.moduleNameToTest)
-            if backupPath.exists():
+            # Enumerated mutants replace the iterations and make one mutation each
+            if not exhaustive and not adaptive:
+                if iterations < 1:
+                    raise Exception('Number of iterations cannot be less than 1!')
+                if numMutations < 1:
+                    raise Exception('Number of mutations cannot be less than 1!')
+            elif sampleSize is not None and sampleSize < 1:
+                raise Exception('Sample size cannot be less than 1!')
+            if jobs < 1:
+                raise Exception('Number of jobs cannot be less than 1!')
+            if queueDir is not None and schema:
+                raise Exception('schema cannot be used with queueDir')
+            if adaptive:
+                # The workers of a distributed run only run one batch of tasks
+                if queueDir is not None:
+                    raise Exception('adaptive cannot be used with queueDir')
+                if not 0 < targetWidth <= 1:
+                    raise Exception('Target width must be between 0 and 1!')
+                if not 0 < confidence < 1:
+                    raise Exception('Confidence must be between 0 and 1!')
+                if timeBudget is not None and timeBudget <= 0:
+                    raise Exception('Time budget must be greater than 0!')
+            # Limits of the pytest process of each mutant. None if there are none
+            resourceLimits = {key: limit for key, limit in (("memory", memoryLimit), ("cpu", cpuLimit), ("fileSize", fileSizeLimit)) if limit is not None}
+            for key, limit in resourceLimits.items():
+                if limit <= 0:
+                    raise Exception('The ' + self.resource_limits[key][0] + ' limit must be greater than 0!')
+            if len(resourceLimits) == 0:
+                resourceLimits = None
+            elif os.name != "posix":
+                raise Exception('Resource limits need the resource module, which is only available on POSIX systems')
+
+            # Mutation() restores the source of a killed run before it is analyzed. A run that was killed since then left a mutant that the
+            # analysis and the hashes would be taken from
+            if self.backupMarkerPath.exists():
+                raise Exception('The source may still hold a mutant of a stopped run. Create a new Mutation() to restore it from ' + str(self.backupPath))
+
+            # Hashes are taken before anything can be written over the source
+            sourceHashes = {item.fileName: self.__hashFile(item.fileName) for item in self.analysisInfoList}
+            testHashes = self.__getTestFileHashes()
+            if useCache:
+                moduleHashes = self.__getModuleSourceHashes()
+                cache = self.__openCache()
+            history = killHistory(self.killHistoryFilepath)
+
+            # A run can only be resumed with the same settings, source and tests, otherwise the finished mutants would not match the new ones
+            store = resultStore(self.resultStoreFilepath, self.checkpointFilepath, self.profiler)
+            settings = {"mutation_type": mutation_type, "iterations": iterations, "numMutations": numMutations, "coveringTestsOnly": coveringTestsOnly, "baseRevision": baseRevision,
+                        "exhaustive": exhaustive, "sampleSize": sampleSize, "filterMutants": filterMutants, "killFast": killFast,
+                        "adaptive": adaptive, "targetWidth": targetWidth, "timeBudget": timeBudget, "confidence": confidence, "resourceLimits": resourceLimits,
+                        "operators": {key: [op.__name__ for op in ops] for key, ops in self.mutation_operators.items()}, "sourceHashes": sourceHashes, "testHashes": testHashes}
+            if resume:
+                checkpointSettings = store.resumeRun()
+                if seed is None:
+                    seed = checkpointSettings.get("seed")
+                settings["seed"] = seed
+                for key, value in json.loads(json.dumps(settings)).items():
+                    if checkpointSettings.get(key) != value:
+                        raise Exception('Cannot resume: ' + key + ' is not the same as in the interrupted run')
+                print("Resuming run " + store.runId + ". " + str(len(store.resumedIterations)) + " finished iteration(s) are loaded from the checkpoint")
+            else:
+                if (adaptive or exhaustive and sampleSize is not None) and seed is None:
+                    # A resumed run has to draw the same sample
+                    seed = random.randrange(2 ** 32)
+                settings["seed"] = seed
+                store.startRun(settings)
+
+            # Remove old backup if it exists. A backup of a killed run was restored by Mutation(), so this one is of a finished run that
+            # already put the source back (removeBackup=False)
+            if writesInPlace and self.backupPath.exists():
                 print("Overwriting old backup")
-                rmtree(str(backupPath))
-            
-            # From: https://stackoverflow.com/a/35161407
-            def include_patterns(*patterns):
-                """ Function that can be used as shutil.copytree() ignore parameter that
-                determines which files *not* to ignore, the inverse of "normal" usage.
-
-                This is a factory function that creates a function which can be used as a
-                callable for copytree()'s ignore argument, *not* ignoring files that match
-                any of the glob-style patterns provided.
-
-                ‛patterns’ are a sequence of pattern strings used to identify the files to
-                include when copying the directory tree.
-
-                Example usage:
-
-                    copytree(src_directory, dst_directory,
-                            ignore=include_patterns('*.sldasm', '*.sldprt'))
-                """
-                def _ignore_patterns(path, all_names):
-                    # Determine names which match one or more patterns (that shouldn't be
-                    # ignored).
-                    keep = (name for pattern in patterns
-                                    for name in fnmatch.filter(all_names, pattern))
-                    # Ignore file names which *didn't* match any of the patterns given that
-                    # aren't directory names.
-                    dir_names = (name for name in all_names if isdir(join(path, name)))
-                    return set(all_names) - set(keep) - set(dir_names)
-
-                return _ignore_patterns
-            
-            # Backup files that are going to be overwritten on mutate
-            copytree(self.__getFullModulesToTestPath(), str(backupPath), ignore=include_patterns('*.py'))
+                rmtree(str(self.backupPath))
 
             # Start mutation
             with open(self.resultFilepath, "a") as resultFile:
                 resultFile.write("\n----------------[Start Mutation]----------------\n")
-                for i in range(iterations):
-                    print("\n----------------[Iteration " + str(i) + "]----------------")
-                    resultFile.write("--> Iteration " + str(i) + ":\n")
-                    # Each python file
+                schemaSites = None
+                payload = None
+                changedLines = None
+                if baseRevision is not None:
+                    changedLines = self.__getChangedLines(baseRevision)
+                    resultFile.write("Only mutating lines changed since " + baseRevision + ":\n")
                     for item in self.analysisInfoList:
-                        mutatedTree = copy.deepcopy(item.tree)
-                        mutatedTree = self.__astNodeTransformerCallbacks_mutate(self.mutation_operators, mutation_type, numMutations, item, resultFile, self.verbose).visit(mutatedTree)
-                        mutatedTree = ast.fix_missing_locations(mutatedTree)
-
-                        if printSrcAfterMutate:
-                            print(ast.unparse(mutatedTree))
-                        
-                        self.__exportTreeAsSource(mutatedTree, item.fileName)
-
-                    print("\nRunning pytest on iteration " + str(i) + "\n(This may take awhile)")
-                    with open(str(self.logDir) + "/pytest-log-iteration-" + str(i) + ".txt", "w+") as iterationLog:
-                        #p_mut = subprocess.Popen("python3 -m pytest --junit-xml=\"" + str(self.xmlDir) + "/report-iteration-" + str(i) + ".xml\" " + self.unitTestFileName, stdout=iterationLog, stderr=iterationLog)
-                        p_mut = subprocess.Popen("python3 -m pytest --junit-xml=\"" + str(self.xmlDir) + "/report-iteration-" + str(i) + ".xml\" " + self.unitTestFileName)
-                        p_mut.wait()
-
-                    # Get results from xml file
-                    iterationXML = JUnitXml.fromfile(str(self.xmlDir) + "/report-iteration-" + str(i) + ".xml")
-                    for suite in iterationXML:
-                        resultStr = "Suite " + str(suite.name) + " ran " + str(suite.tests) + " tests in " + str(suite.time) + " s\n" + str(suite.name) + " results: [Failures (killed mutants): " + str(suite.failures) + ", Errors: " + str(suite.errors) + ", Skipped: " + str(suite.skipped) + "]"
-                        resultFile.write(resultStr + "\n")
-                        print(resultStr)
-                        if suite.errors > 0:
-                            print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + str(suite.errors) + " mutated test(s) threw an error! Mutation results may not be useful." + Style.RESET_ALL)
-                            resultFile.write("[WARNING] " + str(suite.errors) + " mutated test(s) threw an error! Mutation results may not be useful\n")
-                        if suite.skipped > 0:
-                            print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + str(suite.skipped) + " mutated test(s) were skipped! Mutation results may not be useful." + Style.RESET_ALL)
-                            resultFile.write("[WARNING] " + str(suite.skipped) + " mutated test(s) were skipped! Mutation results may not be useful\n")
-
-                        for testcase in suite:
-                            if len(testcase.result) > 1:
-                                raise Exception('Unexpected number of results from xml file')
-
-                            resultTypeStr = ""
-                            resultWriteStr = ""
-
-                            if len(testcase.result) == 0:
-                                resultTypeStr = Style.BRIGHT + Fore.MAGENTA + "Passed (test failed to kill mutant!)" + Style.RESET_ALL
-                                print(Fore.WHITE + Back.MAGENTA + Style.BRIGHT + "Failed to kill mutant on " + str(testcase.name) + "!" + Style.RESET_ALL)
-                                if self.verbose:
-                                    print(str(testcase.classname) + ": " + str(testcase.name) + " -> " + resultTypeStr)
-                                resultFile.write(str(testcase.classname) + ": " + str(testcase.name) + " -> Passed (test failed to kill mutant!)\n")
+                        numChanged = len(changedLines.get(str(Path(item.fileName).resolve()), set()))
+                        resultFile.write("\t" + str(item.fileName) + ": " + str(numChanged) + " changed line(s)\n")
+                    resultFile.write("\n")
 
+                enumeratedMutants = None
+                estimator = None
+                if exhaustive or adaptive:
+                    enumeratedMutants = self.__enumerateMutants(mutation_type, resultFile, changedLines)
+                    numEnumerated = len(enumeratedMutants)
+                    if adaptive:
+                        # Mutants are run in the stratified order until the score is known well enough. sampleSize is the most that are run
+                        estimator = scoreEstimator([self.__getStratum(enumeratedMutant) for enumeratedMutant in enumeratedMutants], confidence)
+                        enumeratedMutants = self.__getStratifiedOrder(enumeratedMutants, seed)[:sampleSize]
+                    elif sampleSize is not None and sampleSize < numEnumerated:
+                        # The sample keeps the enumeration order so its iterations line up with a full run
+                        enumeratedMutants = [enumeratedMutants[k] for k in sorted(random.Random(seed).sample(range(numEnumerated), sampleSize))]
+                    iterations = len(enumeratedMutants)
+                    if adaptive:
+                        enumeratedStr = "Enumerated " + str(numEnumerated) + " single operator mutants in " + str(len(estimator.sizes)) + " strata. Running up to " + str(iterations) + " of them until the mutation score is known within " + str(targetWidth) + "\n"
+                    else:
+                        enumeratedStr = "Enumerated " + str(numEnumerated) + " single operator mutants. Running " + str(iterations) + " of them\n"
+                    print("\n" + enumeratedStr)
+                    resultFile.write("\n" + enumeratedStr + "\n")
+                    if iterations == 0:
+                        print(Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + " No operators can be mutated. Nothing will be run." + Style.RESET_ALL)
+
+                if schema:
+                    # The instrumented build replaces the source once. Every iteration only changes which of its mutations are switched on
+                    print("\nBuilding the mutant schema of each module")
+                    schemaTrees, schemaSites, numSites = self.__buildSchema(printSrcAfterMutate)
+                    resultFile.write("Mutant schema built with " + str(numSites) + " runtime switchable operators\n\n")
+                    if importHook:
+                        payload = self.__getImportHookPayload(schemaTrees)
+                    elif writesInPlace:
+                        for fileName, schemaTree in schemaTrees.items():
+                            self.__backupSource(fileName, Path(fileName).read_bytes())
+                            self.__exportTreeAsSource(schemaTree, fileName)
+
+                if filterMutants:
+                    if schema:
+                        # Schema mutants are switched on at runtime and are never compiled on their own
+                        filterMutants = False
+                        print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + " filterMutants has no effect with schema." + Style.RESET_ALL)
+                    else:
+                        originalHashes = self.__getOriginalCodeHashes()
+                        seenMutants = {}
+
+                # Mutants are generated on this thread and handed to the jobs as soon as they are ready, so the next mutants are generated
+                # while the tests of the current ones run. At most 2 mutants per job are generated ahead, so the mutants are not all held in
+                # memory at once. The random choices are made on this thread in iteration order, so they do not depend on which job finishes first
+                # A distributed run generates every iteration and then publishes them all to the workers
+                # The results are written in iteration order, each as soon as it and the iterations before it are finished. An adaptive run
+                # checks whether it sampled enough before it generates the next mutant, from the results that are finished
+                mutantsByIteration = {}
+                # Iteration -> future of a mutant that runs on a job (None for a mutant that waits for the workers of a distributed run)
+                pending = {}
+                numGenerated = 0
+                numWritten = 0
+                pool = None
+                sandboxes = []
+                slotQueue = queue.Queue()
+                try:
+                    for i in range(iterations):
+                        if queueDir is None:
+                            while len([future for future in pending.values() if not future.done()]) >= 2 * jobs:
+                                wait([future for future in pending.values() if not future.done()], return_when=FIRST_COMPLETED)
+                            numWritten = self.__writeFinishedIterations(mutantsByIteration, pending, numWritten, numGenerated, store, cache, resultFile)
+                        if estimator is not None and self.__shouldStopSampling(estimator, store, enumeratedMutants, numWritten, startTime, targetWidth, timeBudget, resultFile):
+                            break
+                        numGenerated = i + 1
+                        if store.isResumed(i):
+                            continue
+
+                        print("\n----------------[Generating Iteration " + str(i) + "]----------------")
+                        with self.profiler.phase("generate", i):
+                            mutant = self.__generateIteration(i, mutation_type, numMutations, printSrcAfterMutate, coveringTestsOnly, schemaSites, changedLines, None if enumeratedMutants is None else enumeratedMutants[i])
+                        if killFast:
+                            self.__setKillFastOrder(mutant, history)
+                        mutant.timeout = self.__getTimeout(mutant, timeoutMultiplier, timeoutOffset)
+                        mutant.resourceLimits = resourceLimits
+                        mutantsByIteration[i] = mutant
+                        if filterMutants:
+                            self.__filterMutant(mutant, originalHashes, seenMutants)
+                        if mutant.skipReason is not None:
+                            store.add(mutant)
+                            continue
+
+                        if cache is not None:
+                            mutant.cacheKey = self.__getCacheKey(mutant, sourceHashes, testHashes, moduleHashes)
+                            if self.__loadCachedResult(cache, mutant):
+                                print("Loaded results of iteration " + str(i) + " from the mutant result cache")
+                                store.add(mutant, cached=True)
+                                continue
+
+                        if queueDir is not None:
+                            pending[i] = None
+                            continue
+
+                        # The jobs are set up for the first mutant that has to run, so a run that is all cached or skipped does not make sandboxes.
+                        # Without the import hook, a single job writes its mutants over the source and more jobs get a sandbox each
+                        if pool is None:
+                            numJobs = min(jobs, iterations - i)
+                            if importHook or writesInPlace:
+                                sandboxes = [None] * numJobs
                             else:
-                                result = testcase.result[0]
-                                if type(result) is junitparser.Failure:
-                                    resultTypeStr = Style.BRIGHT + Fore.GREEN + "failure (test killed mutant!)" + Style.RESET_ALL
-                                    resultWriteStr = "failure (test killed mutant!)"
-                                elif type(result) is junitparser.Error:
-                                    resultTypeStr = Style.BRIGHT + Fore.RED + "error" + Style.RESET_ALL
-                                    resultWriteStr = "error"
-                                elif type(result) is junitparser.Skipped:
-                                    resultTypeStr = Style.BRIGHT + Fore.YELLOW + "skipped" + Style.RESET_ALL
-                                    resultWriteStr = "skipped"
-                                else:
-                                    resultTypeStr = Style.BRIGHT + Fore.CYAN + "UNKNOWN!" + Style.RESET_ALL
-                                    resultWriteStr = "UNKNOWN!"
+                                sandboxes = self.__createWorkerSandboxes(numJobs)
+                                if schema:
+                                    for sandbox in sandboxes:
+                                        for fileName, schemaTree in schemaTrees.items():
+                                            # The sandbox file is a hard link to the original
+                                            self.__getSandboxPath(sandbox, fileName).unlink()
+                                            self.__exportTreeAsSource(schemaTree, str(self.__getSandboxPath(sandbox, fileName)))
+                            for k in range(numJobs):
+                                server = None
+                                if forkServer:
+                                    server = self.__startServer(None if sandboxes[k] is None else str(sandboxes[k]), k)
+                                    servers.append(server)
+                                slotQueue.put((sandboxes[k], server))
+                            print("\nRunning pytest with " + str(numJobs) + " job(s) while the next iterations are generated\n(This may take awhile)")
+                            pool = ThreadPoolExecutor(max_workers=numJobs)
+                        pending[i] = pool.submit(self.__runIterationInSandbox, slotQueue, mutant, store, history, importHook, payload)
+
+                    # A stopped adaptive run only counts the iterations it generated
+                    iterations = numGenerated
+                    if len(pending) > 0 and queueDir is not None:
+                        self.__runDistributed(queueDir, [mutantsByIteration[i] for i in pending], store, history, mutation_type, timeoutMultiplier, timeoutOffset, resourceLimits, sourceHashes, testHashes)
+                        if cache is not None:
+                            for i in pending:
+                                self.__storeCachedResult(cache, mutantsByIteration[i])
+                        pending.clear()
+                    self.__writeFinishedIterations(mutantsByIteration, pending, numWritten, numGenerated, store, cache, resultFile, waitForJobs=True)
+                except BaseException:
+                    # The results of the mutants that are running would be incomplete, so the store is closed before they are
+                    # stopped to keep them out of the checkpoint. No more mutants are started
+                    store.close()
+                    if pool is not None:
+                        pool.shutdown(wait=False, cancel_futures=True)
+                    with self.runningProcessesLock:
+                        runningProcesses = list(self.runningProcesses)
+                    for process in runningProcesses:
+                        self.__killProcessTree(process)
+                    for server in servers:
+                        server.kill()
+                    raise
 
-                                if self.verbose:
-                                    print(str(testcase.classname) + ": " + str(testcase.name) + " -> " + resultTypeStr + " (" + result.message.replace('\n', ' ') + ")")
-                                
-                                resultFile.write(str(testcase.classname) + ": " + str(testcase.name) + " -> " + resultWriteStr + " (" + result.message.replace('\n', ' ') + ")\n")
+                if pool is not None:
+                    pool.shutdown()
+                if len(sandboxes) > 0 and sandboxes[0] is not None:
+                    with self.profiler.phase("remove sandboxes"):
+                        rmtree(self.__getMutationDirName() + "/workers")
+
+                for server in servers:
+                    server.close()
+                servers.clear()
 
-                    print("----------------[End i"+ str(i) +"]----------------")
-                    resultFile.write("\n\n")
-            
                 resultFile.write("----------------[End Mutation]----------------\n")
 
                 
+                # The summary is built from the records in the result store
                 resultFile.write("\n----------------[Final Results]----------------\n")
 
+                numSkipped = {"uncompilable": 0, "equivalent": 0, "duplicate": 0}
                 for i in range(iterations):
-                    resultFile.write("Iteration " + str(i) + " results:\n")
-                    iterationXML = JUnitXml.fromfile(str(self.xmlDir) + "/report-iteration-" + str(i) + ".xml")
-                    for suite in iterationXML:
-                        resultFile.write("\t" + str(suite.name) + " total tests: " + str(suite.tests) + "\n")
-                        resultFile.write("\tKilled mutants: " + str(suite.failures) + "\n")
-                        resultFile.write("\tSurvived mutants: " + str(suite.tests - suite.failures - suite.errors - suite.skipped) + "\n")
-                        resultFile.write("\tErrors: " + str(suite.errors) + "\n")
-                        resultFile.write("\tSkipped: " + str(suite.skipped) + "\n")
+                    if enumeratedMutants is None:
+                        resultFile.write("Iteration " + str(i) + " results:\n")
+                    else:
+                        resultFile.write("Iteration " + str(i) + " results (mutant " + enumeratedMutants[i][0] + "):\n")
+                    records = store.getIteration(i)
+                    if len(records) == 1 and records[0]["outcome"] in numSkipped:
+                        numSkipped[records[0]["outcome"]] += 1
+                        resultFile.write("\tNot run: " + records[0]["outcome"] + " mutant (" + records[0]["message"] + ")\n\n")
+                        continue
+                    counts = self.__countOutcomes(records)
+                    resultFile.write("\tpytest total tests: " + str(counts["tests"]) + "\n")
+                    resultFile.write("\tKilled mutants: " + str(counts["failures"]) + "\n")
+                    resultFile.write("\tSurvived mutants: " + str(counts["passed"]) + "\n")
+                    resultFile.write("\tErrors: " + str(counts["errors"]) + "\n")
+                    resultFile.write("\tSkipped: " + str(counts["skipped"]) + "\n")
+                    resultFile.write("\n")
+
+                if estimator is not None:
+                    for k in range(estimator.numIterations, iterations):
+                        estimator.add(self.__getStratum(enumeratedMutants[k]), store.getIteration(k))
+                    estimate = estimator.getEstimate()
+                    if estimate is not None:
+                        scoreStr = "Estimated mutation score: " + str(round(estimate[0], 4)) + " (" + str(confidence) + " confidence interval " + str(round(estimate[1], 4)) + " to " + str(round(estimate[2], 4)) + ") from " + str(estimator.numSampled) + " of " + str(estimator.numMutants) + " mutants"
+                        print("\n" + scoreStr)
+                        resultFile.write(scoreStr + "\n\n")
+
+                if filterMutants:
+                    resultFile.write("Mutants skipped before running:\n")
+                    for reason, count in numSkipped.items():
+                        resultFile.write("\t" + reason.capitalize() + ": " + str(count) + "\n")
                     resultFile.write("\n")
 
                 resultFile.write("----------------[End]----------------\n")
 
                 
-            # Copy backup back to original location
-            rmtree(self.__getFullModulesToTestPath())
-            copytree(str(backupPath), self.__getFullModulesToTestPath())
-
-            # Remove iteration directory
-            if removeBackup:
-                rmtree(str(backupPath))
+            # Copy backup back to original location. Each iteration already put back what it wrote, so this only undoes the schema build
+            if writesInPlace and self.backupPath.exists():
+                with self.profiler.phase("restore backup"):
+                    self.__restoreBackup()
+                    if self.backupMarkerPath.exists():
+                        self.backupMarkerPath.unlink()
+
+                    # Remove iteration directory
+                    if removeBackup:
+                        rmtree(str(self.backupPath))
+
+            # The profile covers the phases since the last mutate() call, which for the first call includes the analysis of Mutation()
+            with open(self.resultFilepath, "a") as resultFile:
+                resultFile.write("\n----------------[Profile]----------------\n")
+                resultFile.write(self.profiler.getSummary(self.profileMark))
+                resultFile.write("Chrome trace of every phase: " + self.profileTraceFilepath + "\n")
+                resultFile.write("----------------[End Profile]----------------\n")
+            self.profileMark = self.profiler.mark()
 
 
-        except Exception as ex:
+        # Also catches KeyboardInterrupt so the source is restored when a run is stopped with Ctrl-C. Finished mutants are in the checkpoint
+        except BaseException as ex:
             print(Fore.WHITE + Back.RED + "[Error]" + Back.RESET + Style.BRIGHT + Fore.RED + " An exception of type " + type(ex).__name__ + " occurred when trying to mutate:" + Style.RESET_ALL)
             print(Fore.WHITE + Back.RED + "[Error]" + Back.RESET + Style.BRIGHT + Fore.RED + " " + str(ex) + Style.RESET_ALL)
             traceback.print_exc()
 
             # Copy backup back to original location
-            print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + " Restoring from backup due to exception in mutate()." + Style.RESET_ALL)
-            rmtree(self.__getFullModulesToTestPath())
-            copytree(str(backupPath), self.__getFullModulesToTestPath())
+            if writesInPlace and self.backupPath.exists():
+                print(Fore.WHITE + Back.YELLOW + "[WARNING]" + Back.RESET + Style.BRIGHT + Fore.YELLOW + " Restoring from backup due to exception in mutate()." + Style.RESET_ALL)
+                self.__restoreBackup()
+                if self.backupMarkerPath.exists():
+                    self.backupMarkerPath.unlink()
             raise
+
+        finally:
+            for server in servers:
+                server.kill()
+                server.close()
+            if cache is not None:
+                cache.close()
+            if store is not None:
+                store.close()
+            if history is not None:
+                history.save()
+            self.profiler.writeTrace(self.profileTraceFilepath)
+
+
+    # Worker of a distributed run: run the iterations that a coordinator (mutate() with queueDir) publishes to the work queue in queueDir until
+    # its run is finished. The working directory must be a checkout of the same source and tests as the coordinator's, with its own
+    # mutation-unit-test/ directory, so every worker needs its own checkout. Mutants are written over the source like mutate() with one job,
+    # or served from memory with importHook. forkServer runs them in a fork server
+    # A worker that writes over the source keeps a backup of the files it wrote over in mutation-unit-test/ while it runs. It is only left behind
+    # when the worker was killed, and is restored by the Mutation() of the next worker
+    def work(self, queueDir, importHook=False, forkServer=False):
+        workQ = workQueue(queueDir)
+        if not importHook and self.backupMarkerPath.exists():
+            raise Exception('The source may still hold a mutant of a stopped worker. Create a new Mutation() to restore it from ' + str(self.backupPath))
+        workerId = socket.gethostname() + ":" + str(os.getpid())
+        fileNames = {self.__getRelativePath(item.fileName): item.fileName for item in self.analysisInfoList}
+        sourceHashes = {self.__getRelativePath(item.fileName): self.__hashFile(item.fileName) for item in self.analysisInfoList}
+        testHashes = self.__getTestFileHashes()
+        run = None
+        server = None
+        try:
+            with open(self.resultFilepath, "a") as resultFile:
+                resultFile.write("\n----------------[Start Worker " + workerId + "]----------------\n")
+                print("Worker " + workerId + " is waiting for iterations in " + str(queueDir))
+                while True:
+                    header = workQ.getRun()
+                    if header is None:
+                        time.sleep(0.5)
+                        continue
+                    if run is None or header["run"] != run["run"]:
+                        if header["testHashes"] != testHashes:
+                            raise Exception('The unit tests of this checkout are not the same as the ones of run ' + header["run"])
+                        run = header
+                        print("Running iterations of run " + run["run"])
+
+                    task = workQ.claim()
+                    if task is None:
+                        if workQ.isFinished(run["run"]):
+                            print("Run " + run["run"] + " is finished")
+                            break
+                        time.sleep(0.5)
+                        continue
+                    for fileName, sourceHash in task["sourceHashes"].items():
+                        if sourceHashes.get(fileName) != sourceHash:
+                            workQ.release(task["iteration"])
+                            raise Exception('The source of ' + fileName + ' in this checkout is not the same as the one of run ' + run["run"])
+
+                    if forkServer and server is None:
+                        server = self.__startServer(None, 0)
+                    self.__runTask(workQ, task, run, fileNames, resultFile, workerId, importHook, server)
+
+                resultFile.write("----------------[End Worker]----------------\n")
+                resultFile.write("\n----------------[Profile]----------------\n")
+                resultFile.write(self.profiler.getSummary(self.profileMark))
+                resultFile.write("Chrome trace of every phase: " + self.profileTraceFilepath + "\n")
+                resultFile.write("----------------[End Profile]----------------\n")
+                self.profileMark = self.profiler.mark()
+
+        except BaseException as ex:
+            print(Fore.WHITE + Back.RED + "[Error]" + Back.RESET + Style.BRIGHT + Fore.RED + " An exception of type " + type(ex).__name__ + " occurred in worker " + workerId + ":" + Style.RESET_ALL)
+            print(Fore.WHITE + Back.RED + "[Error]" + Back.RESET + Style.BRIGHT + Fore.RED + " " + str(ex) + Style.RESET_ALL)
+            raise
+
+        finally:
+            if server is not None:
+                server.kill()
+                server.close()
+            self.profiler.writeTrace(self.profileTraceFilepath)
+            # Each iteration puts the source back when it ends, so the backup is not needed once the worker stops
+            if not importHook and self.backupPath.exists():
+                rmtree(str(self.backupPath))
+            if not importHook and self.backupMarkerPath.exists():
+                self.backupMarkerPath.unlink()
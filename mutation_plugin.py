@@ -0,0 +1,193 @@
+import sys
+sys.dont_write_bytecode = True
+import os
+import time
+import json
+import marshal
+import importlib.abc
+import importlib.machinery
+from pathlib import Path
+import pytest
+
+# Pytest plugin loaded into the pytest processes started by mutation.py (python3 -m pytest -p mutation_plugin ...)
+# mutation.py puts the directory of this file on PYTHONPATH so it can be found from the directory under test
+
+
+# Loader that executes a code object that was compiled from a mutated tree instead of reading the source file
+class mutantLoader(importlib.abc.Loader):
+    def __init__(self, finder, fileName: str, code):
+        self.finder = finder
+        self.fileName = fileName
+        self.code = code
+
+    def create_module(self, spec):
+        # Use the default module creation
+        return None
+
+    def exec_module(self, module):
+        self.finder.imported.add(self.fileName)
+        exec(self.code, module.__dict__)
+
+
+# sys.meta_path finder that serves mutated modules by the file they are found in, so a module is served under every name it is imported
+# by (e.g. "calc" from a directory a conftest put on sys.path as well as "pkg.calc", or a package of a src layout)
+# mutants: dict of resolved source file name -> code object
+# Only names that end in the name of a mutated file are looked up, every other import is left to the finders after this one
+class mutantFinder(importlib.abc.MetaPathFinder):
+    def __init__(self, mutants: dict):
+        self.mutants = mutants
+        self.names = {getModuleName(fileName) for fileName in mutants}
+        # Mutated files that were imported
+        self.imported = set()
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname.rpartition(".")[2] not in self.names:
+            return None
+
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path, target)
+        if spec is None or spec.origin is None:
+            return None
+        fileName = os.path.realpath(spec.origin)
+        if fileName not in self.mutants:
+            return None
+        spec.loader = mutantLoader(self, fileName, self.mutants[fileName])
+        spec.cached = None
+        return spec
+
+
+# Last part of the name a file is imported by. Packages are named after their directory
+def getModuleName(fileName: str) -> str:
+    path = Path(fileName)
+    return path.parent.name if path.name == "__init__.py" else path.stem
+
+
+# Sends the outcome of every test back to mutation.py as soon as the test finishes, one JSON object per line:
+#   {"test": node id, "outcome": "passed", "failed", "error" or "skipped", "message": failure/skip message, "duration": seconds}
+# A test that fails in setup or teardown is an error. Collection errors are reported as errors of the file that could not be collected
+# At the end of the session the times of the pytest process are reported for the profile of the run:
+#   {"profile": {"collected": time the collection finished, "collectedCpu": CPU seconds up to then, "finished": time the tests finished, "finishedCpu": CPU seconds}}
+# Times are seconds since the epoch. collected is null if the collection did not finish
+# With the import hook, the mutated files that were imported are reported before that, so a mutant that no test could see is not taken for
+# a survivor:
+#   {"imported": [resolved file names]}
+class resultReporter():
+    def __init__(self, stream):
+        self.stream = stream
+        # Node id -> result of a test that is still running
+        self.tests = {}
+        self.collected = None
+        self.collectedCpu = None
+
+    def send(self, result: dict):
+        self.stream.write(json.dumps(result) + "\n")
+        self.stream.flush()
+
+    def getMessage(self, report) -> str:
+        # Skips are reported as (file, line, reason)
+        if isinstance(report.longrepr, tuple):
+            return str(report.longrepr[2])
+        reprcrash = getattr(report.longrepr, "reprcrash", None)
+        if reprcrash is not None:
+            return reprcrash.message
+        return str(report.longrepr)
+
+    def pytest_collection_finish(self, session):
+        self.collected = time.time()
+        self.collectedCpu = time.process_time()
+
+    def pytest_sessionfinish(self, session, exitstatus):
+        if installedFinder is not None:
+            self.send({"imported": sorted(installedFinder.imported)})
+        self.send({"profile": {"collected": self.collected, "collectedCpu": self.collectedCpu, "finished": time.time(), "finishedCpu": time.process_time()}})
+
+    def pytest_collectreport(self, report):
+        if report.failed:
+            self.send({"test": report.nodeid, "outcome": "error", "message": self.getMessage(report), "duration": 0.0})
+
+    def pytest_runtest_logreport(self, report):
+        result = self.tests.setdefault(report.nodeid, {"test": report.nodeid, "outcome": "passed", "message": "", "duration": 0.0})
+        result["duration"] += report.duration
+        if report.failed:
+            if report.when == "call":
+                result["outcome"] = "failed"
+                result["message"] = self.getMessage(report)
+            elif result["outcome"] == "passed":
+                result["outcome"] = "error"
+                result["message"] = self.getMessage(report)
+        elif report.skipped and result["outcome"] == "passed":
+            result["outcome"] = "skipped"
+            result["message"] = self.getMessage(report)
+
+        if report.when == "teardown":
+            self.send(self.tests.pop(report.nodeid))
+
+
+# Runs the tests in the order of a kill-fast run. Tests that are not in the order keep their collection order and run after the ordered ones
+class testOrderer():
+    def __init__(self, order: list):
+        self.ranks = {testId: rank for rank, testId in enumerate(order)}
+
+    # Runs after other plugins that reorder the tests
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, session, config, items):
+        items.sort(key=lambda item: self.ranks.get(item.nodeid, len(self.ranks)))
+
+
+# Limit the resources of this process and of everything it starts, so a mutant that allocates without end, loops or writes without end
+# fails on its own instead of taking down the machine. limits: {"memory": MB of address space, "cpu": CPU seconds, "fileSize": MB per file}
+# Running out of memory raises MemoryError and writing past the file size raises OSError (Python ignores SIGXFSZ). Running out of CPU time
+# ends the process with SIGXCPU. The CPU time of this process counts from its start, so it includes starting pytest
+def setResourceLimits(limits: dict):
+    import resource
+    for key, rlimit, scale in (("memory", resource.RLIMIT_AS, 2 ** 20), ("cpu", resource.RLIMIT_CPU, 1), ("fileSize", resource.RLIMIT_FSIZE, 2 ** 20)):
+        if limits.get(key) is None:
+            continue
+        soft = int(limits[key] * scale)
+        _, hard = resource.getrlimit(rlimit)
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        # Only the soft limit is lowered. At the hard CPU limit the process would get SIGKILL, which cannot be told apart from other kills
+        resource.setrlimit(rlimit, (soft, hard))
+
+
+# The mutant finder of this process, if the mutants are served by the import hook
+installedFinder = None
+
+
+# Put the mutant finder in front of every other finder so the mutated modules shadow the files on disk
+def installMutantFinder(mutants: dict):
+    global installedFinder
+    # Drop anything that was already imported from a mutated file so the next import goes through the finder
+    for moduleName, module in list(sys.modules.items()):
+        moduleFile = getattr(module, "__file__", None)
+        if moduleFile is not None and os.path.realpath(moduleFile) in mutants:
+            del sys.modules[moduleName]
+    installedFinder = mutantFinder(mutants)
+    sys.meta_path.insert(0, installedFinder)
+
+
+# The mutants are marshaled by mutation.py and written to stdin. This runs when pytest imports the plugin, which is before
+# conftest files and test modules are imported
+if os.environ.pop("MUTATION_IMPORT_HOOK", None) == "1":
+    installMutantFinder(marshal.loads(sys.stdin.buffer.read()))
+
+
+# mutation.py passes the write end of a pipe in MUTATION_RESULTS_FD (or a file name in MUTATION_RESULTS_FILE where pipes cannot be
+# handed to a child process). The variables are removed so test code that starts pytest again does not report into them
+def pytest_configure(config):
+    resultsFd = os.environ.pop("MUTATION_RESULTS_FD", None)
+    resultsFile = os.environ.pop("MUTATION_RESULTS_FILE", None)
+    if resultsFd is not None:
+        config.pluginmanager.register(resultReporter(os.fdopen(int(resultsFd), "w")), "mutation_results")
+    elif resultsFile is not None:
+        config.pluginmanager.register(resultReporter(open(resultsFile, "w")), "mutation_results")
+
+    resourceLimits = os.environ.pop("MUTATION_RESOURCE_LIMITS", None)
+    if resourceLimits is not None:
+        setResourceLimits(json.loads(resourceLimits))
+
+    # File with the node ids of a kill-fast run in the order they should run
+    orderFile = os.environ.pop("MUTATION_TEST_ORDER", None)
+    if orderFile is not None:
+        with open(orderFile, "r") as orderStream:
+            config.pluginmanager.register(testOrderer(json.load(orderStream)), "mutation_test_order")
@@ -0,0 +1,108 @@
+import sys
+sys.dont_write_bytecode = True
+import os
+import json
+import base64
+import marshal
+from pathlib import Path
+import pytest
+import mutation_plugin
+
+# Fork server started by mutation.py (python3 -m mutation_server <unit test file(s)>) in the directory the tests run in
+# It collects the tests once so pytest, its plugins and the imports of the code under test are loaded, then forks a child
+# for every mutant. Only the modules of the directory under test are imported again by the child, everything else stays warm
+#
+# Requests are read from stdin and replies are written to stdout, one JSON object per line:
+#   request: {"args": [pytest arguments], "log": log file name, "env": {extra environment}, "payload": base64 marshaled mutants or null}
+#   reply:   {"pid": child pid} when the child starts, {"result": test result} for each test as mutation_plugin reports it,
+#            then {"returncode": pytest exit code} when it finishes
+
+
+# Modules loaded from the directory under test. These are dropped in the child so the mutated versions are imported
+def getLocalModules() -> list:
+    root = Path().resolve()
+    localModules = []
+    for moduleName, module in list(sys.modules.items()):
+        moduleFile = getattr(module, "__file__", None)
+        if moduleFile is None:
+            continue
+        try:
+            Path(moduleFile).resolve().relative_to(root)
+        except ValueError:
+            continue
+        localModules.append(moduleName)
+    return localModules
+
+
+# Runs in the forked child. Never returns
+# resultsFd is the write end of the pipe that mutation_plugin reports the test results into
+def runMutant(request: dict, resultsFd: int):
+    try:
+        # Lead a new process group so a mutant that times out can be killed together with anything it started
+        os.setsid()
+        logFd = os.open(request["log"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        os.dup2(logFd, 1)
+        os.dup2(logFd, 2)
+        os.close(logFd)
+        # The server's stdin carries requests and must not be read by the tests
+        nullFd = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(nullFd, 0)
+        os.close(nullFd)
+        os.environ.update(request["env"])
+        os.environ["MUTATION_RESULTS_FD"] = str(resultsFd)
+
+        for moduleName in getLocalModules():
+            del sys.modules[moduleName]
+        if request["payload"] is not None:
+            mutation_plugin.installMutantFinder(marshal.loads(base64.b64decode(request["payload"])))
+
+        returncode = int(pytest.main(request["args"]))
+    except BaseException:
+        returncode = pytest.ExitCode.INTERNAL_ERROR
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(returncode)
+
+
+def main():
+    # Keep the real stdout for replies. Anything pytest prints while warming up goes to stderr
+    replies = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+
+    # Warm up: import pytest plugins, the tests and the code under test
+    pytest.main(["--collect-only", "-q", "-p", "no:cacheprovider"] + sys.argv[1:])
+    replies.write(json.dumps({"ready": True}) + "\n")
+    replies.flush()
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        resultsRead, resultsWrite = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            replies.close()
+            os.close(resultsRead)
+            runMutant(request, resultsWrite)
+
+        os.close(resultsWrite)
+        replies.write(json.dumps({"pid": pid}) + "\n")
+        replies.flush()
+        # Relay the results until the child (and anything it started) closes the pipe
+        with os.fdopen(resultsRead, "r") as results:
+            for result in results:
+                # A child that is killed can leave a partial line behind
+                try:
+                    result = json.loads(result)
+                except ValueError:
+                    continue
+                replies.write(json.dumps({"result": result}) + "\n")
+                replies.flush()
+        _, status = os.waitpid(pid, 0)
+        replies.write(json.dumps({"returncode": os.waitstatus_to_exitcode(status)}) + "\n")
+        replies.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import sys
+sys.dont_write_bytecode = True
+import argparse
+from mutation import Mutation
+
+# Worker of a distributed run, started on every node in a checkout of the code under test:
+#   python3 <path to>/mutation_worker.py <queue dir> <module(s) to test> <unit tests> [--import-hook] [--fork-server] [--verbose]
+# The arguments are the ones of Mutation() and mutate() on the coordinator. The worker runs the coverage analysis of its checkout like
+# Mutation() does, then runs the iterations the coordinator (mutate() with queueDir) publishes to the queue directory until the run is finished
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the iterations of a distributed mutation run from a shared work queue directory")
+    parser.add_argument("queueDir", help="work queue directory that is shared with the coordinator")
+    parser.add_argument("moduleNameToTest", help="module(s) to mutate, as given to Mutation() on the coordinator")
+    parser.add_argument("unitTestFileName", help="unit test file(s), as given to Mutation() on the coordinator")
+    parser.add_argument("--import-hook", action="store_true", help="serve the mutants from memory instead of writing them over the source")
+    parser.add_argument("--fork-server", action="store_true", help="run the tests of each mutant in a child of a fork server")
+    parser.add_argument("--verbose", action="store_true", help="print out extra information to the terminal")
+    args = parser.parse_args()
+
+    worker = Mutation(args.moduleNameToTest, args.unitTestFileName, verbose=args.verbose)
+    worker.work(args.queueDir, importHook=args.import_hook, forkServer=args.fork_server)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import json
+import os
+import sys
+import textwrap
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from mutation import mutantInfo, resultStore
+
+pytest_plugins = ["pytester"]
+
+TESTS = textwrap.dedent("""\
+    import pytest
+
+
+    @pytest.fixture
+    def broken():
+        raise RuntimeError("broken fixture")
+
+
+    def test_passes():
+        assert True
+
+
+    def test_fails():
+        assert 1 == 2
+
+
+    def test_skips():
+        pytest.skip("not here")
+
+
+    def test_setup_error(broken):
+        pass
+""")
+
+
+def readResults(lines: list) -> dict:
+    results = {}
+    for line in lines:
+        result = json.loads(line)
+        results["profile" if "profile" in result else result["test"]] = result
+    return results
+
+
+# Every test is sent with its outcome, followed by the profile of the pytest process. The variable is removed once it is read
+def test_results_are_written_to_file(pytester, monkeypatch):
+    pytester.makepyfile(test_calc=TESTS)
+    resultsFile = pytester.path / "results.jsonl"
+    monkeypatch.setenv("MUTATION_RESULTS_FILE", str(resultsFile))
+    pytester.runpytest("-p", "mutation_plugin")
+    assert "MUTATION_RESULTS_FILE" not in os.environ
+
+    lines = resultsFile.read_text().splitlines()
+    results = readResults(lines)
+    assert {testId: result["outcome"] for testId, result in results.items() if testId != "profile"} == {
+        "test_calc.py::test_passes": "passed",
+        "test_calc.py::test_fails": "failed",
+        "test_calc.py::test_skips": "skipped",
+        "test_calc.py::test_setup_error": "error",
+    }
+    assert "assert 1 == 2" in results["test_calc.py::test_fails"]["message"]
+    assert "not here" in results["test_calc.py::test_skips"]["message"]
+    assert "broken fixture" in results["test_calc.py::test_setup_error"]["message"]
+    assert "profile" in json.loads(lines[-1])
+    assert results["profile"]["profile"]["collected"] <= results["profile"]["profile"]["finished"]
+
+
+# The write end of a pipe is handed over as a file descriptor
+def test_results_are_written_to_fd(pytester, monkeypatch):
+    pytester.makepyfile(test_calc=TESTS)
+    readFd, writeFd = os.pipe()
+    monkeypatch.setenv("MUTATION_RESULTS_FD", str(writeFd))
+    pytester.runpytest("-p", "mutation_plugin")
+    assert "MUTATION_RESULTS_FD" not in os.environ
+
+    # Every result is flushed as it is sent, so all of them are in the pipe
+    os.set_blocking(readFd, False)
+    with os.fdopen(readFd, "r") as stream:
+        results = readResults(stream.read().splitlines())
+    assert results["test_calc.py::test_passes"]["outcome"] == "passed"
+    assert "profile" in results
+
+
+# A file that cannot be collected is an error of that file. The collection still finishes for the other files
+def test_collection_errors_are_reported(pytester, monkeypatch):
+    pytester.makepyfile(test_calc="def test_passes():\n    assert True\n", test_broken="import not_a_module\n")
+    resultsFile = pytester.path / "results.jsonl"
+    monkeypatch.setenv("MUTATION_RESULTS_FILE", str(resultsFile))
+    pytester.runpytest("-p", "mutation_plugin", "--continue-on-collection-errors")
+
+    results = readResults(resultsFile.read_text().splitlines())
+    assert results["test_broken.py"]["outcome"] == "error"
+    assert "not_a_module" in results["test_broken.py"]["message"]
+    assert results["test_calc.py::test_passes"]["outcome"] == "passed"
+
+
+def makeMutant(iteration: int, outcome: str) -> mutantInfo:
+    mutant = mutantInfo(iteration)
+    mutant.mutantId = "pkg/calc.py:2:13:Add->Sub"
+    mutant.mutations = [("pkg/calc.py", 2, 13, "Add", "Sub", 0)]
+    mutant.testResults = [{"test": "tests/test_calc.py::test_add", "outcome": outcome, "message": "", "duration": 0.5}]
+    return mutant
+
+
+# A resumed store has the settings of the run and the records of every finished mutant. A line cut off by a kill is left out
+def test_checkpoint_is_loaded(tmp_path):
+    resultsFile = str(tmp_path / "mutation-results.jsonl")
+    checkpointFile = str(tmp_path / "checkpoint.jsonl")
+    store = resultStore(resultsFile, checkpointFile)
+    store.startRun({"seed": 1})
+    store.add(makeMutant(0, "failed"))
+    store.add(makeMutant(1, "passed"))
+    runId = store.runId
+    store.close()
+    with open(checkpointFile, "a") as checkpoint:
+        checkpoint.write('{"iteration": 2, "rec')
+
+    store = resultStore(resultsFile, checkpointFile)
+    assert store.resumeRun() == {"seed": 1}
+    assert store.runId == runId
+    assert store.isResumed(0) and store.isResumed(1)
+    assert not store.isResumed(2)
+    records = store.getIteration(0)
+    assert [(record["run"], record["mutant"], record["outcome"], record["cached"]) for record in records] == [(runId, "pkg/calc.py:2:13:Add->Sub", "failed", False)]
+    assert records[0]["mutations"] == [["pkg/calc.py", 2, 13, "Add", "Sub", 0]]
+    assert store.getIteration(1)[0]["outcome"] == "passed"
+    assert store.getIteration(2) == []
+    store.close()
@@ -0,0 +1,81 @@
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+SOURCE = textwrap.dedent("""\
+    def add(a, b):
+        return a + b
+
+
+    def isPositive(a):
+        return a > 0
+""")
+
+TESTS = textwrap.dedent("""\
+    import time
+
+    from calc import add, isPositive
+
+
+    def test_add():
+        # Keeps every mutant written over the source long enough to be killed
+        time.sleep(1)
+        assert add(1, 2) == 3
+
+
+    def test_isPositive():
+        assert isPositive(1)
+""")
+
+RUN = textwrap.dedent("""\
+    import sys
+    from mutation import Mutation, mutation_types
+
+    mutation = Mutation("pkg", "tests")
+    mutation.mutate(mutation_types.COMPLEMENT, 3, 1, resume=sys.argv[1] == "resume")
+""")
+
+
+def makeWorkspace(path: Path):
+    (path / "pkg").mkdir()
+    (path / "pkg" / "calc.py").write_text(SOURCE)
+    (path / "tests").mkdir()
+    (path / "tests" / "conftest.py").write_text("import sys\nsys.path.insert(0, __import__('os').path.dirname(__file__) + '/../pkg')\n")
+    (path / "tests" / "test_calc.py").write_text(TESTS)
+    (path / "run.py").write_text(RUN)
+
+
+def startRun(path: Path, mode: str):
+    env = dict(os.environ, PYTHONPATH=str(REPO_DIR) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    return subprocess.Popen([sys.executable, "run.py", mode], cwd=str(path), env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+
+# A run that writes over the source is killed while a mutant is on disk. Mutation() has to put the source back, so the run can be resumed
+def test_resume_after_kill(tmp_path):
+    makeWorkspace(tmp_path)
+    marker = tmp_path / "mutation-unit-test" / "backup-pkg.in-use"
+    source = tmp_path / "pkg" / "calc.py"
+
+    run = startRun(tmp_path, "start")
+    deadline = time.time() + 120
+    while not (marker.exists() and source.read_text() != SOURCE):
+        assert run.poll() is None, run.stdout.read()
+        assert time.time() < deadline, "no mutant was written over the source"
+        time.sleep(0.05)
+    run.send_signal(signal.SIGKILL)
+    run.wait()
+    assert source.read_text() != SOURCE
+
+    run = startRun(tmp_path, "resume")
+    output = run.communicate(timeout=300)[0]
+    assert run.returncode == 0, output
+    assert "Restoring the source" in output
+    assert "Resuming run" in output
+    assert source.read_text() == SOURCE
+    assert not marker.exists()
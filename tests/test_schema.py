@@ -0,0 +1,180 @@
+import ast
+import json
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from mutation import Mutation, analysisInfo, treeIndex
+
+SOURCE = textwrap.dedent("""\
+    def either(a, b):
+        return a or b()
+
+
+    def ordered(a, b, c):
+        return a < b() < c()
+
+
+    class limits:
+        low = 1
+        high = low + 1
+        valid = low < high and high > 0
+
+
+    def sign(x):
+        match x:
+            case -1:
+                return "minus"
+            case 0 | 1 if x + 1 > 1:
+                return "one"
+            case _:
+                return "other"
+""")
+
+PARITY_SOURCE = textwrap.dedent("""\
+    def total(a, b, c):
+        return a + b + c
+
+
+    def same(a, b, c):
+        return a == b == c
+
+
+    def clamp(x, low, high):
+        if x < low or x > high:
+            return -1
+        return x
+""")
+
+PARITY_TESTS = textwrap.dedent("""\
+    from calc import total, same, clamp
+
+
+    def test_total():
+        assert total(1, 2, 3) == 6
+
+
+    def test_same():
+        assert same(1, 1, 1)
+        assert not same(1, 1, 2)
+
+
+    def test_clamp():
+        assert clamp(5, 0, 10) == 5
+        assert clamp(-5, 0, 10) == -1
+""")
+
+RUN = textwrap.dedent("""\
+    import sys
+    from mutation import Mutation, mutation_types
+
+    mutation = Mutation("pkg", "tests")
+    mutation.mutate(mutation_types.COMPLEMENT, 1, 1, exhaustive=True, schema=sys.argv[1] == "schema")
+""")
+
+
+def fail():
+    raise AssertionError("a short circuited operand was evaluated")
+
+
+# Instrument the source with every line covered. Returns the module, run with the given MUTATION_SCHEMA_ACTIVE, and the schema sites
+def loadSchema(monkeypatch, source: str, active=""):
+    tree = ast.parse(source)
+    analysis = analysisInfo("calc.py", None, list(range(1, len(source.splitlines()) + 1)))
+    transformer = Mutation._Mutation__astNodeTransformerCallbacks_schema(Mutation.mutation_operators, analysis, 0, treeIndex(tree))
+    tree = transformer.insertHeader(transformer.visit(tree))
+    monkeypatch.setenv("MUTATION_SCHEMA_ACTIVE", active)
+    module = {}
+    exec(compile(tree, "calc.py", "exec"), module)
+    return module, transformer.sites
+
+
+def getSiteId(sites: dict, lineNum: int, opType, occurrence=0) -> int:
+    return next(siteId for (line, col, op, occ), (siteId, opNames, index) in sites.items() if (line, op, occ) == (lineNum, opType, occurrence))
+
+
+# The operands after the first of a boolean operator are only evaluated when the operator (the original or the mutated one) needs them
+def test_boolop_short_circuits(monkeypatch):
+    module, sites = loadSchema(monkeypatch, SOURCE)
+    assert module["either"](True, fail) is True
+    assert module["either"](False, lambda: 5) == 5
+
+    module, sites = loadSchema(monkeypatch, SOURCE, str(getSiteId(sites, 2, ast.Or)) + "=And")
+    assert module["either"](True, lambda: 5) == 5
+    assert module["either"](False, fail) is False
+
+
+# A comparison chain stops at the first comparison that is false, and each of its operators can be switched on its own
+def test_compare_chain_short_circuits(monkeypatch):
+    module, sites = loadSchema(monkeypatch, SOURCE)
+    assert module["ordered"](2, lambda: 1, fail) is False
+    assert module["ordered"](1, lambda: 2, lambda: 3) is True
+
+    siteId = getSiteId(sites, 6, ast.Lt)
+    assert sorted(index for (line, col, op, occ), (site, opNames, index) in sites.items() if site == siteId) == [0, 1]
+
+    module, sites = loadSchema(monkeypatch, SOURCE, str(siteId) + "=Lt;Gt")
+    assert module["ordered"](1, lambda: 3, lambda: 2) is True
+    assert module["ordered"](2, lambda: 1, fail) is False
+
+
+# Lambdas in a class body cannot see the names of the class, so only the sites that need no deferred operands are switched there
+def test_class_body_sites_are_not_deferred(monkeypatch):
+    module, sites = loadSchema(monkeypatch, SOURCE)
+    classSites = {op for (line, col, op, occ) in sites if 9 <= line <= 12}
+    assert classSites == {ast.Add}
+    assert module["limits"].valid is True
+
+    module, sites = loadSchema(monkeypatch, SOURCE, str(getSiteId(sites, 11, ast.Add)) + "=Sub")
+    assert module["limits"].high == 0
+    assert module["limits"].valid is False
+
+
+# Case patterns only accept literals, so the "-1" of a pattern is left alone while the guard is switched
+def test_match_patterns_are_not_instrumented(monkeypatch):
+    module, sites = loadSchema(monkeypatch, SOURCE)
+    assert not any(op is ast.USub for (line, col, op, occ) in sites)
+    assert [module["sign"](x) for x in (-1, 0, 1)] == ["minus", "other", "one"]
+
+    module, sites = loadSchema(monkeypatch, SOURCE, str(getSiteId(sites, 19, ast.Add)) + "=Sub")
+    assert [module["sign"](x) for x in (-1, 0, 1)] == ["minus", "other", "other"]
+
+
+def makeWorkspace(path: Path):
+    (path / "pkg").mkdir()
+    (path / "pkg" / "calc.py").write_text(PARITY_SOURCE)
+    (path / "tests").mkdir()
+    (path / "tests" / "conftest.py").write_text("import sys\nsys.path.insert(0, __import__('os').path.dirname(__file__) + '/../pkg')\n")
+    (path / "tests" / "test_calc.py").write_text(PARITY_TESTS)
+    (path / "run.py").write_text(RUN)
+
+
+# Mutant id -> whether a test killed it, from an exhaustive run in a new workspace
+def getKilledMutants(path: Path, mode: str) -> dict:
+    path.mkdir()
+    makeWorkspace(path)
+    env = dict(os.environ, PYTHONPATH=str(REPO_DIR) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    run = subprocess.run([sys.executable, "run.py", mode], cwd=str(path), env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=600)
+    assert run.returncode == 0, run.stdout
+
+    killed = {}
+    with open(path / "mutation-unit-test" / "mutation-results.jsonl") as resultFile:
+        for line in resultFile:
+            record = json.loads(line)
+            killed[record["mutant"]] = killed.get(record["mutant"], False) or record["outcome"] in ("failed", "error")
+    return killed
+
+
+# Switching the operators at runtime has to kill exactly the mutants that writing each mutant to its own source kills,
+# including the sites that share a position in a chain
+def test_schema_kills_the_same_mutants(tmp_path):
+    default = getKilledMutants(tmp_path / "default", "default")
+    schema = getKilledMutants(tmp_path / "schema", "schema")
+    assert "pkg/calc.py:2:11:Add->Sub" in default
+    assert "pkg/calc.py:6:11#1:Eq->NotEq" in default
+    assert schema == default
@@ -0,0 +1,101 @@
+import ast
+import io
+import math
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from mutation import Mutation, mutantInfo, resultStore, scoreEstimator
+
+
+def getRecords(outcome: str) -> list:
+    return [{"test": "tests/test_calc.py::test_add", "outcome": outcome}]
+
+
+# Add sampled mutants of a stratum, the first numKilled of them killed
+def addSamples(estimator: scoreEstimator, stratum, numSampled: int, numKilled: int):
+    for i in range(numSampled):
+        estimator.add(stratum, getRecords("failed" if i < numKilled else "passed"))
+
+
+# The score weighs the kill rate of each stratum by its share of the enumerated mutants. A stratum without samples takes the overall rate
+def test_point_estimate():
+    estimator = scoreEstimator(["a"] * 60 + ["b"] * 30 + ["c"] * 10, 0.95)
+    assert estimator.getEstimate() is None
+
+    addSamples(estimator, "a", 10, 8)
+    addSamples(estimator, "b", 10, 2)
+    score, lower, upper = estimator.getEstimate()
+    assert score == pytest.approx(0.6 * 0.8 + 0.3 * 0.2 + 0.1 * 0.5)
+    assert lower < score < upper
+
+
+# Timeouts and resource limits are kills. Mutants the filter dropped are left out, but still count as iterations
+def test_outcomes():
+    estimator = scoreEstimator(["a"] * 10, 0.95)
+    for outcome in ("timeout", "resource limit", "passed", "skipped"):
+        estimator.add("a", getRecords(outcome))
+    estimator.add("a", [{"test": None, "outcome": "equivalent"}])
+    estimator.add("a", [])
+    assert (estimator.numIterations, estimator.numSampled, estimator.numKilled) == (6, 4, 2)
+    assert estimator.getEstimate()[0] == pytest.approx(0.5)
+
+
+# The interval is the normal interval of the stratified estimate with the smoothed rates of the strata and the finite population correction
+def test_interval_width():
+    estimator = scoreEstimator(["a"] * 50 + ["b"] * 50, 0.95)
+    addSamples(estimator, "a", 10, 5)
+    addSamples(estimator, "b", 10, 10)
+    score, lower, upper = estimator.getEstimate()
+    variance = (0.5 * 0.5 * 0.5 + 0.5 * (11 / 12) * (1 / 12)) * (1 - 20 / 100) / 20
+    halfWidth = statistics.NormalDist().inv_cdf(0.975) * math.sqrt(variance)
+    assert (lower, upper) == (pytest.approx(score - halfWidth), pytest.approx(min(1.0, score + halfWidth)))
+
+    # More samples and a lower confidence make the interval narrower. Once every mutant is sampled there is nothing left to estimate
+    widths = []
+    for confidence, numSampled in ((0.99, 20), (0.95, 20), (0.95, 40), (0.95, 50)):
+        estimator = scoreEstimator(["a"] * 50 + ["b"] * 50, confidence)
+        addSamples(estimator, "a", numSampled, numSampled // 2)
+        addSamples(estimator, "b", numSampled, numSampled // 4)
+        score, lower, upper = estimator.getEstimate()
+        widths.append(upper - lower)
+    assert widths[0] > widths[1] > widths[2] > widths[3] == 0.0
+
+
+def makeMutant(iteration: int, outcome: str) -> mutantInfo:
+    mutant = mutantInfo(iteration)
+    mutant.testResults = getRecords(outcome)
+    return mutant
+
+
+# Sampling stops once the interval is at most targetWidth wide or the time budget ran out
+def test_stopping_rule(tmp_path):
+    mutation = Mutation.__new__(Mutation)
+    enumeratedMutants = [("pkg/calc.py:" + str(i) + ":4:Add->Sub", "pkg/calc.py", (i, 4, ast.Add, 0), ast.Sub) for i in range(200)]
+    store = resultStore(str(tmp_path / "mutation-results.jsonl"), str(tmp_path / "checkpoint.jsonl"))
+    store.startRun({})
+    for i in range(200):
+        store.add(makeMutant(i, "failed" if i % 4 else "passed"))
+
+    def shouldStop(estimator, nextIteration, targetWidth, startTime=None, timeBudget=None):
+        return mutation._Mutation__shouldStopSampling(estimator, store, enumeratedMutants, nextIteration, time.time() if startTime is None else startTime, targetWidth, timeBudget, io.StringIO())
+
+    estimator = scoreEstimator([mutation._Mutation__getStratum(mutant) for mutant in enumeratedMutants], 0.95)
+    nextIteration = 1
+    while not shouldStop(estimator, nextIteration, 0.2):
+        nextIteration += 1
+    score, lower, upper = estimator.getEstimate()
+    assert upper - lower <= 0.2
+    assert estimator.numIterations == nextIteration < 200
+
+    # The estimate just before the stop was still too wide
+    estimator = scoreEstimator([mutation._Mutation__getStratum(mutant) for mutant in enumeratedMutants], 0.95)
+    assert not shouldStop(estimator, nextIteration - 1, 0.2)
+    assert shouldStop(estimator, nextIteration - 1, 0.2, time.time() - 10, 5)
+    store.close()
@@ -0,0 +1,89 @@
+import ast
+import hashlib
+import io
+import sys
+import textwrap
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from mutation import Mutation, analysisInfo, analyzeSource, mutation_types, treeIndex
+
+# Nested, chained and parenthesized operators, with comments and line continuations between the operands
+SOURCE = textwrap.dedent("""\
+    def f(a, b, c, d):
+        x = a + b * c - d
+        y = (a + b) * (c - d)
+        z = a < b <= c == d
+        w = not a or b and c
+        v = -(a + b) ** 2
+        u = ((a) + (b)) * c  # comment
+        t = (a +
+             b  # inner
+             - c)
+        s = a if a > b else -b
+        r = [a + b for a in range(c) if a % 2 == 0]
+        q = a is not b and c not in d
+        p = a+b*c<d or not-a
+        o = a + b + c == a == b
+        return x, y, z, w, v, u, t, s, r, q, p, o
+""")
+
+
+def analyze(path: Path) -> analysisInfo:
+    path.write_text(SOURCE)
+    analysis = analysisInfo(str(path), hashlib.sha256(SOURCE.encode()).hexdigest(), list(range(1, len(SOURCE.splitlines()) + 1)))
+    analysis.operatorDict = analyzeSource(str(path))
+    return analysis
+
+
+# Mutate the source with the given site -> new operator type. Returns the spliced source and the mutated tree
+def mutate(analysis: analysisInfo, replacementOps: dict):
+    transformer = Mutation._Mutation__astNodeTransformerCallbacks_mutate(Mutation.mutation_operators, mutation_types.RANDOM, None, analysis, io.StringIO(), replacementOps=replacementOps)
+    mutatedTree = transformer.mutateTree(treeIndex(analysis.parseTree()))
+    assert transformer.numMutated == len(replacementOps)
+    mutation = Mutation.__new__(Mutation)
+    return mutation._Mutation__spliceSource(SOURCE, transformer.sourceEdits), mutatedTree
+
+
+def getSites(analysis: analysisInfo) -> list:
+    return [(key, site) for key, sites in analysis.operatorDict.items() for site in sites]
+
+
+# Every site replaced by every other operator of its group, including operators that bind more or less tightly, parses to the mutated tree
+def test_each_mutation_splices_like_unparse(tmp_path):
+    analysis = analyze(tmp_path / "calc.py")
+    sites = getSites(analysis)
+    assert len(sites) > 30
+    for key, site in sites:
+        for newOp in Mutation.mutation_operators[key]:
+            if newOp is site[2]:
+                continue
+            spliced, mutatedTree = mutate(analysis, {site: newOp})
+            assert spliced is not None, (site, newOp)
+            assert ast.unparse(ast.parse(spliced)) == ast.unparse(mutatedTree), (site, newOp, spliced)
+
+
+# Mutating every site at once puts nested edits and parentheses together
+def test_all_mutations_splice_like_unparse(tmp_path):
+    analysis = analyze(tmp_path / "calc.py")
+    for newOps in ({ast.Add: ast.Pow, ast.Lt: ast.In, ast.Or: ast.And, ast.USub: ast.Not}, Mutation.complementary_operators):
+        # Operators without a replacement in newOps are replaced by the first other operator of their group
+        replacementOps = {site: newOps.get(site[2]) or next(op for op in Mutation.mutation_operators[key] if op is not site[2]) for key, site in getSites(analysis)}
+        spliced, mutatedTree = mutate(analysis, replacementOps)
+        assert spliced is not None
+        assert ast.unparse(ast.parse(spliced)) == ast.unparse(mutatedTree)
+
+
+# The splice only touches the operators, so comments and the layout of the source are kept
+def test_splice_keeps_the_source_text(tmp_path):
+    analysis = analyze(tmp_path / "calc.py")
+    site = next(site for key, site in getSites(analysis) if site[0] == 8 and site[2] is ast.Sub)
+    spliced, mutatedTree = mutate(analysis, {site: ast.Add})
+    assert spliced == SOURCE.replace("         - c)", "         + c)")
+
+    site = next(site for key, site in getSites(analysis) if site[0] == 7 and site[2] is ast.Add)
+    spliced, mutatedTree = mutate(analysis, {site: ast.Pow})
+    assert "    u = (((a) ** (b)))" in spliced
+    assert "# comment" in spliced
@@ -0,0 +1,67 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from mutation import workQueue
+
+
+def publishTasks(queueDir: Path, numTasks: int) -> workQueue:
+    coordinator = workQueue(queueDir)
+    coordinator.publish({"run": "run-1"}, [{"iteration": i} for i in range(numTasks)])
+    return coordinator
+
+
+# Two workers, each with its own handle on the queue, take tasks until none are left. Every task is claimed by exactly one of them
+def test_each_task_is_claimed_once(tmp_path):
+    coordinator = publishTasks(tmp_path, 200)
+    claimed = {"worker-1": [], "worker-2": []}
+    start = threading.Barrier(2)
+
+    def work(workerId):
+        worker = workQueue(tmp_path)
+        start.wait()
+        while True:
+            task = worker.claim()
+            if task is None:
+                break
+            claimed[workerId].append(task["iteration"])
+            worker.complete({"run": "run-1", "iteration": task["iteration"], "worker": workerId})
+
+    workers = [threading.Thread(target=work, args=(workerId,)) for workerId in claimed]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    iterations = claimed["worker-1"] + claimed["worker-2"]
+    assert sorted(iterations) == list(range(200))
+    results = coordinator.getResults("run-1")
+    assert sorted(result["iteration"] for result in results) == list(range(200))
+    assert all(result["iteration"] in claimed[result["worker"]] for result in results)
+    assert coordinator.requeueLostTasks() == []
+
+
+# A claim whose worker stopped sending heartbeats is handed to the other worker. A claim with recent heartbeats stays where it is
+def test_expired_claim_is_reclaimed(tmp_path):
+    coordinator = publishTasks(tmp_path, 2)
+    lostWorker = workQueue(tmp_path)
+    liveWorker = workQueue(tmp_path)
+    assert lostWorker.claim()["iteration"] == 0
+    assert liveWorker.claim()["iteration"] == 1
+    assert liveWorker.claim() is None
+
+    expired = time.time() - workQueue.claimTimeout - 1
+    os.utime(tmp_path / "claimed" / "task-0.json", (expired, expired))
+    os.utime(tmp_path / "claimed" / "task-1.json", (expired, expired))
+    liveWorker.heartbeat(1)
+    assert coordinator.requeueLostTasks() == [0]
+
+    assert liveWorker.claim()["iteration"] == 0
+    assert liveWorker.claim() is None
+    liveWorker.complete({"run": "run-1", "iteration": 0})
+    assert [result["iteration"] for result in coordinator.getResults("run-1")] == [0]